@@ -15,13 +15,14 @@ from io import BytesIO
 import matplotlib.pyplot as plt
 import sys
 import streamlit.components.v1 as components
-import pickle
 
 # 添加项目根目录到系统路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入数据提供层
-from src.tools.data_provider import get_historical_data, get_market_data, get_stock_name, load_stock_names
+from src.tools.data_provider import get_historical_data, get_market_data, get_stock_name, get_stock_index, search_stocks
+from src.tools.spot_snapshot import spot_snapshot
+from src.tools.cache_manager import cache_manager
 
 # 导入akshare配置模块
 try:
@@ -440,11 +441,16 @@ with st.sidebar:
     st.markdown('<div style="font-size: 1.1rem; font-weight: bold; margin-bottom: 15px; color: #1E88E5;"><span style="margin-right: 8px;">📝</span>基本参数</div>', unsafe_allow_html=True)
 
     # 股票代码输入
-    ticker = st.text_input("股票代码", value="600519", help="输入6位股票代码，如：600519", placeholder="请输入股票代码")
+    ticker = st.text_input("股票代码", value="600519", help="输入6位股票代码，也可以输入名称或拼音首字母搜索，如：600519、贵州茅台、gzmt", placeholder="请输入股票代码或名称")
 
-    # 验证股票代码格式
+    # 输入不是有效代码时，按代码/名称/拼音前缀搜索
     if ticker and not validate_ticker(ticker):
-        st.warning("请输入有效的股票代码格式（6位数字，沪市以6或9开头，深市以0或3开头，北交所以8开头）")
+        matches = search_stocks(ticker.strip(), limit=20)
+        if matches:
+            choice = st.selectbox("匹配的股票", [f"{code} {name}" for code, name in matches])
+            ticker = choice.split(" ", 1)[0]
+        else:
+            st.warning("请输入有效的股票代码格式（6位数字，沪市以6或9开头，深市以0或3开头，北交所以8开头）")
 
     # 仓位占比设置
     position_ratio = st.slider("仓位占比", min_value=1, max_value=100, value=30, step=1, help="设置投资仓位占总资金的百分比")
@@ -536,57 +542,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# 定义缓存文件路径
-STOCK_NAMES_CACHE_FILE = "stock_names_cache.pkl"
-
 # 初始化股票名称数据
 def init_stock_names():
     """
     初始化股票名称数据，程序启动时调用
-    如果本地缓存文件存在且不超过一周，直接使用缓存
-    否则重新获取股票数据并保存到本地文件
+    股票名称由数据提供层统一加载和缓存，这里只构建共享的代码/名称索引
     """
     try:
-        # 检查缓存文件是否存在
-        if os.path.exists(STOCK_NAMES_CACHE_FILE):
-            # 检查文件修改时间
-            file_time = datetime.fromtimestamp(os.path.getmtime(STOCK_NAMES_CACHE_FILE))
-            current_time = datetime.now()
-            # 如果文件修改时间不超过一周，直接加载
-            if (current_time - file_time) < timedelta(days=7):
-                print(f"缓存文件修改日期: {file_time.strftime('%Y-%m-%d')}, 未超过7天，直接使用")
-                with open(STOCK_NAMES_CACHE_FILE, 'rb') as f:
-                    stock_info_df = pickle.load(f)
-                # 存入会话状态
-                if not hasattr(st, 'session_state'):
-                    return
-                st.session_state.stock_info_df = stock_info_df
-                print(f"成功从缓存加载股票数据，共 {len(stock_info_df)} 条记录")
-                return
-            else:
-                print(f"缓存文件已过期 ({(current_time - file_time).days} 天)，重新获取数据")
-        else:
-            print("未找到缓存文件，从API获取数据")
-
-        # 获取新数据
-        import akshare as ak
-        stock_info_df = ak.stock_info_a_code_name()
-
-        # 保存到本地文件
-        with open(STOCK_NAMES_CACHE_FILE, 'wb') as f:
-            pickle.dump(stock_info_df, f)
-
-        # 存入会话状态
-        if not hasattr(st, 'session_state'):
-            return
-        st.session_state.stock_info_df = stock_info_df
-        print(f"成功获取并缓存股票数据，共 {len(stock_info_df)} 条记录")
-
+        stock_index = get_stock_index()
+        print(f"成功加载股票索引，共 {len(stock_index)} 只股票")
     except Exception as e:
         print(f"初始化股票名称数据时出错: {str(e)}")
 
 # 程序启动时预加载股票名称数据
-load_stock_names()
+init_stock_names()
 
 # 修改获取股票简称的函数
 @st.cache_data(ttl=3600)  # 缓存1小时
@@ -621,7 +590,6 @@ def get_stock_name_ui(ticker):
             st.session_state.log_output.append(f"ERROR: 获取股票简称时出错: {str(e)}")
         return "未知股票"
 
-@st.cache_data(ttl=3600)  # 缓存1小时
 def get_realtime_data():
     """
     获取所有A股实时行情数据，并缓存结果
@@ -640,7 +608,8 @@ def get_realtime_data():
             print(message)  # 同时打印到控制台
 
         log_message(f"DEBUG: 获取所有A股实时行情数据...")
-        realtime_data = ak.stock_zh_a_spot_em()
+        # 使用进程内共享的行情快照，避免每次查询都重新下载全市场行情
+        realtime_data = spot_snapshot.table()
         log_message(f"DEBUG: 成功获取所有A股实时行情数据")
         return realtime_data
     except Exception as e:
@@ -788,19 +757,12 @@ def get_financial_metrics_cached(symbol):
 
         log_message(f"DEBUG: 正在获取 {symbol} 的财务指标数据(缓存版)...")
 
-        # 获取实时行情数据
-        realtime_data = get_realtime_data()
-        if realtime_data is None or realtime_data.empty:
-            log_message(f"WARNING: 无法获取实时行情数据")
-            return [{}]
-
-        stock_data = realtime_data[realtime_data['代码'] == symbol]
-        if stock_data.empty:
+        # 获取实时行情数据（按代码索引的共享快照）
+        stock_data = spot_snapshot.get(symbol)
+        if stock_data is None:
             log_message(f"WARNING: 未找到股票 {symbol} 的实时行情数据")
             return [{}]
 
-        stock_data = stock_data.iloc[0]
-
         # 获取新浪财务指标
         current_year = datetime.now().year
         financial_data = get_financial_indicator(symbol, str(current_year-2))  # 获取近两年的数据，确保有足够的历史数据
@@ -1051,6 +1013,9 @@ if run_button:
     if show_reasoning:
         cmd_args.append("--show-reasoning")
 
+    # 分析的时间预算：数据获取和大模型调用在此时间内结束，预留30秒输出结果
+    cmd_args.extend(["--timeout", "270"])
+
     # 添加超时处理
     cmd_args = ["timeout", "300"] + cmd_args  # 设置5分钟超时
 
@@ -1976,6 +1941,41 @@ with st.sidebar.expander("🔍 系统诊断", expanded=False):
         </div>
         """, unsafe_allow_html=True)
 
+# 添加缓存统计面板
+with st.sidebar.expander("📊 缓存统计", expanded=False):
+    st.markdown('<div style="font-size: 1rem; font-weight: bold; margin-bottom: 15px; color: #1E88E5;">缓存命中与节省时间</div>', unsafe_allow_html=True)
+
+    if st.button("刷新缓存统计", key="refresh_cache_stats", use_container_width=True):
+        cache_report = cache_manager.report()
+        if not cache_report["namespaces"]:
+            st.info("暂无缓存统计")
+        else:
+            namespace_df = pd.DataFrame(cache_report["namespaces"])
+            total_hits = int(namespace_df["hits"].sum())
+            total_lookups = total_hits + int(namespace_df["misses"].sum())
+            col1, col2 = st.columns(2)
+            col1.metric("命中率", f"{total_hits / total_lookups:.0%}" if total_lookups else "-")
+            col2.metric("节省时间", f"{namespace_df['time_saved_seconds'].fillna(0).sum():.0f} 秒")
+
+            fig = px.bar(namespace_df, x="namespace", y=["memory_hits", "disk_hits", "shared_hits", "misses"],
+                         labels={"namespace": "命名空间", "value": "次数", "variable": "类型"})
+            fig.update_layout(height=280, margin=dict(l=0, r=0, t=10, b=0), legend_title_text="")
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.dataframe(namespace_df[["namespace", "hit_rate", "stale_serves", "evictions", "avg_fetch_seconds",
+                                       "time_saved_seconds", "memory_bytes", "disk_bytes"]],
+                         hide_index=True, use_container_width=True)
+
+            st.markdown("**节省时间最多的股票**")
+            symbol_df = pd.DataFrame(cache_report["symbols"][:20])
+            st.dataframe(symbol_df[["namespace", "symbol", "hits", "misses", "stale_serves", "evictions",
+                                    "time_saved_seconds"]],
+                         hide_index=True, use_container_width=True)
+
+        spot_stats = spot_snapshot.stats()
+        st.caption(f"行情快照: {spot_stats['rows']} 只股票，刷新 {spot_stats['refresh_count']} 次，"
+                   f"查询 {spot_stats['lookup_count']} 次")
+
 # 页脚
 st.markdown("""
 <div class="footer">
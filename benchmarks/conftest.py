@@ -0,0 +1,128 @@
+"""
+性能基准测试的公共夹具
+
+数据来自合成市场（默认，UPSTREAM_MODE=synthetic）或录制的夹具（UPSTREAM_MODE=replay），
+不访问网络；大模型调用替换为固定的返回值，只测量本地代码的耗时。
+K线仓库、财务数据缓存、数据源排名和新闻缓存写入临时目录，不影响项目的缓存。
+
+运行方式见 run_benchmark.sh。
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+# 必须在导入 src 之前设置，全局录制器在导入时读取环境变量
+os.environ.setdefault("UPSTREAM_MODE", "synthetic")
+
+from src.tools.upstream_recorder import upstream_recorder, use_synthetic_market, SYNTHETIC
+from src.tools.synthetic_market import SyntheticMarket
+
+# 合成市场的规模
+BENCH_TICKERS = int(os.getenv("BENCH_TICKERS", "50"))
+BENCH_YEARS = int(os.getenv("BENCH_YEARS", "3"))
+BENCH_SEED = int(os.getenv("BENCH_SEED", "42"))
+
+# 大模型的固定返回值
+STUB_DECISION = {
+    "action": "buy",
+    "quantity": 100,
+    "confidence": 0.6,
+    "agent_signals": [],
+    "reasoning": "基准测试使用的固定决策",
+}
+STUB_SENTIMENT = "0.3"
+
+
+def stub_chat_completion(messages, tools=None, tool_choice=None, **kwargs):
+    """替代 get_chat_completion：带工具时返回工具调用，否则返回情感分数"""
+    if tools:
+        return {"tool_calls": [{"function": {
+            "name": "make_investment_decision",
+            "arguments": json.dumps(STUB_DECISION, ensure_ascii=False),
+        }}]}
+    if "情感" in messages[-1]["content"]:
+        return STUB_SENTIMENT
+    return json.dumps(STUB_DECISION, ensure_ascii=False)
+
+
+@pytest.fixture(scope="session")
+def market():
+    """基准测试使用的合成市场，截止到昨天"""
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    return SyntheticMarket(n_tickers=BENCH_TICKERS, years=BENCH_YEARS, end_date=yesterday, seed=BENCH_SEED)
+
+
+@pytest.fixture(scope="session")
+def ticker(market):
+    """基准测试的股票代码；回放录制的数据时通过 BENCH_TICKER 指定"""
+    return os.getenv("BENCH_TICKER") or market.codes[0]
+
+
+@pytest.fixture(scope="session")
+def date_range(market):
+    """最近一年的 (开始日期, 结束日期)"""
+    end = market.end_date
+    return (end - timedelta(days=365)).strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_environment(market):
+    """上游数据改由合成市场响应，本地缓存写入临时目录"""
+    from src.tools.bar_store import bar_store
+    from src.tools.cache_metrics import cache_metrics
+    from src.tools.source_ranking import source_ranker
+    from src.tools.fundamentals_cache import fundamentals_cache
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_")
+    old_cwd, old_root, old_db = os.getcwd(), bar_store.root_dir, fundamentals_cache.path
+    bar_store.root_dir = os.path.join(tmp_dir, "bar_store")
+    fundamentals_cache.path = os.path.join(tmp_dir, "fundamentals.sqlite")
+    # 合成数据的耗时和缓存统计不保存到文件（退出时也不保存，因此结束后不恢复）
+    source_ranker.path = None
+    cache_metrics.path = None
+    # 新闻和情感分析缓存使用相对路径 src/data
+    os.chdir(tmp_dir)
+    if upstream_recorder.mode == SYNTHETIC:
+        use_synthetic_market(market)
+    try:
+        yield tmp_dir
+    finally:
+        os.chdir(old_cwd)
+        bar_store.root_dir, fundamentals_cache.path = old_root, old_db
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def stub_llm():
+    """把已导入模块中的 get_chat_completion 替换为固定返回值，需要在导入智能体模块之后使用"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, module in list(sys.modules.items()):
+            if name.startswith("src.") and hasattr(module, "get_chat_completion"):
+                monkeypatch.setattr(module, "get_chat_completion", stub_chat_completion)
+        yield stub_chat_completion
+
+
+def clear_memory_caches():
+    """清空缓存管理器的内存层，使下一次调用重新读取K线仓库并计算指标"""
+    from src.tools.cache_manager import cache_manager
+
+    cache_manager.clear_memory()
+
+
+@pytest.fixture(scope="session")
+def price_history(ticker, date_range):
+    """通过 get_price_history 获取的带技术指标的K线"""
+    from src.tools.api import get_price_history
+
+    df = get_price_history(ticker, *date_range)
+    assert not df.empty, f"无法获取 {ticker} 的行情数据"
+    return df
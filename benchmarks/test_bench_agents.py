@@ -0,0 +1,94 @@
+"""各智能体节点和完整工作流的基准测试，大模型调用使用固定返回值"""
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import HumanMessage
+
+from src.agents.market_data import market_data_agent
+from src.agents.technicals import technical_analyst_agent
+from src.agents.fundamentals import fundamentals_agent
+from src.agents.sentiment import sentiment_agent
+from src.agents.valuation import valuation_agent
+from src.agents.risk_manager import risk_management_agent
+from src.agents.portfolio_manager import portfolio_management_agent
+from src.main import run_hedge_fund
+from conftest import clear_memory_caches
+
+PORTFOLIO = {"position_ratio": 30.0, "holding_cost": 0.0, "initial_position": 0}
+ANALYSTS = [technical_analyst_agent, fundamentals_agent, sentiment_agent, valuation_agent]
+
+
+def initial_state(ticker, date_range):
+    return {
+        "messages": [HumanMessage(content="根据提供的数据做出交易决策。")],
+        "data": {
+            "ticker": ticker,
+            "portfolio": PORTFOLIO,
+            "start_date": date_range[0],
+            "end_date": date_range[1],
+            "num_of_news": 5,
+        },
+        "metadata": {"show_reasoning": False},
+    }
+
+
+def merge(state, output):
+    """按 AgentState 的合并规则把节点输出合并到状态中"""
+    messages = output.get("messages", [])
+    # 风险管理节点返回的是完整的消息列表
+    if messages[:len(state["messages"])] == state["messages"]:
+        messages = messages[len(state["messages"]):]
+    return {
+        "messages": state["messages"] + messages,
+        "data": {**state["data"], **output.get("data", {})},
+        "metadata": state["metadata"],
+    }
+
+
+@pytest.fixture(scope="module")
+def states(ticker, date_range, stub_llm):
+    """各节点的输入状态"""
+    market_state = initial_state(ticker, date_range)
+    analyst_state = merge(market_state, market_data_agent(market_state))
+    risk_state = analyst_state
+    for agent in ANALYSTS:
+        risk_state = merge(risk_state, agent(analyst_state))
+    portfolio_state = merge(risk_state, risk_management_agent(risk_state))
+    return {"market": market_state, "analyst": analyst_state, "risk": risk_state, "portfolio": portfolio_state}
+
+
+def test_market_data_agent(benchmark, states):
+    output = benchmark(market_data_agent, states["market"])
+    assert output["data"]["prices"]
+
+
+@pytest.mark.parametrize("agent", ANALYSTS, ids=lambda a: a.__name__)
+def test_analyst_agent(benchmark, states, agent):
+    output = benchmark(agent, states["analyst"])
+    assert output["messages"]
+
+
+def test_risk_management_agent(benchmark, states):
+    output = benchmark(risk_management_agent, states["risk"])
+    assert output["messages"]
+
+
+def test_portfolio_management_agent(benchmark, states):
+    output = benchmark(portfolio_management_agent, states["portfolio"])
+    assert output["messages"]
+
+
+def test_run_hedge_fund_warm(benchmark, ticker, date_range, stub_llm):
+    """数据已在内存缓存中时的完整工作流"""
+    result = benchmark(run_hedge_fund, ticker, *date_range, PORTFOLIO)
+    assert result
+
+
+def test_run_hedge_fund_from_bar_store(benchmark, ticker, date_range, stub_llm):
+    """内存缓存失效后的完整工作流，K线从本地仓库读取"""
+    result = benchmark.pedantic(run_hedge_fund, args=(ticker, *date_range, PORTFOLIO),
+                                setup=clear_memory_caches, rounds=10, warmup_rounds=1)
+    assert result
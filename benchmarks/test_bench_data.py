@@ -0,0 +1,60 @@
+"""数据协议和 get_price_history 技术指标计算的基准测试"""
+
+import pytest
+
+from src.tools.data_protocol import PriceDataProtocol
+from src.tools.api import add_technical_indicators, get_price_history
+from conftest import clear_memory_caches
+
+BARS_COLUMNS = ["date", "open", "high", "low", "close", "volume", "amount", "amplitude",
+                "pct_change", "change_amount", "turnover"]
+
+
+@pytest.fixture(scope="module")
+def bars(price_history):
+    """不含技术指标的K线"""
+    return price_history[BARS_COLUMNS].copy()
+
+
+@pytest.fixture(scope="module")
+def raw_bars(bars):
+    """akshare 原始中文列名的K线"""
+    return bars.rename(columns={"date": "日期", "open": "开盘", "high": "最高", "low": "最低",
+                                "close": "收盘", "volume": "成交量", "amount": "成交额"})
+
+
+def test_protocol_standardize(benchmark, raw_bars):
+    df = benchmark(PriceDataProtocol.standardize, raw_bars)
+    assert len(df) == len(raw_bars)
+
+
+def test_protocol_standardize_records(benchmark, bars):
+    """技术分析智能体从 state 中读取的是压缩后的字典列表"""
+    records = PriceDataProtocol.compress(bars)
+    df = benchmark(PriceDataProtocol.standardize, records)
+    assert len(df) == len(records)
+
+
+def test_protocol_compress(benchmark, price_history):
+    records = benchmark(PriceDataProtocol.compress, price_history)
+    assert len(records) == len(price_history)
+
+
+def test_technical_indicators(benchmark, bars):
+    """get_price_history 中的技术指标计算"""
+    df = benchmark(add_technical_indicators, bars)
+    assert "hurst_exponent" in df.columns
+
+
+def test_price_history_warm(benchmark, ticker, date_range):
+    """内存缓存命中时的 get_price_history"""
+    get_price_history(ticker, *date_range)
+    df = benchmark(get_price_history, ticker, *date_range)
+    assert not df.empty
+
+
+def test_price_history_from_bar_store(benchmark, ticker, date_range):
+    """内存缓存失效后，从本地K线仓库读取并重新计算指标"""
+    df = benchmark.pedantic(get_price_history, args=(ticker, *date_range),
+                            setup=clear_memory_caches, rounds=20, warmup_rounds=1)
+    assert not df.empty
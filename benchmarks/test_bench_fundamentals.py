@@ -0,0 +1,41 @@
+"""财务指标和财务报表获取的基准测试（缓存全部失效时的冷启动）"""
+
+from src.tools.api import get_financial_metrics, get_financial_statements
+from src.tools.fundamentals_cache import fundamentals_cache
+from src.tools.spot_snapshot import spot_snapshot
+from src.tools.upstream_recorder import upstream_recorder
+from conftest import clear_memory_caches
+
+
+def clear_fundamentals_caches():
+    """清空进程内缓存、磁盘缓存和行情快照，使下一次调用重新下载全部上游数据"""
+    clear_memory_caches()
+    fundamentals_cache.delete("financial_metrics")
+    fundamentals_cache.delete("financial_statements")
+    spot_snapshot.invalidate()
+
+
+def test_financial_metrics_cold(benchmark, ticker):
+    """每个上游数据集（财务分析指标、全市场行情）只下载一次"""
+    clear_fundamentals_caches()
+    before = upstream_recorder.replayed
+    result = get_financial_metrics(ticker)
+    benchmark.extra_info["upstream_calls"] = upstream_recorder.replayed - before
+    assert result[0]
+
+    result = benchmark.pedantic(get_financial_metrics, args=(ticker,),
+                                setup=clear_fundamentals_caches, rounds=10, warmup_rounds=1)
+    assert result[0]
+
+
+def test_financial_statements_cold(benchmark, ticker):
+    """三张报表并发获取"""
+    clear_fundamentals_caches()
+    before = upstream_recorder.replayed
+    result = get_financial_statements(ticker)
+    benchmark.extra_info["upstream_calls"] = upstream_recorder.replayed - before
+    assert len(result) == 2
+
+    result = benchmark.pedantic(get_financial_statements, args=(ticker,),
+                                setup=clear_fundamentals_caches, rounds=10, warmup_rounds=1)
+    assert len(result) == 2
@@ -0,0 +1,57 @@
+"""技术分析函数的基准测试"""
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from src.agents import technicals
+from src.tools.data_protocol import PriceDataProtocol
+
+SIGNAL_FUNCTIONS = [
+    technicals.calculate_trend_signals,
+    technicals.calculate_mean_reversion_signals,
+    technicals.calculate_momentum_signals,
+    technicals.calculate_volatility_signals,
+    technicals.calculate_stat_arb_signals,
+]
+
+INDICATOR_FUNCTIONS = [
+    technicals.calculate_macd,
+    technicals.calculate_rsi,
+    technicals.calculate_bollinger_bands,
+    lambda df: technicals.calculate_ema(df, 21),
+    technicals.calculate_adx,
+    technicals.calculate_ichimoku,
+    technicals.calculate_atr,
+    technicals.calculate_obv,
+]
+
+
+@pytest.fixture(scope="module")
+def prices_df(price_history):
+    """技术分析智能体使用的K线：压缩后再标准化"""
+    return PriceDataProtocol.standardize(PriceDataProtocol.compress(price_history))
+
+
+@pytest.mark.parametrize("func", SIGNAL_FUNCTIONS, ids=lambda f: f.__name__)
+def test_signal_function(benchmark, prices_df, func):
+    # 部分函数会在传入的DataFrame上添加列，每轮使用独立副本
+    result = benchmark.pedantic(func, setup=lambda: ((prices_df.copy(),), {}), rounds=30, warmup_rounds=1)
+    assert result["signal"] in ("bullish", "bearish", "neutral")
+
+
+@pytest.mark.parametrize("func", INDICATOR_FUNCTIONS,
+                         ids=["macd", "rsi", "bollinger_bands", "ema", "adx", "ichimoku", "atr", "obv"])
+def test_indicator_function(benchmark, prices_df, func):
+    benchmark.pedantic(func, setup=lambda: ((prices_df.copy(),), {}), rounds=30, warmup_rounds=1)
+
+
+def test_hurst_exponent(benchmark, prices_df):
+    value = benchmark(technicals.calculate_hurst_exponent, prices_df["close"])
+    assert 0 <= value <= 1
+
+
+def test_weighted_signal_combination(benchmark, prices_df):
+    signals = [func(prices_df.copy()) for func in SIGNAL_FUNCTIONS]
+    result = benchmark(technicals.weighted_signal_combination, signals, [0.3, 0.2, 0.25, 0.15, 0.1])
+    assert result["signal"] in ("bullish", "bearish", "neutral")
@@ -2,7 +2,37 @@
 import os
 import sys
 import argparse
+import pandas as pd
 from src.tools.data_provider_fix import check_all_caches, repair_stock_names_cache, reset_cache, check_pickle_validity
+from src.tools.cache_manager import cache_manager
+from src.tools.bar_store import bar_store
+
+# 统计表中显示的列
+STATS_COLUMNS = ["hits", "memory_hits", "disk_hits", "shared_hits", "misses", "hit_rate", "stale_serves",
+                 "evictions", "fetches", "avg_fetch_seconds", "time_saved_seconds", "memory_bytes", "disk_bytes"]
+
+
+def print_cache_stats(top=20):
+    """
+    打印各命名空间和节省时间最多的股票的缓存效果
+    """
+    report = cache_manager.report()
+    if not report["namespaces"]:
+        print("暂无缓存统计")
+        return
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+    namespaces = pd.DataFrame(report["namespaces"]).set_index("namespace")
+    print(namespaces[STATS_COLUMNS + ["symbols"]].to_string(float_format=lambda x: f"{x:.3f}"))
+
+    print(f"\n节省时间最多的 {top} 条记录:")
+    symbols = pd.DataFrame(report["symbols"][:top]).set_index(["namespace", "symbol"])
+    print(symbols[STATS_COLUMNS].to_string(float_format=lambda x: f"{x:.3f}"))
+
+    total_saved = sum(row["time_saved_seconds"] or 0 for row in report["namespaces"])
+    print(f"\n累计节省约 {total_saved:.1f} 秒；memory_bytes 只包含当前进程的内存层")
+
 
 def main():
     """
@@ -13,6 +43,11 @@ def main():
     parser.add_argument('--repair', action='store_true', help='修复股票名称缓存')
     parser.add_argument('--reset', action='store_true', help='重置所有缓存文件（会先备份）')
     parser.add_argument('--force', action='store_true', help='强制执行，不询问确认')
+    parser.add_argument('--stats', action='store_true', help='显示各缓存命名空间和股票的命中、未命中、淘汰、占用空间和节省的时间')
+    parser.add_argument('--top', type=int, default=20, help='--stats 显示的股票记录数（默认20）')
+    parser.add_argument('--reset-stats', action='store_true', help='清空缓存统计')
+    parser.add_argument('--purge-adjusted-bars', action='store_true',
+                        help='删除K线仓库中旧版本保存的前复权/后复权K线（现在由不复权K线和复权因子计算，只需执行一次）')
 
     args = parser.parse_args()
 
@@ -20,6 +55,20 @@ def main():
         parser.print_help()
         return
 
+    if args.stats:
+        print("\n=========== 缓存统计 ===========")
+        print_cache_stats(args.top)
+
+    if args.reset_stats:
+        cache_manager.metrics.reset()
+        print("✅ 缓存统计已清空")
+
+    if args.purge_adjusted_bars:
+        print("\n=========== 清理旧的复权K线 ===========")
+        for adjust in ("qfq", "hfq"):
+            print(f"删除 {bar_store.drop_series(adjust)} 个 {adjust} 序列")
+        print("✅ 清理完成，不复权K线和复权因子表保留")
+
     if args.check:
         print("\n=========== 缓存文件检查 ===========")
         check_result = check_all_caches()
@@ -0,0 +1,39 @@
+#!/bin/bash
+
+# 打印开始信息
+echo "=== 开始性能基准测试 ==="
+echo "开始时间: $(date)"
+echo
+
+# 用法：
+#   ./run_benchmark.sh baseline   运行并保存为新的基准
+#   ./run_benchmark.sh            与最近一次保存的基准比较，任何测试的最短耗时变慢超过阈值时失败
+# 环境变量：
+#   BENCH_MAX_REGRESSION  允许的耗时增幅，默认 20%（比较最短耗时，受机器负载的影响最小）
+#   UPSTREAM_MODE         数据来源，默认 synthetic（合成市场），也可以用 replay 回放录制的数据
+#   BENCH_TICKER          回放录制的数据时使用的股票代码
+BENCH_STORAGE="benchmarks/.benchmarks"
+BENCH_MAX_REGRESSION="${BENCH_MAX_REGRESSION:-20%}"
+
+# 激活虚拟环境
+echo "激活Python虚拟环境..."
+source venv/bin/activate
+
+if [ "$1" == "baseline" ]; then
+    echo "保存新的性能基准..."
+    python -m pytest benchmarks -q --benchmark-storage="$BENCH_STORAGE" --benchmark-autosave
+else
+    echo "与最近一次保存的基准比较，允许的耗时增幅: $BENCH_MAX_REGRESSION"
+    python -m pytest benchmarks -q --benchmark-storage="$BENCH_STORAGE" \
+        --benchmark-compare --benchmark-compare-fail="min:$BENCH_MAX_REGRESSION"
+fi
+status=$?
+
+# 退出虚拟环境
+deactivate
+
+# 打印结束信息
+echo
+echo "=== 基准测试完成 ==="
+echo "结束时间: $(date)"
+exit $status
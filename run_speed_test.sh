@@ -5,6 +5,12 @@ echo "=== 开始A股单只股票数据获取速度测试 ==="
 echo "开始时间: $(date)"
 echo
 
+# 可选参数：record（录制上游数据）或 replay（离线回放录制的数据）
+if [ -n "$1" ]; then
+    export UPSTREAM_MODE="$1"
+    echo "上游数据模式: $UPSTREAM_MODE"
+fi
+
 # 激活虚拟环境
 echo "激活Python虚拟环境..."
 source venv/bin/activate
@@ -15,29 +15,33 @@ import pandas as pd
 
 # 导入数据提供层
 from src.tools.data_provider import get_historical_data, get_market_data, get_stock_name
+from src.tools.request_context import RequestContext, request_context
 
 
 ##### Run the Hedge Fund #####
-def run_hedge_fund(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5):
-    final_state = app.invoke(
-        {
-            "messages": [
-                HumanMessage(
-                    content="根据提供的数据做出交易决策。",
-                )
-            ],
-            "data": {
-                "ticker": ticker,
-                "portfolio": portfolio,
-                "start_date": start_date,
-                "end_date": end_date,
-                "num_of_news": num_of_news,
+def run_hedge_fund(ticker: str, start_date: str, end_date: str, portfolio: dict, show_reasoning: bool = False, num_of_news: int = 5,
+                   context: RequestContext = None):
+    # 所有数据获取和大模型调用共享同一个截止时间和重试预算
+    with request_context(context):
+        final_state = app.invoke(
+            {
+                "messages": [
+                    HumanMessage(
+                        content="根据提供的数据做出交易决策。",
+                    )
+                ],
+                "data": {
+                    "ticker": ticker,
+                    "portfolio": portfolio,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "num_of_news": num_of_news,
+                },
+                "metadata": {
+                    "show_reasoning": show_reasoning,
+                }
             },
-            "metadata": {
-                "show_reasoning": show_reasoning,
-            }
-        },
-    )
+        )
     return final_state["messages"][-1].content
 
 
@@ -88,6 +92,10 @@ if __name__ == "__main__":
                         help='Holding cost per share if already holding (default: 0)')
     parser.add_argument('--initial-position', type=int, default=0,
                         help='Initial stock position (default: 0)')
+    parser.add_argument('--timeout', type=float,
+                        help='Overall time budget in seconds for data fetching and LLM calls (default: unlimited)')
+    parser.add_argument('--retry-budget', type=int,
+                        help='Total number of retries allowed across all data and LLM calls (default: unlimited)')
 
     args = parser.parse_args()
 
@@ -126,7 +134,8 @@ if __name__ == "__main__":
         end_date=end_date.strftime('%Y-%m-%d'),
         portfolio=portfolio,
         show_reasoning=args.show_reasoning,
-        num_of_news=args.num_of_news
+        num_of_news=args.num_of_news,
+        context=RequestContext(timeout=args.timeout, retry_budget=args.retry_budget)
     )
     print("\nFinal Result:")
     print(result)
@@ -0,0 +1,155 @@
+"""
+复权因子表与本地复权计算
+
+K线仓库只保存不复权K线，前复权和后复权K线由每只股票的后复权因子表在读取时计算：
+- 后复权价格 = 不复权价格 × 当日后复权因子
+- 前复权价格 = 不复权价格 × 当日后复权因子 / 最新后复权因子
+
+三种复权方式共用一份不复权K线，分红送转只会在因子表中新增一行，已保存的K线不会失效。
+因子表整体很小（每次除权除息一行），只在可能发生了新的除权除息时整体重新下载：
+不复权K线显示在因子表最后一个除权日之后又有除权（昨收价与前一根K线的收盘价不一致），
+或者因子表已超过 FACTOR_REFRESH_DAYS 天（兜底没有提供涨跌额的数据源和很小的分红）。
+"""
+
+from datetime import datetime, timedelta
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+from src.tools.bar_store import bar_store
+from src.tools.circuit_breaker import protect_sources
+from src.tools.source_ranking import rank_sources
+
+# 需要按因子换算的价格列（成交量、成交额、涨跌幅、换手率与复权方式无关）
+PRICE_COLUMNS = ("open", "high", "low", "close", "change_amount")
+# 因子列名
+FACTOR_COLUMN = "hfq_factor"
+# 因子表超过该天数后重新下载
+FACTOR_REFRESH_DAYS = 7
+# 昨收价与前一根K线收盘价相差超过该值（元）时视为除权除息日，略大于两位小数的舍入误差
+EX_DATE_TOLERANCE = 0.015
+
+
+def _fetch_factors_from_sina(symbol):
+    """从新浪财经获取后复权因子表"""
+    prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+    df = ak.stock_zh_a_daily(symbol=f"{prefix}{symbol}", adjust="hfq-factor")
+
+    if df is None or df.empty:
+        return None
+
+    return pd.DataFrame({
+        "date": pd.to_datetime(df["date"]),
+        FACTOR_COLUMN: pd.to_numeric(df[FACTOR_COLUMN], errors="coerce"),
+    }).dropna().sort_values("date").reset_index(drop=True)
+
+
+# 复权因子的数据源：(名称, 获取函数(symbol))，返回按日期升序的 date、hfq_factor 两列
+ADJUSTMENT_FACTOR_SOURCES = [
+    ("新浪财经", _fetch_factors_from_sina),
+]
+
+
+def fetch_adjustment_factors(symbol):
+    """
+    下载后复权因子表
+
+    Args:
+        symbol: 股票代码
+
+    Returns:
+        DataFrame: date、hfq_factor 两列，所有数据源都失败时返回None
+    """
+    ranked_sources = protect_sources("adjust_factors", rank_sources(
+        "adjust_factors", ADJUSTMENT_FACTOR_SOURCES, is_valid=lambda df: df is not None))
+    for source_name, get_data_func in ranked_sources:
+        try:
+            df = get_data_func(symbol)
+            if df is not None and not df.empty:
+                return df
+        except Exception as e:
+            print(f"从{source_name}获取 {symbol} 的复权因子失败: {e}")
+    return None
+
+
+def ex_dates(raw):
+    """
+    从不复权K线中找出除权除息日：当天的昨收价（收盘价 - 涨跌额）与前一根K线的收盘价不一致
+
+    Returns:
+        DatetimeIndex: 除权除息日；缺少涨跌额时为空
+    """
+    if raw is None or len(raw) < 2 or "change_amount" not in raw.columns:
+        return pd.DatetimeIndex([])
+    pre_close = raw["close"] - raw["change_amount"]
+    gap = (pre_close - raw["close"].shift(1)).abs()
+    return pd.DatetimeIndex(pd.to_datetime(raw.loc[gap > EX_DATE_TOLERANCE, "date"]))
+
+
+def load_adjustment_factors(symbol, raw, fetch_factors=fetch_adjustment_factors, store=bar_store):
+    """
+    读取复权因子表，可能缺少新的除权除息时重新下载
+
+    以下情况重新下载，每只股票每天最多下载一次：仓库中没有因子表；不复权K线在因子表最后一个除权日之后
+    又出现除权除息；因子表已超过 FACTOR_REFRESH_DAYS 天。
+
+    Args:
+        symbol: 股票代码
+        raw: 需要换算的不复权K线
+        fetch_factors: 下载函数 fetch_factors(symbol)
+        store: K线仓库
+
+    Returns:
+        DataFrame: date、hfq_factor 两列；无法获取时返回仓库中的旧表，仓库中也没有时返回None
+    """
+    factors, fetched_on = store.read_factors(symbol)
+    today = pd.Timestamp(datetime.now()).normalize()
+    if fetched_on is not None:
+        if fetched_on >= today:
+            return factors
+        last_ex_date = pd.Timestamp(factors["date"].iloc[-1]) if not factors.empty else None
+        missing_ex_date = last_ex_date is None or (ex_dates(raw) > last_ex_date).any()
+        if not missing_ex_date and today - fetched_on <= timedelta(days=FACTOR_REFRESH_DAYS):
+            return factors
+
+    fresh = fetch_factors(symbol)
+    if fresh is None or fresh.empty:
+        if fetched_on is not None:
+            print(f"警告：无法更新 {symbol} 的复权因子，使用 {fetched_on.strftime('%Y-%m-%d')} 获取的因子表")
+            return factors
+        return None
+
+    store.write_factors(symbol, fresh, today)
+    return fresh
+
+
+def adjust_bars(raw, factors, adjust):
+    """
+    由不复权K线和后复权因子表计算复权K线
+
+    Args:
+        raw: 不复权K线，包含 date 和价格列
+        factors: 按日期升序的 date、hfq_factor 两列
+        adjust: ""、"qfq" 或 "hfq"
+
+    Returns:
+        DataFrame: 复权后的K线，价格保留两位小数
+    """
+    if not adjust or raw is None or raw.empty:
+        return raw
+
+    factor_dates = factors["date"].values.astype("datetime64[ns]")
+    factor_values = factors[FACTOR_COLUMN].to_numpy(dtype="float64")
+    # 每根K线使用除权日不晚于当天的最后一个因子，早于因子表的K线使用第一个因子
+    index = np.searchsorted(factor_dates, pd.to_datetime(raw["date"]).values.astype("datetime64[ns]"),
+                            side="right") - 1
+    scale = factor_values[np.clip(index, 0, len(factor_values) - 1)]
+    if adjust == "qfq":
+        scale = scale / factor_values[-1]
+
+    df = raw.copy()
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = np.round(df[col].to_numpy(dtype="float64") * scale, 2)
+    return df
@@ -6,82 +6,46 @@
 """
 
 import akshare as ak
-import requests
 import inspect
 import functools
 import time
 import random
 
+from src.tools.request_context import allow_retry
+from src.tools.http_session import configure_session, install_akshare_session
+from src.tools.upstream_recorder import FixtureNotFoundError, install_akshare_recorder
+
+# 关键函数的重试补丁只安装一次，重复调用 configure_akshare_timeout 时只更新超时时间
+_akshare_patched = False
+
 def configure_akshare_timeout(timeout=30):
     """
     配置akshare的请求超时时间
 
+    akshare 的请求改由共享的 HTTP 连接池发出（见 http_session.py），
+    超时时间不会超过当前请求上下文的剩余时间，请求发出前按目标主机限流。
+    不修改全局的 requests 函数。
+
     Args:
         timeout: 超时时间（秒），默认30秒
     """
+    global _akshare_patched
     try:
-        # 修改akshare内部使用的requests库的默认超时设置
-        # akshare大部分网络请求都是通过requests库实现的
-        if hasattr(ak, 'requests') and ak.requests:
-            ak.requests.DEFAULT_TIMEOUT = timeout
-            print(f"已将akshare的默认超时时间设置为 {timeout} 秒")
-        else:
-            # 如果无法直接访问ak.requests，则修改全局requests库的设置
-            # 这可能会影响其他使用requests库的代码
-            old_request = requests.Session.request
-
-            def new_request(self, method, url, **kwargs):
-                if 'timeout' not in kwargs:
-                    kwargs['timeout'] = timeout
-                return old_request(self, method, url, **kwargs)
-
-            requests.Session.request = new_request
-            print(f"已将requests库的默认超时时间设置为 {timeout} 秒")
-
-        # 直接修改requests库的get和post方法，而不是修改akshare的函数
-        patch_requests_timeout(timeout)
-
-        # 直接修补akshare中的关键函数
-        patch_akshare_functions(timeout)
+        configure_session(timeout=timeout)
+        count = install_akshare_session()
+        print(f"已将akshare的请求切换到共享连接池（{count} 个模块），默认超时时间 {timeout} 秒")
+
+        # 录制/回放层位于最内层，之后再修补akshare中的关键函数
+        install_akshare_recorder()
+        if not _akshare_patched:
+            patch_akshare_functions(timeout)
+            _akshare_patched = True
 
         return True
     except Exception as e:
         print(f"设置akshare超时时间时出错: {e}")
         return False
 
-def patch_requests_timeout(timeout=30):
-    """
-    修改requests库的get和post方法，添加默认超时参数
-
-    Args:
-        timeout: 超时时间（秒），默认30秒
-    """
-    try:
-        # 保存原始方法
-        original_get = requests.get
-        original_post = requests.post
-
-        # 创建新的方法，添加默认超时参数
-        @functools.wraps(original_get)
-        def new_get(url, **kwargs):
-            if 'timeout' not in kwargs:
-                kwargs['timeout'] = timeout
-            return original_get(url, **kwargs)
-
-        @functools.wraps(original_post)
-        def new_post(url, **kwargs):
-            if 'timeout' not in kwargs:
-                kwargs['timeout'] = timeout
-            return original_post(url, **kwargs)
-
-        # 替换requests库的方法
-        requests.get = new_get
-        requests.post = new_post
-
-        print(f"成功修改requests库的get和post方法，添加了 {timeout} 秒的默认超时设置")
-    except Exception as e:
-        print(f"修改requests库方法时出错: {e}")
-
 def patch_akshare_functions(timeout=30):
     """
     直接修补akshare中的关键函数，确保它们使用正确的超时设置
@@ -103,11 +67,17 @@ def patch_akshare_functions(timeout=30):
                 for retry in range(max_retries):
                     try:
                         return original_stock_zh_a_hist(*args, **kwargs)
+                    except FixtureNotFoundError:
+                        # 回放模式下缺少录制记录，重试没有意义
+                        raise
                     except Exception as e:
                         if retry < max_retries - 1:
                             # 添加随机抖动避免同时重试
                             jitter = random.uniform(0.8, 1.2)
                             sleep_time = retry_delay * (2 ** retry) * jitter
+                            if not allow_retry(sleep_time):
+                                print(f"获取历史数据失败: {e}, 剩余时间或重试次数不足，不再重试")
+                                raise
                             print(f"获取历史数据失败: {e}, {sleep_time:.2f}秒后重试 ({retry+1}/{max_retries})...")
                             time.sleep(sleep_time)
                         else:
@@ -131,11 +101,17 @@ def patch_akshare_functions(timeout=30):
                 for retry in range(max_retries):
                     try:
                         return original_stock_zh_a_spot_em(*args, **kwargs)
+                    except FixtureNotFoundError:
+                        # 回放模式下缺少录制记录，重试没有意义
+                        raise
                     except Exception as e:
                         if retry < max_retries - 1:
                             # 添加随机抖动避免同时重试
                             jitter = random.uniform(0.8, 1.2)
                             sleep_time = retry_delay * (2 ** retry) * jitter
+                            if not allow_retry(sleep_time):
+                                print(f"获取实时行情失败: {e}, 剩余时间或重试次数不足，不再重试")
+                                raise
                             print(f"获取实时行情失败: {e}, {sleep_time:.2f}秒后重试 ({retry+1}/{max_retries})...")
                             time.sleep(sleep_time)
                         else:
@@ -149,6 +125,3 @@ def patch_akshare_functions(timeout=30):
         print(f"成功修补akshare关键函数，添加了超时设置和重试逻辑")
     except Exception as e:
         print(f"修补akshare函数时出错: {e}")
-
-# 默认在导入时配置30秒的超时时间
-configure_akshare_timeout(30)
\ No newline at end of file
@@ -1,16 +1,20 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import pandas as pd
 import sys
 import os
-import concurrent.futures
+import threading
 
 # 导入akshare配置模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.tools.akshare_config import configure_akshare_timeout
+from src.tools.single_flight import patch_akshare_single_flight
 
 # 设置akshare超时时间为30秒
 configure_akshare_timeout(30)
 
+# 合并并发的重复akshare请求
+patch_akshare_single_flight()
+
 import akshare as ak
 from datetime import datetime, timedelta
 import json
@@ -21,12 +25,24 @@ import random
 
 # 引入数据协议类
 from src.tools.data_protocol import PriceDataProtocol
+from src.tools.bar_store import bar_store
+from src.tools.cache_manager import cache_manager, make_key
+from src.tools.interval_cache import get_adjusted_bars, get_cached_price_bars, standardize_bars
+from src.tools.adjust_factors import fetch_adjustment_factors
+from src.tools.spot_snapshot import spot_snapshot
+from src.tools.parallel_fetcher import race_sources
+from src.tools.source_ranking import rank_sources, source_ranker
+from src.tools.circuit_breaker import circuit_breakers, protect_sources
+from src.tools.request_context import allow_retry
+from src.tools.executors import get_executor, submit_windowed
 
 
 def retry_on_exception(max_retries=3, initial_delay=1, backoff_factor=2, exceptions=(Exception,)):
     """
     装饰器：在遇到指定异常时进行重试
 
+    设置了请求上下文时，剩余时间不足或重试预算用完后不再重试。
+
     Args:
         max_retries: 最大重试次数
         initial_delay: 初始延迟时间（秒）
@@ -53,6 +69,9 @@ def retry_on_exception(max_retries=3, initial_delay=1, backoff_factor=2, excepti
                         # 添加一些随机性，避免多个请求同时重试
                         jitter = random.uniform(0.8, 1.2)
                         sleep_time = delay * jitter
+                        if not allow_retry(sleep_time):
+                            print(f"请求失败: {str(e)}，剩余时间或重试次数不足，放弃重试")
+                            break
                         print(f"请求失败: {str(e)}，{sleep_time:.2f} 秒后重试...")
                         time.sleep(sleep_time)
                         delay *= backoff_factor
@@ -66,313 +85,209 @@ def retry_on_exception(max_retries=3, initial_delay=1, backoff_factor=2, excepti
     return decorator
 
 
-# 财务指标数据缓存
-_financial_metrics_cache = {}
-_financial_cache_expiry = {}
-
-def get_financial_metrics_from_sina(symbol: str) -> Dict[str, Any]:
-    """从新浪财经获取财务指标数据"""
-    try:
-        # 判断股票代码前缀
-        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        stock_code = f"{prefix}{symbol}"
-
-        # 获取新浪财务指标
-        financial_data = ak.stock_financial_analysis_indicator(
-            symbol=symbol,
-            start_year=str(datetime.now().year-2)
-        )
-
-        if financial_data is None or financial_data.empty:
-            return [{}]
-
-        # 按日期排序并获取最新的数据
-        financial_data['日期'] = pd.to_datetime(financial_data['日期'])
-        financial_data = financial_data.sort_values('日期', ascending=False)
-        latest_financial = financial_data.iloc[0]
-
-        # 获取实时行情
-        realtime_data = ak.stock_zh_a_spot_em()
-        if realtime_data is None or realtime_data.empty:
-            return [{}]
-
-        stock_data = realtime_data[realtime_data['代码'] == symbol]
-        if stock_data.empty:
-            return [{}]
+def _store_fundamentals(kind, symbol, value, period, persist=True):
+    """
+    按数据所属的报告期缓存财务数据（命名空间 financial_metrics / financial_statements，见 cache_manager.py）
 
-        stock_data = stock_data.iloc[0]
-
-        # 构建指标数据
-        metrics = {
-            "market_cap": float(stock_data.get("总市值", 0)),
-            "float_market_cap": float(stock_data.get("流通市值", 0)),
-            "return_on_equity": float(latest_financial.get("净资产收益率(%)", 0)) / 100.0,
-            "net_margin": float(latest_financial.get("销售净利率(%)", 0)) / 100.0,
-            "operating_margin": float(latest_financial.get("营业利润率(%)", 0)) / 100.0,
-            "revenue_growth": float(latest_financial.get("主营业务收入增长率(%)", 0)) / 100.0,
-            "earnings_growth": float(latest_financial.get("净利润增长率(%)", 0)) / 100.0,
-            "book_value_growth": float(latest_financial.get("净资产增长率(%)", 0)) / 100.0,
-            "current_ratio": float(latest_financial.get("流动比率", 0)),
-            "debt_to_equity": float(latest_financial.get("资产负债率(%)", 0)) / 100.0,
-            "free_cash_flow_per_share": float(latest_financial.get("每股经营性现金流(元)", 0)),
-            "earnings_per_share": float(latest_financial.get("加权每股收益(元)", 0)),
-            "pe_ratio": float(stock_data.get("市盈率-动态", 0)),
-            "price_to_book": float(stock_data.get("市净率", 0)),
-            "price_to_sales": float(stock_data.get("总市值", 0)) / float(latest_financial.get("主营业务收入", 1)) if float(latest_financial.get("主营业务收入", 0)) > 0 else 0,
-            "data_date": latest_financial.get("日期").strftime("%Y-%m-%d"),
-            "expected_latest_date": datetime.now().strftime("%Y-%m-%d")
-        }
+    下一期报告可能出现之前一直有效，披露窗口内按命名空间策略的间隔重新验证
+    """
+    expires_at = cache_manager.set(kind, symbol, value, period=period, persist=persist)
+    print(f"{kind} 的报告期为 {period or '未知'}，缓存到 {datetime.fromtimestamp(expires_at).strftime('%Y-%m-%d %H:%M')}")
 
-        return [metrics]
 
-    except Exception as e:
-        print(f"从新浪财经获取数据时出错：{e}")
-        return [{}]
+def _refresh_market_fields(result, symbol):
+    """
+    用最新的行情快照更新缓存的财务指标中随股价变化的字段
 
-def get_financial_metrics_from_tencent(symbol: str) -> Dict[str, Any]:
-    """从腾讯财经获取财务指标数据"""
+    财务指标按报告期缓存，可能保存数月，而市值、市盈率等字段每天都在变化。
+    获取行情失败时返回原数据。
+    """
+    if not result or not result[0]:
+        return result
+    stock_data = spot_snapshot.get(symbol)
+    if stock_data is None:
+        return result
     try:
-        # 获取腾讯财经数据
-        financial_data = ak.stock_financial_analysis_indicator(
-            symbol=symbol,
-            start_year=str(datetime.now().year-2)
-        )
-
-        if financial_data is None or financial_data.empty:
-            return [{}]
-
-        # 按日期排序并获取最新的数据
-        financial_data['日期'] = pd.to_datetime(financial_data['日期'])
-        financial_data = financial_data.sort_values('日期', ascending=False)
-        latest_financial = financial_data.iloc[0]
-
-        # 获取实时行情
-        realtime_data = ak.stock_zh_a_spot_em()
-        if realtime_data is None or realtime_data.empty:
-            return [{}]
-
-        stock_data = realtime_data[realtime_data['代码'] == symbol]
-        if stock_data.empty:
-            return [{}]
+        metrics = dict(result[0])
+        old_market_cap = metrics.get("market_cap", 0)
+        metrics["market_cap"] = float(stock_data.get("总市值", 0))
+        metrics["float_market_cap"] = float(stock_data.get("流通市值", 0))
+        metrics["pe_ratio"] = float(stock_data.get("市盈率-动态", 0))
+        metrics["price_to_book"] = float(stock_data.get("市净率", 0))
+        if old_market_cap:
+            # 营业收入不变，市销率与总市值同比例变化
+            metrics["price_to_sales"] = metrics.get("price_to_sales", 0) * metrics["market_cap"] / old_market_cap
+        metrics["expected_latest_date"] = datetime.now().strftime("%Y-%m-%d")
+    except (TypeError, ValueError) as e:
+        print(f"更新 {symbol} 的行情字段时出错：{e}")
+        return result
+    return [metrics] + list(result[1:])
+
+
+def get_financial_indicators_from_sina(symbol: str) -> Optional[pd.Series]:
+    """从新浪财经获取最新一期的财务分析指标，没有数据时返回None"""
+    financial_data = ak.stock_financial_analysis_indicator(
+        symbol=symbol,
+        start_year=str(datetime.now().year-2)
+    )
+    if financial_data is None or financial_data.empty:
+        return None
+
+    # 按日期排序并获取最新的数据
+    financial_data['日期'] = pd.to_datetime(financial_data['日期'])
+    return financial_data.sort_values('日期', ascending=False).iloc[0]
+
+
+# 财务分析指标的数据源：[(数据源名称, 获取函数)]，获取函数返回 stock_financial_analysis_indicator
+# 格式（中文列名）的最新一期指标。接入其他数据源时先转换为相同的列名，再加入此列表
+FINANCIAL_INDICATOR_SOURCES = [
+    ("新浪财经", get_financial_indicators_from_sina),
+]
+
+
+def build_financial_metrics(latest_financial: pd.Series, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+    """由最新一期财务分析指标和实时行情计算财务指标"""
+    revenue = float(latest_financial.get("主营业务收入", 0))
+    return {
+        "market_cap": float(stock_data.get("总市值", 0)),
+        "float_market_cap": float(stock_data.get("流通市值", 0)),
+        "return_on_equity": float(latest_financial.get("净资产收益率(%)", 0)) / 100.0,
+        "net_margin": float(latest_financial.get("销售净利率(%)", 0)) / 100.0,
+        "operating_margin": float(latest_financial.get("营业利润率(%)", 0)) / 100.0,
+        "revenue_growth": float(latest_financial.get("主营业务收入增长率(%)", 0)) / 100.0,
+        "earnings_growth": float(latest_financial.get("净利润增长率(%)", 0)) / 100.0,
+        "book_value_growth": float(latest_financial.get("净资产增长率(%)", 0)) / 100.0,
+        "current_ratio": float(latest_financial.get("流动比率", 0)),
+        "debt_to_equity": float(latest_financial.get("资产负债率(%)", 0)) / 100.0,
+        "free_cash_flow_per_share": float(latest_financial.get("每股经营性现金流(元)", 0)),
+        "earnings_per_share": float(latest_financial.get("加权每股收益(元)", 0)),
+        "pe_ratio": float(stock_data.get("市盈率-动态", 0)),
+        "price_to_book": float(stock_data.get("市净率", 0)),
+        "price_to_sales": float(stock_data.get("总市值", 0)) / revenue if revenue > 0 else 0,
+        "data_date": latest_financial.get("日期").strftime("%Y-%m-%d"),
+        "expected_latest_date": datetime.now().strftime("%Y-%m-%d")
+    }
+
+
+def _fetch_financial_metrics(symbol: str) -> List[Dict[str, Any]]:
+    """
+    获取财务指标：每个上游数据集只下载一次
 
-        stock_data = stock_data.iloc[0]
-
-        # 构建指标数据
-        metrics = {
-            "market_cap": float(stock_data.get("总市值", 0)),
-            "float_market_cap": float(stock_data.get("流通市值", 0)),
-            "return_on_equity": float(latest_financial.get("净资产收益率(%)", 0)) / 100.0,
-            "net_margin": float(latest_financial.get("销售净利率(%)", 0)) / 100.0,
-            "operating_margin": float(latest_financial.get("营业利润率(%)", 0)) / 100.0,
-            "revenue_growth": float(latest_financial.get("主营业务收入增长率(%)", 0)) / 100.0,
-            "earnings_growth": float(latest_financial.get("净利润增长率(%)", 0)) / 100.0,
-            "book_value_growth": float(latest_financial.get("净资产增长率(%)", 0)) / 100.0,
-            "current_ratio": float(latest_financial.get("流动比率", 0)),
-            "debt_to_equity": float(latest_financial.get("资产负债率(%)", 0)) / 100.0,
-            "free_cash_flow_per_share": float(latest_financial.get("每股经营性现金流(元)", 0)),
-            "earnings_per_share": float(latest_financial.get("加权每股收益(元)", 0)),
-            "pe_ratio": float(stock_data.get("市盈率-动态", 0)),
-            "price_to_book": float(stock_data.get("市净率", 0)),
-            "price_to_sales": float(stock_data.get("总市值", 0)) / float(latest_financial.get("主营业务收入", 1)) if float(latest_financial.get("主营业务收入", 0)) > 0 else 0,
-            "data_date": latest_financial.get("日期").strftime("%Y-%m-%d"),
-            "expected_latest_date": datetime.now().strftime("%Y-%m-%d")
-        }
+    按历史耗时和错误率依次尝试财务分析指标的数据源，拿到一份指标后
+    从共享的全市场行情快照中读取市值和估值，失败时返回 [{}]
+    """
+    latest_financial = None
+    ranked_sources = protect_sources("financial_indicators",
+                                     rank_sources("financial_indicators", FINANCIAL_INDICATOR_SOURCES))
+    for source_name, get_data_func in ranked_sources:
+        try:
+            print(f"尝试从{source_name}获取财务分析指标...")
+            latest_financial = get_data_func(symbol)
+            if latest_financial is not None:
+                print(f"成功从{source_name}获取数据")
+                break
+        except Exception as e:
+            print(f"从{source_name}获取数据失败：{e}")
 
-        return [metrics]
+    if latest_financial is None:
+        return [{}]
 
-    except Exception as e:
-        print(f"从腾讯财经获取数据时出错：{e}")
+    # 获取实时行情（共享全市场快照）
+    stock_data = spot_snapshot.get(symbol)
+    if stock_data is None:
+        print(f"无法获取 {symbol} 的实时行情")
         return [{}]
 
-def get_financial_metrics_from_eastmoney(symbol: str) -> Dict[str, Any]:
-    """从东方财富获取财务指标数据"""
     try:
-        # 获取东方财富财务指标
-        financial_data = ak.stock_financial_analysis_indicator(
-            symbol=symbol,
-            start_year=str(datetime.now().year-2)
-        )
-
-        if financial_data is None or financial_data.empty:
-            return [{}]
-
-        # 按日期排序并获取最新的数据
-        financial_data['日期'] = pd.to_datetime(financial_data['日期'])
-        financial_data = financial_data.sort_values('日期', ascending=False)
-        latest_financial = financial_data.iloc[0]
-
-        # 获取实时行情
-        realtime_data = ak.stock_zh_a_spot_em()
-        if realtime_data is None or realtime_data.empty:
-            return [{}]
-
-        stock_data = realtime_data[realtime_data['代码'] == symbol]
-        if stock_data.empty:
-            return [{}]
-
-        stock_data = stock_data.iloc[0]
-
-        # 构建指标数据
-        metrics = {
-            "market_cap": float(stock_data.get("总市值", 0)),
-            "float_market_cap": float(stock_data.get("流通市值", 0)),
-            "return_on_equity": float(latest_financial.get("净资产收益率(%)", 0)) / 100.0,
-            "net_margin": float(latest_financial.get("销售净利率(%)", 0)) / 100.0,
-            "operating_margin": float(latest_financial.get("营业利润率(%)", 0)) / 100.0,
-            "revenue_growth": float(latest_financial.get("主营业务收入增长率(%)", 0)) / 100.0,
-            "earnings_growth": float(latest_financial.get("净利润增长率(%)", 0)) / 100.0,
-            "book_value_growth": float(latest_financial.get("净资产增长率(%)", 0)) / 100.0,
-            "current_ratio": float(latest_financial.get("流动比率", 0)),
-            "debt_to_equity": float(latest_financial.get("资产负债率(%)", 0)) / 100.0,
-            "free_cash_flow_per_share": float(latest_financial.get("每股经营性现金流(元)", 0)),
-            "earnings_per_share": float(latest_financial.get("加权每股收益(元)", 0)),
-            "pe_ratio": float(stock_data.get("市盈率-动态", 0)),
-            "price_to_book": float(stock_data.get("市净率", 0)),
-            "price_to_sales": float(stock_data.get("总市值", 0)) / float(latest_financial.get("主营业务收入", 1)) if float(latest_financial.get("主营业务收入", 0)) > 0 else 0,
-            "data_date": latest_financial.get("日期").strftime("%Y-%m-%d"),
-            "expected_latest_date": datetime.now().strftime("%Y-%m-%d")
-        }
-
-        return [metrics]
-
+        return [build_financial_metrics(latest_financial, stock_data)]
     except Exception as e:
-        print(f"从东方财富获取数据时出错：{e}")
+        print(f"计算财务指标时出错：{e}")
         return [{}]
 
 @retry_on_exception(max_retries=3, initial_delay=2, backoff_factor=2)
 def get_financial_metrics(symbol: str) -> Dict[str, Any]:
     """获取财务指标数据，支持多个数据源"""
     try:
-        # 检查缓存
-        cache_key = f"financial_metrics_{symbol}"
-        current_time = datetime.now()
-
-        # 如果缓存存在且未过期（缓存12小时），则返回缓存数据
-        if cache_key in _financial_metrics_cache and _financial_cache_expiry.get(cache_key, datetime.min) > current_time:
+        # 如果缓存（本进程或其他进程获取的）存在且在下一期报告可能出现之前，则返回缓存数据
+        cached = cache_manager.get("financial_metrics", symbol)
+        if cached is not None:
             print(f"使用缓存的财务指标数据 (symbol={symbol})")
-            return _financial_metrics_cache[cache_key]
+            return _refresh_market_fields(cached, symbol)
 
         print(f"\n正在获取 {symbol} 的财务指标数据...")
-
-        # 尝试从不同数据源获取数据
-        data_sources = [
-            ("东方财富", lambda: get_financial_metrics_from_eastmoney(symbol)),
-            ("新浪财经", lambda: get_financial_metrics_from_sina(symbol)),
-            ("腾讯财经", lambda: get_financial_metrics_from_tencent(symbol))
-        ]
-
-        result = None
-        for source_name, get_data_func in data_sources:
-            try:
-                print(f"尝试从{source_name}获取数据...")
-                result = get_data_func()
-                if result and result[0]:  # 如果成功获取到数据
-                    print(f"成功从{source_name}获取数据")
-                    break
-            except Exception as e:
-                print(f"从{source_name}获取数据失败：{e}")
-                continue
+        result = _fetch_financial_metrics(symbol)
 
         if not result or not result[0]:
             print("所有数据源都获取失败")
             # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据
-            if cache_key in _financial_metrics_cache:
+            stale = cache_manager.get("financial_metrics", symbol, allow_expired=True)
+            if stale is not None:
                 print(f"使用过期的缓存数据")
-                return _financial_metrics_cache[cache_key]
+                return stale
             return [{}]
 
         # 更新缓存
-        _financial_metrics_cache[cache_key] = result
-        _financial_cache_expiry[cache_key] = current_time + timedelta(hours=12)
+        _store_fundamentals("financial_metrics", symbol, result, result[0].get("data_date"))
 
         return result
 
     except Exception as e:
         print(f"获取财务指标时出错：{e}")
         # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据
-        if cache_key in _financial_metrics_cache:
+        stale = cache_manager.get("financial_metrics", symbol, allow_expired=True)
+        if stale is not None:
             print(f"使用过期的缓存数据")
-            return _financial_metrics_cache[cache_key]
+            return stale
         return [{}]
 
 
-# 财务报表数据缓存
-_financial_statements_cache = {}
-_statements_cache_expiry = {}
+# get_financial_statements 获取的三张报表
+FINANCIAL_REPORT_NAMES = ("资产负债表", "利润表", "现金流量表")
+
+
+def _fetch_financial_report(symbol, report_name):
+    """
+    从新浪财经获取一张财务报表的最新两期数据
+
+    Returns:
+        tuple: (最新一期, 上一期)，获取失败时均为空的 Series
+    """
+    print(f"\n获取{report_name}数据...")
+    try:
+        # 判断股票代码前缀
+        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+        report = ak.stock_financial_report_sina(
+            stock=f"{prefix}{symbol}", symbol=report_name)
+        if not report.empty:
+            latest = report.iloc[0]
+            previous = report.iloc[1] if len(report) > 1 else report.iloc[0]
+            print(f"成功获取{report_name}数据")
+            return latest, previous
+        print(f"警告：无法获取{report_name}数据")
+    except Exception as e:
+        print(f"获取{report_name}数据时出错：{e}")
+    return pd.Series(), pd.Series()
+
 
 @retry_on_exception(max_retries=3, initial_delay=2, backoff_factor=2)
 def get_financial_statements(symbol: str) -> Dict[str, Any]:
     """获取财务报表数据"""
     try:
-        # 检查缓存
-        cache_key = f"financial_statements_{symbol}"
-        current_time = datetime.now()
-
-        # 如果缓存存在且未过期（缓存24小时），则返回缓存数据
-        if cache_key in _financial_statements_cache and _statements_cache_expiry.get(cache_key, datetime.min) > current_time:
+        # 如果缓存（本进程或其他进程获取的）存在且在下一期报告可能出现之前，则返回缓存数据
+        cached = cache_manager.get("financial_statements", symbol)
+        if cached is not None:
             print(f"使用缓存的财务报表数据 (symbol={symbol})")
-            return _financial_statements_cache[cache_key]
+            return cached
 
         print(f"\n正在获取 {symbol} 的财务报表数据...")
 
-        # 获取资产负债表数据
-        print("\n获取资产负债表数据...")
-        try:
-            # 判断股票代码前缀
-            prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-            balance_sheet = ak.stock_financial_report_sina(
-                stock=f"{prefix}{symbol}", symbol="资产负债表")
-            if not balance_sheet.empty:
-                latest_balance = balance_sheet.iloc[0]
-                previous_balance = balance_sheet.iloc[1] if len(
-                    balance_sheet) > 1 else balance_sheet.iloc[0]
-                print("成功获取资产负债表数据")
-            else:
-                print("警告：无法获取资产负债表数据")
-                latest_balance = pd.Series()
-                previous_balance = pd.Series()
-        except Exception as e:
-            print(f"获取资产负债表数据时出错：{e}")
-            latest_balance = pd.Series()
-            previous_balance = pd.Series()
-
-        # 获取利润表数据
-        print("\n获取利润表数据...")
-        try:
-            income_statement = ak.stock_financial_report_sina(
-                stock=f"{prefix}{symbol}", symbol="利润表")
-            if not income_statement.empty:
-                latest_income = income_statement.iloc[0]
-                previous_income = income_statement.iloc[1] if len(
-                    income_statement) > 1 else income_statement.iloc[0]
-                print("成功获取利润表数据")
-            else:
-                print("警告：无法获取利润表数据")
-                latest_income = pd.Series()
-                previous_income = pd.Series()
-        except Exception as e:
-            print(f"获取利润表数据时出错：{e}")
-            latest_income = pd.Series()
-            previous_income = pd.Series()
-
-        # 获取现金流量表数据
-        print("\n获取现金流量表数据...")
-        try:
-            cash_flow = ak.stock_financial_report_sina(
-                stock=f"{prefix}{symbol}", symbol="现金流量表")
-            if not cash_flow.empty:
-                latest_cash_flow = cash_flow.iloc[0]
-                previous_cash_flow = cash_flow.iloc[1] if len(
-                    cash_flow) > 1 else cash_flow.iloc[0]
-                print("成功获取现金流量表数据")
-            else:
-                print("警告：无法获取现金流量表数据")
-                latest_cash_flow = pd.Series()
-                previous_cash_flow = pd.Series()
-        except Exception as e:
-            print(f"获取现金流量表数据时出错：{e}")
-            latest_cash_flow = pd.Series()
-            previous_cash_flow = pd.Series()
+        # 三张报表是相互独立的请求，在 io 线程池中并发获取（仍经过共享连接池和按主机限流）
+        executor = get_executor("io")
+        futures = {name: executor.submit(_fetch_financial_report, symbol, name)
+                   for name in FINANCIAL_REPORT_NAMES}
+        latest_balance, previous_balance = futures["资产负债表"].result()
+        latest_income, previous_income = futures["利润表"].result()
+        latest_cash_flow, previous_cash_flow = futures["现金流量表"].result()
 
         # 构建财务数据
         line_items = []
@@ -421,9 +336,12 @@ def get_financial_statements(symbol: str) -> Dict[str, Any]:
             }
             line_items = [default_item, default_item]
 
-        # 更新缓存
-        _financial_statements_cache[cache_key] = line_items
-        _statements_cache_expiry[cache_key] = current_time + timedelta(hours=24)
+        # 更新缓存，三张报表都获取成功时才按报告期缓存并写入磁盘，
+        # 避免在下一期报告出现之前一直使用不完整的数据
+        complete = not (latest_balance.empty or latest_income.empty or latest_cash_flow.empty)
+        period = latest_income.get("报告日") if not latest_income.empty else latest_balance.get("报告日")
+        _store_fundamentals("financial_statements", symbol, line_items,
+                            period if complete else None, persist=complete)
 
         return line_items
 
@@ -431,10 +349,10 @@ def get_financial_statements(symbol: str) -> Dict[str, Any]:
         print(f"获取财务报表时出错：{e}")
 
         # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据
-        cache_key = f"financial_statements_{symbol}"
-        if cache_key in _financial_statements_cache:
+        stale = cache_manager.get("financial_statements", symbol, allow_expired=True)
+        if stale is not None:
             print(f"使用过期的缓存数据")
-            return _financial_statements_cache[cache_key]
+            return stale
 
         default_item = {
             "net_income": 0,
@@ -448,10 +366,6 @@ def get_financial_statements(symbol: str) -> Dict[str, Any]:
         return [default_item, default_item]
 
 
-# 简单的内存缓存
-_market_data_cache = {}
-_cache_expiry = {}
-
 @retry_on_exception(max_retries=3, initial_delay=2, backoff_factor=2)
 def get_market_data(symbol: str) -> Dict[str, Any]:
     """获取市场数据
@@ -463,14 +377,11 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
         市场数据
     """
     # 检查缓存
-    cache_key = f"market_data_{symbol}"
-    current_time = datetime.now()
-
-    # 如果缓存存在且未过期，直接返回缓存数据
-    if (cache_key in _market_data_cache and
-        _cache_expiry.get(cache_key, datetime.min) > current_time):
+    # 如果缓存存在且未过期，直接返回缓存数据（与 fast_api、data_provider 共用命名空间 market_data）
+    cached = cache_manager.get("market_data", symbol)
+    if cached is not None:
         print(f"使用缓存的市场数据 (symbol={symbol})")
-        return _market_data_cache[cache_key]
+        return cached
 
     start_time = time.time()
 
@@ -480,7 +391,8 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
         print(f"直接获取 {symbol} 的市场数据...")
         # 判断股票代码前缀
         prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        realtime_data = ak.stock_zh_a_daily(symbol=f"{prefix}{symbol}", adjust="")
+        realtime_data = circuit_breakers.get("腾讯财经", "market_data").call(
+            ak.stock_zh_a_daily, symbol=f"{prefix}{symbol}", adjust="")
 
         if realtime_data is not None and not realtime_data.empty:
             # 获取最新一天的数据
@@ -511,9 +423,7 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
             print(f"直接获取成功，耗时 {elapsed:.2f} 秒")
 
             # 更新缓存
-            _market_data_cache[cache_key] = result
-            # 缓存保留1小时
-            _cache_expiry[cache_key] = current_time + timedelta(hours=1)
+            cache_manager.set("market_data", symbol, result)
 
             return result
     except Exception as e:
@@ -524,17 +434,12 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
 
     # 从东方财富获取数据
     def get_data_from_eastmoney():
-        try:
-            realtime_data = ak.stock_zh_a_spot_em()
-            if realtime_data is None or realtime_data.empty:
-                return None
-
-            stock_data = realtime_data[realtime_data['代码'] == symbol]
-            if stock_data.empty:
-                return None
-
-            stock_data = stock_data.iloc[0]
+        # 上游请求的异常直接抛出，由熔断器计为失败；只在整理数据时捕获异常
+        stock_data = spot_snapshot.get(symbol, raise_on_error=True)
+        if stock_data is None:
+            return None
 
+        try:
             # 构建结果
             result = {
                 "market_cap": float(stock_data.get("总市值", 0)),
@@ -553,11 +458,11 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
 
     # 从新浪获取数据
     def get_data_from_sina():
-        try:
-            realtime_data = ak.stock_zh_a_spot()
-            if realtime_data is None or realtime_data.empty:
-                return None
+        realtime_data = ak.stock_zh_a_spot()
+        if realtime_data is None or realtime_data.empty:
+            return None
 
+        try:
             stock_data = realtime_data[realtime_data['代码'] == symbol]
             if stock_data.empty:
                 return None
@@ -586,31 +491,12 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
         ("新浪财经", get_data_from_sina)
     ]
 
-    # 并行获取数据
-    result = None
-    error_messages = []
-
-    # 使用线程池并发执行请求
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        # 提交所有任务
-        future_to_source = {
-            executor.submit(lambda func: func(), get_data_func): source_name
-            for source_name, get_data_func in data_sources
-        }
-
-        # 获取最快返回的有效结果
-        for future in concurrent.futures.as_completed(future_to_source, timeout=5):
-            source_name = future_to_source[future]
-            try:
-                data = future.result(timeout=2)  # 单个结果超时设置为2秒
-                if data is not None:
-                    result = data
-                    print(f"成功从{source_name}获取市场数据")
-                    break  # 一旦获得一个有效结果就停止等待
-                else:
-                    error_messages.append(f"从{source_name}获取数据失败")
-            except Exception as e:
-                error_messages.append(f"从{source_name}获取数据出错: {str(e)}")
+    # 并行获取数据：各数据源竞速，取最快的有效结果并取消其余请求
+    ranked_sources = protect_sources("market_data", rank_sources("market_data", data_sources))
+    source_name, result, error_messages = race_sources(
+        ranked_sources, deadline=5, hedge_delay=source_ranker.hedge_delay("market_data", ranked_sources))
+    if result is not None:
+        print(f"成功从{source_name}获取市场数据")
 
     # 如果所有数据源都失败，检查缓存
     if result is None:
@@ -619,9 +505,10 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
         error_messages.append(error_message)
 
         # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据，但标记为过期
-        if cache_key in _market_data_cache:
+        cached_data = cache_manager.get("market_data", symbol, allow_expired=True)
+        if cached_data is not None:
             print(f"使用过期的缓存数据 (symbol={symbol})")
-            cached_data = _market_data_cache[cache_key].copy()
+            cached_data = cached_data.copy()
             cached_data["is_expired_cache"] = True
             cached_data["error_messages"] = error_messages
             return cached_data
@@ -633,9 +520,13 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
     if "market_cap" in result and result["market_cap"] <= 0:
         print(f"警告：股票 {symbol} 的市值数据无效或缺失")
         # 尝试从其他数据源补充市值数据
-        for source_name, get_data_func in data_sources:
+        for source_name, get_data_func in ranked_sources:
             if source_name != result["data_source"]:
-                supplementary_data = get_data_func()
+                try:
+                    supplementary_data = get_data_func()
+                except Exception as e:
+                    print(f"从{source_name}补充市值数据失败: {e}")
+                    continue
                 if supplementary_data is not None and supplementary_data.get("market_cap", 0) > 0:
                     result["market_cap"] = supplementary_data["market_cap"]
                     print(f"使用{source_name}的市值数据进行补充")
@@ -646,17 +537,151 @@ def get_market_data(symbol: str) -> Dict[str, Any]:
         result["volume"] = 0
 
     # 更新缓存
-    _market_data_cache[cache_key] = result
-    # 缓存保留较短时间（当日行情数据变化快）
-    _cache_expiry[cache_key] = current_time + timedelta(minutes=30)
+    cache_manager.set("market_data", symbol, result)
 
     print(f"成功获取 {symbol} 的市场数据，总耗时 {time.time() - start_time:.2f} 秒")
     return result
 
 
-# 价格历史数据缓存
-_price_history_cache = {}
-_price_cache_expiry = {}
+def _fetch_bars_from_eastmoney(symbol, start_date, end_date, adjust):
+    """从东方财富（akshare）获取K线"""
+    df = ak.stock_zh_a_hist(
+        symbol=symbol,
+        period="daily",
+        start_date=start_date.strftime("%Y%m%d"),
+        end_date=end_date.strftime("%Y%m%d"),
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    # 重命名列以匹配技术分析代理的需求
+    df = df.rename(columns={
+        "日期": "date",
+        "开盘": "open",
+        "最高": "high",
+        "最低": "low",
+        "收盘": "close",
+        "成交量": "volume",
+        "成交额": "amount",
+        "振幅": "amplitude",
+        "涨跌幅": "pct_change",
+        "涨跌额": "change_amount",
+        "换手率": "turnover"
+    })
+
+    return standardize_bars(df)
+
+
+def _fetch_bars_from_netease(symbol, start_date, end_date, adjust):
+    """从网易财经获取K线"""
+    df = ak.stock_zh_a_hist_163(
+        symbol=symbol,
+        start_date=start_date.strftime("%Y%m%d"),
+        end_date=end_date.strftime("%Y%m%d"),
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    # 重命名列以匹配技术分析代理的需求
+    df = df.rename(columns={
+        "日期": "date",
+        "开盘价": "open",
+        "最高价": "high",
+        "最低价": "low",
+        "收盘价": "close",
+        "成交量": "volume",
+        "成交金额": "amount",
+        "涨跌额": "change_amount",
+        "涨跌幅": "pct_change",
+        "换手率": "turnover"
+    })
+
+    # 网易的成交量单位为股
+    return standardize_bars(df, volume_in_shares=True)
+
+
+def _fetch_bars_from_sina(symbol, start_date, end_date, adjust):
+    """从新浪财经获取K线"""
+    # 判断股票代码前缀
+    prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+    df = ak.stock_zh_a_daily(
+        symbol=f"{prefix}{symbol}",
+        start_date=start_date.strftime("%Y%m%d"),
+        end_date=end_date.strftime("%Y%m%d"),
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    # 新浪的成交量单位为股，换手率为比例
+    return standardize_bars(df, volume_in_shares=True, turnover_as_ratio=True)
+
+
+# 历史K线的数据源：(名称, 获取函数(symbol, start, end, adjust))，返回 standardize_bars 统一后的列和单位
+PRICE_HISTORY_SOURCES = [
+    ("东方财富", _fetch_bars_from_eastmoney),
+    ("网易财经", _fetch_bars_from_netease),
+    ("新浪财经", _fetch_bars_from_sina),
+]
+
+
+def _price_bars_fetcher(symbol, verbose=True):
+    """
+    返回 get_adjusted_bars 使用的数据获取函数：按排名依次尝试各数据源
+
+    Args:
+        symbol: 股票代码
+        verbose: 是否打印每个数据源的尝试过程
+
+    Returns:
+        fetch_from_sources(start, end, adjust)：返回DataFrame，所有数据源都出错时返回None
+    """
+    def get_data_from_source(source_name, get_data_func, start_date, end_date, adjust):
+        """从指定数据源获取数据，出错时返回None，没有数据时返回空DataFrame"""
+        try:
+            if verbose:
+                print(f"尝试从{source_name}获取数据...")
+            start_time = time.time()
+            df = get_data_func(symbol, start_date, end_date, adjust)
+            elapsed_time = time.time() - start_time
+
+            if df is not None and not df.empty:
+                if verbose:
+                    print(f"成功从{source_name}获取数据，耗时 {elapsed_time:.2f} 秒")
+                return df
+            else:
+                if verbose:
+                    print(f"从{source_name}获取数据失败，返回空数据")
+                return pd.DataFrame()
+        except Exception as e:
+            if verbose:
+                print(f"从{source_name}获取数据时出错: {e}")
+            return None
+
+    def fetch_from_sources(fetch_start, fetch_end, adjust):
+        """依次尝试各数据源，所有数据源都出错时返回None"""
+        answered = False
+        # 按历史耗时和错误率排序，长期失败的数据源自动排到最后
+        ranked_sources = protect_sources(
+            "price_history", rank_sources("price_history", PRICE_HISTORY_SOURCES, is_valid=lambda df: df is not None))
+        for source_name, get_data_func in ranked_sources:
+            source_df = get_data_from_source(source_name, get_data_func, fetch_start, fetch_end, adjust)
+            if source_df is None:
+                continue
+            answered = True
+            if not source_df.empty:
+                if verbose:
+                    print(f"成功从{source_name}获取数据，共 {len(source_df)} 条记录")
+                return source_df
+        return pd.DataFrame() if answered else None
+
+    return fetch_from_sources
+
 
 @retry_on_exception(max_retries=3, initial_delay=2, backoff_factor=2)
 def get_price_history(symbol: str, start_date: str = None, end_date: str = None, adjust: str = "qfq") -> pd.DataFrame:
@@ -694,12 +719,12 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
             start_date = datetime.strptime(start_date, "%Y-%m-%d")
 
         # 构建缓存键
-        cache_key = f"price_history_{symbol}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}_{adjust}"
+        cache_key = make_key(symbol, start_date, end_date, adjust)
 
         # 检查缓存
-        if cache_key in _price_history_cache and _price_cache_expiry.get(cache_key, datetime.min) > current_date:
+        df = cache_manager.get("price_history", cache_key)
+        if df is not None:
             print(f"使用缓存的历史价格数据 (symbol={symbol}, start={start_date.strftime('%Y-%m-%d')}, end={end_date.strftime('%Y-%m-%d')})")
-            df = _price_history_cache[cache_key]
 
             # 验证缓存的数据
             if validate_price_data(df, symbol):
@@ -712,147 +737,21 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
         print(f"结束日期：{end_date.strftime('%Y-%m-%d')}")
         print("请耐心等待，这可能需要一些时间...")
 
-        # 定义数据获取函数，支持多种数据源
-        def get_data_from_source(source_name, get_data_func, start_date, end_date):
-            """从指定数据源获取数据"""
-            try:
-                print(f"尝试从{source_name}获取数据...")
-                start_time = time.time()
-                df = get_data_func(start_date, end_date)
-                elapsed_time = time.time() - start_time
-
-                if df is not None and not df.empty:
-                    print(f"成功从{source_name}获取数据，耗时 {elapsed_time:.2f} 秒")
-                    return df
-                else:
-                    print(f"从{source_name}获取数据失败，返回空数据")
-                    return pd.DataFrame()
-            except Exception as e:
-                print(f"从{source_name}获取数据时出错: {e}")
-                return pd.DataFrame()
-
-        def get_data_from_akshare(start_date, end_date):
-            """从akshare获取数据"""
-            try:
-                df = ak.stock_zh_a_hist(
-                    symbol=symbol,
-                    period="daily",
-                    start_date=start_date.strftime("%Y%m%d"),
-                    end_date=end_date.strftime("%Y%m%d"),
-                    adjust=adjust
-                )
-
-                if df is None or df.empty:
-                    return pd.DataFrame()
-
-                # 重命名列以匹配技术分析代理的需求
-                df = df.rename(columns={
-                    "日期": "date",
-                    "开盘": "open",
-                    "最高": "high",
-                    "最低": "low",
-                    "收盘": "close",
-                    "成交量": "volume",
-                    "成交额": "amount",
-                    "振幅": "amplitude",
-                    "涨跌幅": "pct_change",
-                    "涨跌额": "change_amount",
-                    "换手率": "turnover"
-                })
-
-                # 确保日期列为datetime类型
-                df["date"] = pd.to_datetime(df["date"])
-                return df
-            except Exception as e:
-                print(f"从akshare获取数据时出错: {e}")
-                return pd.DataFrame()
-
-        def get_data_from_netease(start_date, end_date):
-            """从网易财经获取数据"""
-            try:
-                df = ak.stock_zh_a_hist_163(
-                    symbol=symbol,
-                    start_date=start_date.strftime("%Y%m%d"),
-                    end_date=end_date.strftime("%Y%m%d"),
-                    adjust=adjust
-                )
-
-                if df is None or df.empty:
-                    return pd.DataFrame()
-
-                # 重命名列以匹配技术分析代理的需求
-                df = df.rename(columns={
-                    "日期": "date",
-                    "开盘价": "open",
-                    "最高价": "high",
-                    "最低价": "low",
-                    "收盘价": "close",
-                    "成交量": "volume",
-                    "成交金额": "amount",
-                    "涨跌幅": "pct_change"
-                })
-
-                # 确保日期列为datetime类型
-                df["date"] = pd.to_datetime(df["date"])
-                return df
-            except Exception as e:
-                print(f"从网易财经获取数据时出错: {e}")
-                return pd.DataFrame()
-
-        def get_data_from_sina(start_date, end_date):
-            """从新浪财经获取数据"""
-            try:
-                # 判断股票代码前缀
-                prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-                df = ak.stock_zh_a_daily(
-                    symbol=f"{prefix}{symbol}",
-                    start_date=start_date.strftime("%Y%m%d"),
-                    end_date=end_date.strftime("%Y%m%d"),
-                    adjust=adjust
-                )
-
-                if df is None or df.empty:
-                    return pd.DataFrame()
-
-                # 重命名列以匹配技术分析代理的需求
-                df = df.rename(columns={
-                    "date": "date",
-                    "open": "open",
-                    "high": "high",
-                    "low": "low",
-                    "close": "close",
-                    "volume": "volume"
-                })
-
-                # 确保日期列为datetime类型
-                df["date"] = pd.to_datetime(df["date"])
-                return df
-            except Exception as e:
-                print(f"从新浪财经获取数据时出错: {e}")
-                return pd.DataFrame()
-
-        # 尝试从不同数据源获取数据
-        data_sources = [
-            ("东方财富", get_data_from_akshare),
-            ("网易财经", get_data_from_netease),
-            ("新浪财经", get_data_from_sina)
-        ]
+        fetch_from_sources = _price_bars_fetcher(symbol)
 
-        df = None
-        for source_name, get_data_func in data_sources:
-            df = get_data_from_source(source_name, get_data_func, start_date, end_date)
-            if df is not None and not df.empty:
-                print(f"成功从{source_name}获取数据，共 {len(df)} 条记录")
-                break
+        # 只请求本地K线仓库中缺失的日期区间，复权K线由不复权K线和复权因子计算
+        df = get_cached_price_bars(symbol, start_date, end_date, adjust, fetch_from_sources,
+                                   fetch_factors=fetch_adjustment_factors)
 
         # 如果所有数据源都失败，检查缓存
         if df is None or df.empty:
             print(f"警告：未能从任何数据源获取到 {symbol} 的历史行情数据")
 
             # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据
-            if cache_key in _price_history_cache:
+            stale = cache_manager.get("price_history", cache_key, allow_expired=True)
+            if stale is not None:
                 print(f"使用过期的缓存数据")
-                return _price_history_cache[cache_key]
+                return stale
 
             return pd.DataFrame()
 
@@ -866,14 +765,12 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
             # 扩大时间范围到2年
             extended_start_date = end_date - timedelta(days=730)
 
-            # 尝试从不同数据源获取更长时间范围的数据
-            extended_df = None
-            for source_name, get_data_func in data_sources:
-                extended_df = get_data_from_source(source_name, get_data_func, extended_start_date, end_date)
-                if extended_df is not None and not extended_df.empty and len(extended_df) > len(df):
-                    print(f"成功从{source_name}获取更长时间范围的数据，共 {len(extended_df)} 条记录")
-                    df = extended_df
-                    break
+            # 同样只补充本地缺失的部分
+            extended_df = get_cached_price_bars(symbol, extended_start_date, end_date, adjust, fetch_from_sources,
+                                                fetch_factors=fetch_adjustment_factors)
+            if len(extended_df) > len(df):
+                print(f"成功获取更长时间范围的数据，共 {len(extended_df)} 条记录")
+                df = extended_df
 
             if len(df) < min_required_days:
                 print(f"警告：即使扩大时间范围，数据量（{len(df)}条）仍然不足")
@@ -881,149 +778,7 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
         print(f"开始计算技术指标...")
         start_time = time.time()
 
-        # 计算基本技术指标 - 使用向量化操作提高性能
-        # 计算动量指标
-        df["momentum_1m"] = df["close"].pct_change(periods=20)  # 20个交易日约等于1个月
-        df["momentum_3m"] = df["close"].pct_change(periods=60)  # 60个交易日约等于3个月
-        df["momentum_6m"] = df["close"].pct_change(periods=120)  # 120个交易日约等于6个月
-
-        # 计算成交量动量（相对于20日平均成交量的变化）
-        df["volume_ma20"] = df["volume"].rolling(window=20).mean()
-        df["volume_momentum"] = df["volume"] / df["volume_ma20"]
-
-        # 计算波动率指标
-        # 1. 历史波动率 (20日)
-        returns = df["close"].pct_change()
-        df["historical_volatility"] = returns.rolling(window=20).std() * np.sqrt(252)  # 年化
-
-        # 2. 波动率区间 (相对于过去120天的波动率的位置)
-        # 使用更高效的方法计算
-        if len(df) >= 120:
-            volatility_120d = returns.rolling(window=120).std() * np.sqrt(252)
-            vol_min = volatility_120d.rolling(window=120).min()
-            vol_max = volatility_120d.rolling(window=120).max()
-            vol_range = vol_max - vol_min
-            df["volatility_regime"] = np.where(
-                vol_range > 0,
-                (df["historical_volatility"] - vol_min) / vol_range,
-                0  # 当范围为0时返回0
-            )
-
-            # 3. 波动率Z分数
-            vol_mean = df["historical_volatility"].rolling(window=120).mean()
-            vol_std = df["historical_volatility"].rolling(window=120).std()
-            df["volatility_z_score"] = (
-                df["historical_volatility"] - vol_mean) / vol_std
-        else:
-            # 数据不足时使用简化计算
-            df["volatility_regime"] = 0.5  # 默认中等波动率
-            df["volatility_z_score"] = 0.0  # 默认均值
-
-        # 4. ATR比率 - 使用更高效的计算方法
-        tr = pd.DataFrame()
-        tr["h-l"] = df["high"] - df["low"]
-        tr["h-pc"] = abs(df["high"] - df["close"].shift(1))
-        tr["l-pc"] = abs(df["low"] - df["close"].shift(1))
-        tr["tr"] = tr[["h-l", "h-pc", "l-pc"]].max(axis=1)
-        df["atr"] = tr["tr"].rolling(window=14).mean()
-        df["atr_ratio"] = df["atr"] / df["close"]
-
-        # 只有当数据足够时才计算高级指标
-        if len(df) >= 120:
-            # 计算统计套利指标
-            # 1. 赫斯特指数 (使用过去120天的数据) - 使用优化版本
-            def calculate_hurst(series):
-                """
-                计算Hurst指数。
-
-                Args:
-                    series: 价格序列
-
-                Returns:
-                    float: Hurst指数，或在计算失败时返回np.nan
-                """
-                try:
-                    series = series.dropna()
-                    if len(series) < 30:  # 降低最小数据点要求
-                        return np.nan
-
-                    # 使用对数收益率
-                    log_returns = np.log(series / series.shift(1)).dropna()
-                    if len(log_returns) < 30:  # 降低最小数据点要求
-                        return np.nan
-
-                    # 使用更小的lag范围，减少计算量
-                    # 只使用3个关键点而不是整个范围
-                    lags = [2, 5, 10]  # 只使用3个关键点
-
-                    # 计算每个lag的标准差，使用向量化操作代替循环
-                    tau = []
-                    for lag in lags:
-                        # 使用numpy操作代替pandas滚动窗口，提高性能
-                        if len(log_returns) > lag:
-                            # 使用numpy的std直接计算，避免创建临时Series
-                            std_value = np.std(log_returns.values[lag:] - log_returns.values[:-lag])
-                            tau.append(std_value)
-                        else:
-                            return np.nan  # 数据不足
-
-                    # 基本的数值检查
-                    if len(tau) < 3:  # 需要至少3个点进行回归
-                        return np.nan
-
-                    # 使用对数回归
-                    lags_log = np.log(lags)
-                    tau_log = np.log(tau)
-
-                    # 计算回归系数
-                    reg = np.polyfit(lags_log, tau_log, 1)
-                    hurst = reg[0] / 2.0
-
-                    # 只保留基本的数值检查
-                    if np.isnan(hurst) or np.isinf(hurst):
-                        return np.nan
-
-                    # 限制Hurst指数在合理范围内
-                    return max(0.0, min(1.0, hurst))
-
-                except Exception as e:
-                    return np.nan
-
-            print("计算Hurst指数...")
-            # 使用对数收益率计算Hurst指数，但减少计算频率
-            # 只对每5行数据计算一次，然后填充其他行
-            log_returns = np.log(df["close"] / df["close"].shift(1))
-
-            # 创建一个空的Series来存储Hurst指数
-            hurst_values = pd.Series(index=df.index, dtype=float)
-
-            # 只对每5行数据计算一次Hurst指数
-            for i in range(0, len(df), 5):
-                if i >= 120:  # 确保有足够的数据
-                    window_data = log_returns.iloc[max(0, i-120):i]
-                    if len(window_data) >= 60:  # 要求至少60个数据点
-                        hurst_values.iloc[i] = calculate_hurst(df["close"].iloc[max(0, i-120):i])
-
-            # 向前填充NaN值
-            df["hurst_exponent"] = hurst_values.fillna(method='ffill')
-
-            print("计算偏度和峰度...")
-            # 2. 偏度 (20日)
-            df["skewness"] = returns.rolling(window=20).skew()
-
-            # 3. 峰度 (20日)
-            df["kurtosis"] = returns.rolling(window=20).kurt()
-        else:
-            # 数据不足时使用默认值
-            df["hurst_exponent"] = 0.5  # 默认随机游走
-            df["skewness"] = 0.0  # 默认对称分布
-            df["kurtosis"] = 3.0  # 默认正态分布
-
-        # 按日期升序排序
-        df = df.sort_values("date")
-
-        # 重置索引
-        df = df.reset_index(drop=True)
+        df = add_technical_indicators(df)
 
         elapsed_time = time.time() - start_time
         print(f"技术指标计算完成，耗时 {elapsed_time:.2f} 秒")
@@ -1043,8 +798,7 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
         # 验证最终数据
         if validate_price_data(df, symbol):
             # 更新缓存
-            _price_history_cache[cache_key] = df
-            _price_cache_expiry[cache_key] = current_date + timedelta(hours=12)  # 设置12小时过期
+            cache_manager.set("price_history", cache_key, df)
 
             return df
         else:
@@ -1056,6 +810,295 @@ def get_price_history(symbol: str, start_date: str = None, end_date: str = None,
         return pd.DataFrame()
 
 
+# 批量获取历史K线时同时进行的股票数
+PRICE_HISTORY_BATCH_WORKERS = 8
+
+
+class PriceHistoryBatch:
+    """get_price_history_batch 的结果"""
+
+    def __init__(self, bars, failed, elapsed):
+        """
+        Args:
+            bars: 长格式K线，symbol、date 两列加上各价格列，按 symbol、date 排序
+            failed: {股票代码: 失败原因}；部分区间获取失败的股票已有的数据仍保留在 bars 中
+            elapsed: 总耗时（秒）
+        """
+        self.bars = bars
+        self.failed = failed
+        self.elapsed = elapsed
+
+    @property
+    def symbols(self):
+        """有K线数据的股票代码"""
+        return list(self.bars["symbol"].unique()) if not self.bars.empty else []
+
+    def get(self, symbol):
+        """单只股票的K线，格式与 get_adjusted_bars 相同"""
+        df = self.bars[self.bars["symbol"] == symbol]
+        return df.drop(columns="symbol").reset_index(drop=True)
+
+    def panel(self, field="close"):
+        """宽格式数据：行为日期，列为股票代码"""
+        if self.bars.empty:
+            return pd.DataFrame()
+        return self.bars.pivot(index="date", columns="symbol", values=field)
+
+    def summary(self):
+        """批量获取的统计信息"""
+        return {
+            "symbols": len(self.symbols),
+            "rows": len(self.bars),
+            "failed": len(self.failed),
+            "elapsed_seconds": round(self.elapsed, 2),
+        }
+
+
+def get_price_history_batch(symbols, start_date: str = None, end_date: str = None, adjust: str = "qfq",
+                            max_workers: int = PRICE_HISTORY_BATCH_WORKERS, progress=None,
+                            store=bar_store) -> PriceHistoryBatch:
+    """批量获取多只股票的历史K线，用于全市场的夜间刷新
+
+    只获取K线，不计算技术指标，也不逐只打印获取过程。本地K线仓库中已有的区间不会重复请求，
+    新获取的数据直接写入仓库；仓库只保存不复权K线和复权因子，复权K线在本地计算。请求经过共享的连接池并按主机限流（见 rate_limiter.py），
+    数据源的排名和熔断与 get_price_history 相同。
+
+    Args:
+        symbols: 股票代码列表
+        start_date: 开始日期，格式：YYYY-MM-DD，如果为None则默认获取过去一年的数据
+        end_date: 结束日期，格式：YYYY-MM-DD，如果为None则使用昨天作为结束日期
+        adjust: 复权类型，""、"qfq"（默认）或 "hfq"
+        max_workers: 同时获取的股票数上限
+        progress: 进度回调 progress(已完成数, 总数, 股票代码, 失败原因)，成功时失败原因为None
+        store: K线仓库
+
+    Returns:
+        PriceHistoryBatch: 长格式K线和获取失败的股票
+    """
+    yesterday = datetime.now() - timedelta(days=1)
+    end = min(datetime.strptime(end_date, "%Y-%m-%d"), yesterday) if end_date else yesterday
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else end - timedelta(days=365)
+    symbols = list(dict.fromkeys(symbols))
+    start_time = time.time()
+    print(f"开始批量获取 {len(symbols)} 只股票的历史行情: {start.strftime('%Y-%m-%d')} 至 {end.strftime('%Y-%m-%d')}")
+
+    lock = threading.Lock()
+    frames, failed = [], {}
+    done = [0]
+
+    def fetch(symbol):
+        failed_ranges = []
+        fetch_from_sources = _price_bars_fetcher(symbol, verbose=False)
+
+        def fetch_range(fetch_start, fetch_end, kind):
+            df = fetch_from_sources(fetch_start, fetch_end, kind)
+            if df is None:
+                failed_ranges.append((fetch_start, fetch_end))
+            return df
+
+        df = get_adjusted_bars(symbol, start, end, adjust, fetch_range, fetch_factors=fetch_adjustment_factors,
+                               store=store, verbose=False)
+        error = None
+        if failed_ranges:
+            error = "所有数据源都获取失败: " + ", ".join(
+                f"{s.strftime('%Y-%m-%d')} 至 {e.strftime('%Y-%m-%d')}" for s, e in failed_ranges)
+        return df, error
+
+    def finish(symbol, df, error):
+        with lock:
+            if df is not None and not df.empty:
+                frames.append(df.assign(symbol=symbol))
+            if error:
+                failed[symbol] = error
+            done[0] += 1
+            count = done[0]
+        if progress is not None:
+            try:
+                progress(count, len(symbols), symbol, error)
+            except Exception as e:
+                print(f"批量获取的进度回调出错: {e}")
+
+    # 滑动窗口提交，本批次最多占用共享线程池中的 max_workers 个线程
+    for symbol, future in submit_windowed(get_executor("fanout"), fetch, symbols, max_workers):
+        try:
+            df, error = future.result()
+        except Exception as e:
+            df, error = None, str(e)
+        finish(symbol, df, error)
+
+    if frames:
+        bars = pd.concat(frames, ignore_index=True)
+        bars = bars[["symbol"] + [col for col in bars.columns if col != "symbol"]]
+        bars = bars.sort_values(["symbol", "date"]).reset_index(drop=True)
+    else:
+        bars = pd.DataFrame(columns=["symbol", "date"])
+
+    result = PriceHistoryBatch(bars, failed, time.time() - start_time)
+    print(f"批量获取完成: {len(symbols) - len(failed)}/{len(symbols)} 只股票成功，共 {len(bars)} 条K线，"
+          f"耗时 {result.elapsed:.2f} 秒")
+    for symbol, error in list(failed.items())[:10]:
+        print(f"- {symbol}: {error}")
+    return result
+
+
+def add_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """在K线数据上计算动量、波动率和统计套利指标，返回按日期升序排列的新DataFrame
+
+    Args:
+        df: 包含 date、open、high、low、close、volume 列的K线数据
+
+    Returns:
+        添加了技术指标列的DataFrame
+    """
+    df = df.copy()
+
+    # 计算基本技术指标 - 使用向量化操作提高性能
+    # 计算动量指标
+    df["momentum_1m"] = df["close"].pct_change(periods=20)  # 20个交易日约等于1个月
+    df["momentum_3m"] = df["close"].pct_change(periods=60)  # 60个交易日约等于3个月
+    df["momentum_6m"] = df["close"].pct_change(periods=120)  # 120个交易日约等于6个月
+
+    # 计算成交量动量（相对于20日平均成交量的变化）
+    df["volume_ma20"] = df["volume"].rolling(window=20).mean()
+    df["volume_momentum"] = df["volume"] / df["volume_ma20"]
+
+    # 计算波动率指标
+    # 1. 历史波动率 (20日)
+    returns = df["close"].pct_change()
+    df["historical_volatility"] = returns.rolling(window=20).std() * np.sqrt(252)  # 年化
+
+    # 2. 波动率区间 (相对于过去120天的波动率的位置)
+    # 使用更高效的方法计算
+    if len(df) >= 120:
+        volatility_120d = returns.rolling(window=120).std() * np.sqrt(252)
+        vol_min = volatility_120d.rolling(window=120).min()
+        vol_max = volatility_120d.rolling(window=120).max()
+        vol_range = vol_max - vol_min
+        df["volatility_regime"] = np.where(
+            vol_range > 0,
+            (df["historical_volatility"] - vol_min) / vol_range,
+            0  # 当范围为0时返回0
+        )
+
+        # 3. 波动率Z分数
+        vol_mean = df["historical_volatility"].rolling(window=120).mean()
+        vol_std = df["historical_volatility"].rolling(window=120).std()
+        df["volatility_z_score"] = (
+            df["historical_volatility"] - vol_mean) / vol_std
+    else:
+        # 数据不足时使用简化计算
+        df["volatility_regime"] = 0.5  # 默认中等波动率
+        df["volatility_z_score"] = 0.0  # 默认均值
+
+    # 4. ATR比率 - 使用更高效的计算方法
+    tr = pd.DataFrame()
+    tr["h-l"] = df["high"] - df["low"]
+    tr["h-pc"] = abs(df["high"] - df["close"].shift(1))
+    tr["l-pc"] = abs(df["low"] - df["close"].shift(1))
+    tr["tr"] = tr[["h-l", "h-pc", "l-pc"]].max(axis=1)
+    df["atr"] = tr["tr"].rolling(window=14).mean()
+    df["atr_ratio"] = df["atr"] / df["close"]
+
+    # 只有当数据足够时才计算高级指标
+    if len(df) >= 120:
+        # 计算统计套利指标
+        # 1. 赫斯特指数 (使用过去120天的数据) - 使用优化版本
+        def calculate_hurst(series):
+            """
+            计算Hurst指数。
+
+            Args:
+                series: 价格序列
+
+            Returns:
+                float: Hurst指数，或在计算失败时返回np.nan
+            """
+            try:
+                series = series.dropna()
+                if len(series) < 30:  # 降低最小数据点要求
+                    return np.nan
+
+                # 使用对数收益率
+                log_returns = np.log(series / series.shift(1)).dropna()
+                if len(log_returns) < 30:  # 降低最小数据点要求
+                    return np.nan
+
+                # 使用更小的lag范围，减少计算量
+                # 只使用3个关键点而不是整个范围
+                lags = [2, 5, 10]  # 只使用3个关键点
+
+                # 计算每个lag的标准差，使用向量化操作代替循环
+                tau = []
+                for lag in lags:
+                    # 使用numpy操作代替pandas滚动窗口，提高性能
+                    if len(log_returns) > lag:
+                        # 使用numpy的std直接计算，避免创建临时Series
+                        std_value = np.std(log_returns.values[lag:] - log_returns.values[:-lag])
+                        tau.append(std_value)
+                    else:
+                        return np.nan  # 数据不足
+
+                # 基本的数值检查
+                if len(tau) < 3:  # 需要至少3个点进行回归
+                    return np.nan
+
+                # 使用对数回归
+                lags_log = np.log(lags)
+                tau_log = np.log(tau)
+
+                # 计算回归系数
+                reg = np.polyfit(lags_log, tau_log, 1)
+                hurst = reg[0] / 2.0
+
+                # 只保留基本的数值检查
+                if np.isnan(hurst) or np.isinf(hurst):
+                    return np.nan
+
+                # 限制Hurst指数在合理范围内
+                return max(0.0, min(1.0, hurst))
+
+            except Exception as e:
+                return np.nan
+
+        print("计算Hurst指数...")
+        # 使用对数收益率计算Hurst指数，但减少计算频率
+        # 只对每5行数据计算一次，然后填充其他行
+        log_returns = np.log(df["close"] / df["close"].shift(1))
+
+        # 创建一个空的Series来存储Hurst指数
+        hurst_values = pd.Series(index=df.index, dtype=float)
+
+        # 只对每5行数据计算一次Hurst指数
+        for i in range(0, len(df), 5):
+            if i >= 120:  # 确保有足够的数据
+                window_data = log_returns.iloc[max(0, i-120):i]
+                if len(window_data) >= 60:  # 要求至少60个数据点
+                    hurst_values.iloc[i] = calculate_hurst(df["close"].iloc[max(0, i-120):i])
+
+        # 向前填充NaN值
+        df["hurst_exponent"] = hurst_values.fillna(method='ffill')
+
+        print("计算偏度和峰度...")
+        # 2. 偏度 (20日)
+        df["skewness"] = returns.rolling(window=20).skew()
+
+        # 3. 峰度 (20日)
+        df["kurtosis"] = returns.rolling(window=20).kurt()
+    else:
+        # 数据不足时使用默认值
+        df["hurst_exponent"] = 0.5  # 默认随机游走
+        df["skewness"] = 0.0  # 默认对称分布
+        df["kurtosis"] = 3.0  # 默认正态分布
+
+    # 按日期升序排序
+    df = df.sort_values("date")
+
+    # 重置索引
+    df = df.reset_index(drop=True)
+
+    return df
+
+
 def validate_price_data(df, symbol):
     """验证价格数据的完整性和格式"""
     try:
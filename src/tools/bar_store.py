@@ -0,0 +1,417 @@
+"""
+按股票存储的列式K线仓库
+
+每只股票、每种复权方式对应一个目录，每一列保存为一个 .npy 文件。
+读取时以内存映射方式打开，按日期二分查找后直接切片，
+任意日期区间都不需要重新下载或整体反序列化。
+
+不复权K线和复权因子表（adjust_factors.py）各自保存，前复权和后复权由二者在读取时计算，
+分红送转不会使已保存的K线失效。
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.tools.cache_metrics import cache_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 定义缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+BAR_STORE_DIR = os.path.join(CACHE_DIR, "bar_store")
+os.makedirs(BAR_STORE_DIR, exist_ok=True)
+
+# 日期列名
+DATE_COLUMN = "date"
+# 复权因子表在仓库中的目录名
+FACTOR_SERIES = "factors"
+
+
+def _to_day(value):
+    """将字符串/日期对象统一转换为 pandas.Timestamp（只保留日期部分）"""
+    return pd.Timestamp(value).normalize()
+
+
+def _version_time(name):
+    """版本目录名 v<毫秒时间戳>_<随机串> 中的时间戳，无法解析时返回-1"""
+    try:
+        return int(name[1:].split("_", 1)[0])
+    except ValueError:
+        return -1
+
+
+def merge_ranges(ranges):
+    """
+    合并重叠或相邻的日期区间
+
+    Args:
+        ranges: [(start, end), ...]，元素可以是字符串或日期对象
+
+    Returns:
+        list: 合并后按开始日期排序的 [(Timestamp, Timestamp), ...]
+    """
+    normalized = sorted((_to_day(s), _to_day(e)) for s, e in ranges if _to_day(s) <= _to_day(e))
+    merged = []
+    for start, end in normalized:
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class BarStore:
+    """列式K线仓库，支持追加新K线并按任意日期区间切片读取"""
+
+    def __init__(self, root_dir=BAR_STORE_DIR, metrics=None):
+        """
+        初始化K线仓库
+
+        Args:
+            root_dir: 仓库根目录
+            metrics: 记录命中情况的缓存统计（CacheMetrics），为None时不记录；由 interval_cache.get_price_bars 记录
+        """
+        self.root_dir = root_dir
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        # (symbol, adjust) -> 该序列的线程锁，不同序列可以同时写入
+        self._series_locks = {}
+        # (meta路径) -> (mtime_ns, meta)
+        self._meta_cache = {}
+        # (symbol, adjust) -> (version, {列名: memmap})
+        self._handles = {}
+
+    def _series_dir(self, symbol, adjust):
+        return os.path.join(self.root_dir, symbol, adjust or "none")
+
+    @contextmanager
+    def _series_lock(self, symbol, adjust):
+        """
+        写入一个序列时持有的锁：该序列在进程内的线程锁加上序列目录中的文件锁
+
+        应用和预热脚本等多个进程会同时写入同一个序列，读取-合并-写入必须在文件锁内完成，
+        否则后写入的进程会丢掉先写入的K线。
+        """
+        series_dir = self._series_dir(symbol, adjust)
+        # 全局锁只用于取得该序列的线程锁，等待文件锁时不阻塞其他序列的写入
+        with self._lock:
+            series_lock = self._series_locks.setdefault((symbol, adjust), threading.Lock())
+        with series_lock:
+            os.makedirs(series_dir, exist_ok=True)
+            fd = os.open(os.path.join(series_dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                os.close(fd)
+
+    def _load_meta(self, symbol, adjust):
+        """读取元数据，按文件修改时间缓存"""
+        meta_file = os.path.join(self._series_dir(symbol, adjust), "meta.json")
+        try:
+            mtime = os.stat(meta_file).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._meta_cache.get(meta_file)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"[K线仓库] 读取元数据失败 {meta_file}: {e}")
+            return None
+
+        self._meta_cache[meta_file] = (mtime, meta)
+        return meta
+
+    def _open_columns(self, symbol, adjust, meta):
+        """以内存映射方式打开当前版本的所有列"""
+        key = (symbol, adjust)
+        cached = self._handles.get(key)
+        if cached and cached[0] == meta["version"]:
+            return cached[1]
+
+        version_dir = os.path.join(self._series_dir(symbol, adjust), meta["version"])
+        columns = {}
+        for col in meta["columns"]:
+            columns[col] = np.load(os.path.join(version_dir, f"{col}.npy"), mmap_mode="r")
+
+        self._handles[key] = (meta["version"], columns)
+        return columns
+
+    def ranges(self, symbol, adjust="qfq"):
+        """
+        返回已覆盖的日期区间
+
+        Returns:
+            list: [(Timestamp, Timestamp), ...]
+        """
+        meta = self._load_meta(symbol, adjust)
+        if not meta:
+            return []
+        return [(_to_day(s), _to_day(e)) for s, e in meta.get("ranges", [])]
+
+    def covers(self, symbol, start_date, end_date, adjust="qfq"):
+        """判断仓库是否已完整覆盖指定日期区间"""
+        start, end = _to_day(start_date), _to_day(end_date)
+        for range_start, range_end in self.ranges(symbol, adjust):
+            if range_start <= start and end <= range_end:
+                return True
+        return False
+
+    def last_date(self, symbol, before, adjust="qfq"):
+        """
+        返回指定日期之前（不含）的最后一根K线日期
+
+        Returns:
+            Timestamp: 最后一根K线的日期，没有数据时返回None
+        """
+        df = self.read(symbol, end_date=_to_day(before) - timedelta(days=1), adjust=adjust)
+        if df.empty:
+            return None
+        return pd.Timestamp(df[DATE_COLUMN].iloc[-1])
+
+    def read(self, symbol, start_date=None, end_date=None, adjust="qfq"):
+        """
+        按日期区间读取K线
+
+        Args:
+            symbol: 股票代码
+            start_date: 开始日期（包含），为None时从最早一条开始
+            end_date: 结束日期（包含），为None时到最后一条
+            adjust: 复权类型
+
+        Returns:
+            DataFrame: 区间内的K线，仓库中没有数据时返回空DataFrame
+        """
+        meta = self._load_meta(symbol, adjust)
+        if not meta or meta.get("rows", 0) == 0:
+            return pd.DataFrame()
+
+        try:
+            columns = self._open_columns(symbol, adjust, meta)
+        except Exception as e:
+            # 其他进程可能刚好替换了版本，丢弃句柄后重试一次
+            print(f"[K线仓库] 打开 {symbol} 的列文件失败: {e}，重新加载")
+            self._handles.pop((symbol, adjust), None)
+            self._meta_cache.clear()
+            meta = self._load_meta(symbol, adjust)
+            if not meta or meta.get("rows", 0) == 0:
+                return pd.DataFrame()
+            try:
+                columns = self._open_columns(symbol, adjust, meta)
+            except Exception as e:
+                print(f"[K线仓库] 重新打开 {symbol} 的列文件失败: {e}")
+                return pd.DataFrame()
+
+        dates = columns[DATE_COLUMN]
+        lo = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(_to_day(start_date)), side="left"))
+        hi = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(_to_day(end_date)), side="right"))
+
+        return pd.DataFrame({col: np.array(arr[lo:hi]) for col, arr in columns.items()},
+                            columns=meta["columns"])
+
+    def write(self, symbol, df, start_date, end_date, adjust="qfq"):
+        """
+        将新获取的K线合并进仓库
+
+        同一日期以新数据为准，新数据缺失的列保留旧值；如果与已有数据重叠部分的收盘价或成交量不一致
+        （例如除权后前复权基准发生变化，或换用了成交量单位不同的数据源），则丢弃旧数据，只保留新数据。
+
+        Args:
+            symbol: 股票代码
+            df: 包含 date 列的K线数据
+            start_date: 本次请求覆盖的开始日期
+            end_date: 本次请求覆盖的结束日期
+            adjust: 复权类型
+
+        Returns:
+            bool: 是否写入成功
+        """
+        if df is None:
+            return False
+
+        # 空结果（区间内没有交易日）只记录覆盖区间
+        if DATE_COLUMN not in df.columns:
+            df = pd.DataFrame({DATE_COLUMN: pd.to_datetime([])})
+
+        new_df = df.copy()
+        new_df[DATE_COLUMN] = pd.to_datetime(new_df[DATE_COLUMN])
+
+        # 只保存数值列，其余列无法以定长格式存储
+        keep = [DATE_COLUMN] + [col for col in new_df.columns
+                                if col != DATE_COLUMN and pd.api.types.is_numeric_dtype(new_df[col])]
+        new_df = new_df[keep]
+
+        with self._series_lock(symbol, adjust):
+            try:
+                meta = self._load_meta(symbol, adjust)
+                ranges = [(start_date, end_date)]
+
+                if meta:
+                    old_df = self.read(symbol, adjust=adjust)
+                    if not self._consistent(old_df, new_df):
+                        print(f"[K线仓库] {symbol} 的复权基准或数据口径已变化，丢弃旧数据")
+                    else:
+                        ranges += [tuple(r) for r in meta.get("ranges", [])]
+                        if not old_df.empty:
+                            replaced = old_df[DATE_COLUMN].isin(new_df[DATE_COLUMN])
+                            if replaced.any():
+                                # 新数据缺失的列用同一日期的旧值补齐
+                                columns = list(new_df.columns) + [col for col in old_df.columns if col not in new_df.columns]
+                                new_df = (new_df.set_index(DATE_COLUMN)
+                                          .combine_first(old_df[replaced].set_index(DATE_COLUMN))
+                                          .reset_index()[columns])
+                            new_df = pd.concat([old_df[~replaced], new_df], ignore_index=True)
+
+                new_df = new_df.sort_values(DATE_COLUMN).reset_index(drop=True)
+                self._write_version(symbol, adjust, new_df, merge_ranges(ranges))
+                return True
+            except Exception as e:
+                print(f"[K线仓库] 写入 {symbol} 的K线数据失败: {e}")
+                return False
+
+    @staticmethod
+    def _consistent(old_df, new_df):
+        """重叠日期的收盘价一致，且成交量在5%以内（不同数据源的成交量略有出入，单位不同时相差100倍）"""
+        for col, rtol in (("close", 1e-6), ("volume", 0.05)):
+            if col not in new_df.columns or col not in old_df.columns:
+                continue
+            overlap = old_df[[DATE_COLUMN, col]].merge(new_df[[DATE_COLUMN, col]], on=DATE_COLUMN, suffixes=("", "_new"))
+            overlap = overlap.dropna()
+            if not overlap.empty and not np.allclose(overlap[col], overlap[f"{col}_new"], rtol=rtol):
+                return False
+        return True
+
+    def _write_version(self, symbol, adjust, df, ranges):
+        """写入一个新版本目录，然后原子替换元数据并清理旧版本"""
+        series_dir = self._series_dir(symbol, adjust)
+        version = f"v{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(series_dir, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        columns = list(df.columns)
+        for col in columns:
+            if col == DATE_COLUMN:
+                values = df[col].values.astype("datetime64[ns]")
+            else:
+                values = df[col].to_numpy(dtype="float64", na_value=np.nan)
+            np.save(os.path.join(version_dir, f"{col}.npy"), values)
+
+        meta = {
+            "version": version,
+            "columns": columns,
+            "rows": len(df),
+            "ranges": [[s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")] for s, e in ranges],
+            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp_file = os.path.join(series_dir, f"meta.json.{version}.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_file, os.path.join(series_dir, "meta.json"))
+
+        # 只清理比当前版本旧的版本（其他进程已映射的文件在POSIX系统上仍然可读）
+        for name in os.listdir(series_dir):
+            path = os.path.join(series_dir, name)
+            if os.path.isdir(path) and _version_time(name) < _version_time(version):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def read_factors(self, symbol):
+        """
+        读取复权因子表
+
+        Returns:
+            tuple: (DataFrame, 获取日期 Timestamp)，没有保存过时返回 (空DataFrame, None)
+        """
+        ranges = self.ranges(symbol, FACTOR_SERIES)
+        if not ranges:
+            return pd.DataFrame(), None
+        return self.read(symbol, adjust=FACTOR_SERIES), ranges[-1][1]
+
+    def write_factors(self, symbol, df, fetched_on=None):
+        """
+        整体替换复权因子表
+
+        Args:
+            symbol: 股票代码
+            df: 包含 date 列和因子列的DataFrame
+            fetched_on: 获取日期，默认为今天；该日期之前的除权除息都已包含在表中
+
+        Returns:
+            bool: 是否写入成功
+        """
+        fetched_on = _to_day(fetched_on or datetime.now())
+        df = df.copy()
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+        df = df.sort_values(DATE_COLUMN).reset_index(drop=True)
+        start = df[DATE_COLUMN].iloc[0].normalize() if not df.empty else fetched_on
+        with self._series_lock(symbol, FACTOR_SERIES):
+            try:
+                self._write_version(symbol, FACTOR_SERIES, df, [(min(start, fetched_on), fetched_on)])
+                return True
+            except Exception as e:
+                print(f"[K线仓库] 写入 {symbol} 的复权因子失败: {e}")
+                return False
+
+    def drop_series(self, adjust):
+        """
+        删除所有股票中指定复权类型的序列
+
+        Args:
+            adjust: 复权类型，如 "qfq"
+
+        Returns:
+            int: 删除的序列数
+        """
+        count = 0
+        for symbol in os.listdir(self.root_dir):
+            series_dir = self._series_dir(symbol, adjust)
+            if not os.path.isdir(series_dir):
+                continue
+            with self._series_lock(symbol, adjust):
+                shutil.rmtree(series_dir, ignore_errors=True)
+                self._handles.pop((symbol, adjust), None)
+            count += 1
+        self._meta_cache.clear()
+        return count
+
+    def clear(self, symbol=None):
+        """清空整个仓库或指定股票的数据"""
+        with self._lock:
+            target = self.root_dir if symbol is None else os.path.join(self.root_dir, symbol)
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(self.root_dir, exist_ok=True)
+            self._meta_cache.clear()
+            self._handles.clear()
+
+
+# 全局K线仓库实例
+bar_store = BarStore(metrics=cache_metrics)
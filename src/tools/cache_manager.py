@@ -0,0 +1,389 @@
+"""
+统一的分层缓存
+
+api.py、fast_api.py 和 data_provider.py 原来各自维护一套缓存字典、有效期和出错时使用过期数据的逻辑，
+同一只股票的行情和K线在三处分别缓存，命中率被拆成三份。这里统一为一个缓存管理器：
+- 分层读取：内存（memory_cache.py）→ 本地磁盘（fundamentals_cache.py 的 SQLite 库）→ 可选的共享存储，
+  下层命中时回填到上层
+- 统一的键：命名空间 + 由 make_key 规范化的各部分（日期统一为 YYYYMMDD），
+  例如 price_bars / 600519|20240101|20241231|qfq
+- 每个命名空间一条策略：有效期、过期后作为兜底保留的时间、是否写入磁盘和共享存储、读取时是否复制
+- get_or_fetch：未命中时获取新数据，获取失败或结果无效时返回过期数据（stale-while-error）
+- 各层的命中、未命中、返回过期数据和淘汰按命名空间和股票代码计入 cache_metrics.py，report 汇总查看
+
+共享存储通过环境变量 SHARED_CACHE_URL 配置（如 redis://localhost:6379/0），依赖可选的 redis 包，
+未配置或未安装时只使用内存和本地磁盘。
+"""
+
+import os
+import time
+import pickle
+import threading
+from datetime import date, datetime
+
+import pandas as pd
+
+from src.tools.memory_cache import MemoryCache, DEFAULT_STALE_TTL
+from src.tools.fundamentals_cache import fundamentals_cache, report_expiry
+from src.tools.cache_metrics import CacheMetrics, cache_metrics, summarize, symbol_of
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class NamespacePolicy:
+    """一个命名空间的缓存策略"""
+
+    def __init__(self, ttl, stale_ttl=DEFAULT_STALE_TTL, persist=False, shared=False, copy_on_read=False):
+        """
+        Args:
+            ttl: 有效期（秒）
+            stale_ttl: 过期后仍作为兜底保留的时间（秒）
+            persist: 是否写入本地磁盘，供其他进程使用
+            shared: 是否写入共享存储，供其他机器使用
+            copy_on_read: 读取时是否返回副本（调用方会修改返回的DataFrame时使用）
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.persist = persist
+        self.shared = shared
+        self.copy_on_read = copy_on_read
+
+
+# 各命名空间的缓存策略
+NAMESPACE_POLICIES = {
+    # 实时行情，三个模块共用
+    "market_data": NamespacePolicy(ttl=30 * 60, persist=True, shared=True),
+    # 全市场行情快照（spot_snapshot.py），有效期由快照设置，写入磁盘供其他进程使用
+    "spot_snapshot": NamespacePolicy(ttl=60, persist=True),
+    # get_price_bars 返回的原始K线（不含指标），三个模块共用；磁盘上由 bar_store 保存
+    "price_bars": NamespacePolicy(ttl=12 * 3600, copy_on_read=True),
+    # api.get_price_history 返回的带技术指标的K线
+    "price_history": NamespacePolicy(ttl=12 * 3600),
+    # fast_api.get_price_history 返回的带技术指标的K线（指标与 api 不同）
+    "fast_price_history": NamespacePolicy(ttl=6 * 3600),
+    # 财务数据，有效期按披露日历计算，ttl 为披露窗口内的重新验证间隔
+    "financial_metrics": NamespacePolicy(ttl=12 * 3600, persist=True, shared=True),
+    "financial_statements": NamespacePolicy(ttl=24 * 3600, persist=True, shared=True),
+}
+DEFAULT_POLICY = NamespacePolicy(ttl=3600)
+
+
+def make_key(*parts):
+    """
+    由各部分构建缓存键，日期统一为 YYYYMMDD
+
+    例如 make_key("600519", "2024-01-01", datetime(2024, 12, 31), "qfq") -> "600519|20240101|20241231|qfq"
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, (datetime, date, pd.Timestamp)):
+            part = part.strftime("%Y%m%d")
+        elif isinstance(part, str) and len(part) == 10 and part[4] == "-" and part[7] == "-":
+            part = part.replace("-", "")
+        elif part is None:
+            part = ""
+        normalized.append(str(part))
+    return "|".join(normalized)
+
+
+class RedisStore:
+    """基于 Redis 的共享存储，接口与 FundamentalsCache 相同"""
+
+    def __init__(self, url, stale_ttl=DEFAULT_STALE_TTL):
+        self.client = redis.Redis.from_url(url)
+        self.url = url
+        self.stale_ttl = stale_ttl
+
+    def get(self, kind, symbol, allow_expired=False):
+        try:
+            payload = self.client.get(f"{kind}:{symbol}")
+        except redis.RedisError as e:
+            print(f"[共享缓存] 读取 {kind}/{symbol} 失败: {e}")
+            return None
+        if payload is None:
+            return None
+        value, expires_at = pickle.loads(payload)
+        if expires_at <= time.time() and not allow_expired:
+            return None
+        return value, expires_at
+
+    def put(self, kind, symbol, value, ttl, period=None):
+        expires_at = report_expiry(period, ttl)
+        try:
+            self.client.set(f"{kind}:{symbol}", pickle.dumps((value, expires_at)),
+                            ex=max(1, int(expires_at - time.time() + self.stale_ttl)))
+        except redis.RedisError as e:
+            print(f"[共享缓存] 写入 {kind}/{symbol} 失败: {e}")
+        return expires_at
+
+    def delete(self, kind, symbol=None):
+        try:
+            if symbol is not None:
+                self.client.delete(f"{kind}:{symbol}")
+            else:
+                keys = list(self.client.scan_iter(f"{kind}:*"))
+                if keys:
+                    self.client.delete(*keys)
+        except redis.RedisError as e:
+            print(f"[共享缓存] 删除 {kind}/{symbol} 失败: {e}")
+
+    def stats(self):
+        return {"url": self.url}
+
+
+def _shared_store_from_env():
+    url = os.getenv("SHARED_CACHE_URL")
+    if not url:
+        return None
+    if not REDIS_AVAILABLE:
+        print("[缓存管理] 配置了 SHARED_CACHE_URL，但未安装 redis 包，不使用共享存储")
+        return None
+    return RedisStore(url)
+
+
+class CacheManager:
+    """内存 → 本地磁盘 → 共享存储的分层缓存"""
+
+    def __init__(self, disk=fundamentals_cache, shared=None, policies=None, metrics=None):
+        """
+        初始化缓存管理器
+
+        Args:
+            disk: 本地磁盘层，需要提供 FundamentalsCache 的 get/put/delete/stats 接口，为None时不使用
+            shared: 共享存储层，接口同上，为None时不使用
+            policies: 命名空间策略，默认为 NAMESPACE_POLICIES
+            metrics: 缓存效果统计，默认只在进程内统计
+        """
+        self.disk = disk
+        self.shared = shared
+        self.policies = dict(NAMESPACE_POLICIES if policies is None else policies)
+        self.metrics = metrics if metrics is not None else CacheMetrics(path=None)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def policy(self, namespace):
+        return self.policies.get(namespace, DEFAULT_POLICY)
+
+    def memory(self, namespace):
+        """返回命名空间的内存层"""
+        with self._lock:
+            cache = self._memory.get(namespace)
+            if cache is None:
+                cache = self._memory[namespace] = MemoryCache(
+                    namespace, stale_ttl=self.policy(namespace).stale_ttl,
+                    on_evict=lambda key: self.metrics.record_eviction(namespace, key))
+            return cache
+
+    def _lower_tiers(self, policy):
+        tiers = []
+        if policy.persist and self.disk is not None:
+            tiers.append(self.disk)
+        if policy.shared and self.shared is not None:
+            tiers.append(self.shared)
+        return tiers
+
+    def _tier_name(self, tier):
+        return "disk" if tier is self.disk else "shared"
+
+    def get(self, namespace, key, allow_expired=False):
+        """
+        按层读取缓存，下层命中时回填到上层
+
+        Args:
+            namespace: 命名空间
+            key: 缓存键（make_key 的结果或字符串）
+            allow_expired: 是否返回已过期（仍在兜底保留期内）的记录；
+                           这种兜底读取没有找到记录时不再重复计入未命中
+
+        Returns:
+            缓存的值，没有可用记录时返回None
+        """
+        policy = self.policy(namespace)
+        memory = self.memory(namespace)
+        value = memory.get(key)
+        if value is not None:
+            self.metrics.record_hit(namespace, key, "memory")
+        else:
+            for index, tier in enumerate(self._lower_tiers(policy)):
+                cached = tier.get(namespace, key)
+                if cached is None:
+                    continue
+                value, expires_at = cached
+                self.metrics.record_hit(namespace, key, self._tier_name(tier))
+                memory.set(key, value, expires_at=expires_at)
+                # 共享存储命中时回填本地磁盘
+                for upper in self._lower_tiers(policy)[:index]:
+                    upper.put(namespace, key, value, max(0.0, expires_at - time.time()))
+                break
+
+        if value is None and allow_expired:
+            value = memory.get(key, allow_expired=True)
+            if value is None:
+                for tier in self._lower_tiers(policy):
+                    cached = tier.get(namespace, key, allow_expired=True)
+                    if cached is not None:
+                        value = cached[0]
+                        break
+            if value is not None:
+                self.metrics.record_stale(namespace, key)
+        elif value is None:
+            self.metrics.record_miss(namespace, key)
+
+        if value is not None and policy.copy_on_read and callable(getattr(value, "copy", None)):
+            value = value.copy()
+        return value
+
+    def set(self, namespace, key, value, ttl=None, period=None, persist=True):
+        """
+        写入各层缓存
+
+        Args:
+            namespace: 命名空间
+            key: 缓存键
+            value: 要缓存的值
+            ttl: 有效期（秒），默认使用命名空间策略
+            period: 财务数据所属的报告期，有效期按披露日历计算（见 fundamentals_cache.report_expiry）
+            persist: 为False时只写入内存（例如不完整的数据）
+
+        Returns:
+            float: 过期时间戳
+        """
+        policy = self.policy(namespace)
+        ttl = policy.ttl if ttl is None else ttl
+        expires_at = report_expiry(period, ttl)
+        # 未命中之后写入的新数据，按未命中到写入的时间计入获取耗时
+        self.metrics.record_fetch(namespace, key)
+        if persist:
+            for tier in self._lower_tiers(policy):
+                tier.put(namespace, key, value, ttl, period=period)
+        self.memory(namespace).set(key, value, expires_at=expires_at)
+        return expires_at
+
+    def get_or_fetch(self, namespace, key, fetch_func, is_valid=None, ttl=None):
+        """
+        读取缓存，未命中时获取新数据；获取失败或结果无效时返回过期数据
+
+        Args:
+            namespace: 命名空间
+            key: 缓存键
+            fetch_func: 无参数的获取函数
+            is_valid: 结果校验函数，默认要求结果不为None
+            ttl: 有效期（秒），默认使用命名空间策略
+
+        Returns:
+            缓存或新获取的值；获取失败且没有过期数据时，返回获取函数的结果或抛出其异常
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+
+        is_valid = is_valid or (lambda result: result is not None)
+        try:
+            value = fetch_func()
+        except Exception:
+            stale = self.get(namespace, key, allow_expired=True)
+            if stale is None:
+                raise
+            print(f"[缓存管理] 获取 {namespace}/{key} 失败，使用过期的缓存数据")
+            return stale
+
+        if is_valid(value):
+            self.set(namespace, key, value, ttl=ttl)
+            return value
+        stale = self.get(namespace, key, allow_expired=True)
+        if stale is not None:
+            print(f"[缓存管理] {namespace}/{key} 的新数据无效，使用过期的缓存数据")
+            return stale
+        return value
+
+    def expires_at(self, namespace, key):
+        """返回内存层中记录的过期时间（datetime）"""
+        return self.memory(namespace).expires_at(key)
+
+    def delete(self, namespace, key=None):
+        """删除一条记录或整个命名空间，包括磁盘和共享存储"""
+        policy = self.policy(namespace)
+        if key is None:
+            self.memory(namespace).clear()
+        else:
+            self.memory(namespace).delete(key)
+        for tier in self._lower_tiers(policy):
+            tier.delete(namespace, key)
+
+    def clear_memory(self, namespace=None):
+        """清空内存层，下次读取时从磁盘或数据源重新加载"""
+        with self._lock:
+            caches = list(self._memory.values()) if namespace is None else [self._memory.get(namespace)]
+        for cache in caches:
+            if cache is not None:
+                cache.clear()
+
+    def stats(self):
+        """返回各层的统计信息"""
+        with self._lock:
+            caches = dict(self._memory)
+        return {
+            "memory": {name: cache.stats() for name, cache in sorted(caches.items())},
+            "disk": self.disk.stats() if self.disk is not None else None,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+    def report(self):
+        """
+        按命名空间和股票代码汇总缓存效果
+
+        计数器为所有进程的累计值（见 cache_metrics.py）；memory_bytes 为当前进程内存层占用的字节数，
+        disk_bytes 为本地磁盘层占用的字节数。节省的时间 = 命中次数 × 平均获取耗时，
+        股票没有获取记录时使用所属命名空间的平均获取耗时。
+
+        Returns:
+            dict: {"namespaces": [每个命名空间一行], "symbols": [每个命名空间下每只股票一行]}，
+                  股票按节省的时间从多到少排列
+        """
+        counters = self.metrics.counters()
+        memory_bytes, disk_bytes = {}, {}
+        with self._lock:
+            caches = dict(self._memory)
+        for namespace, cache in caches.items():
+            for key, size in cache.sizes().items():
+                ident = (namespace, symbol_of(key))
+                memory_bytes[ident] = memory_bytes.get(ident, 0) + size
+        if self.disk is not None and hasattr(self.disk, "usage"):
+            for namespace, key, size in self.disk.usage():
+                ident = (namespace, symbol_of(key))
+                disk_bytes[ident] = disk_bytes.get(ident, 0) + (size or 0)
+
+        idents = set(counters) | set(memory_bytes) | set(disk_bytes)
+        namespace_totals = {}
+        for namespace, symbol in idents:
+            totals = namespace_totals.setdefault(namespace, {"memory_bytes": 0, "disk_bytes": 0, "symbols": 0})
+            totals["symbols"] += 1
+            totals["memory_bytes"] += memory_bytes.get((namespace, symbol), 0)
+            totals["disk_bytes"] += disk_bytes.get((namespace, symbol), 0)
+            for name, amount in counters.get((namespace, symbol), {}).items():
+                totals[name] = totals.get(name, 0) + amount
+
+        namespaces = []
+        for namespace, totals in sorted(namespace_totals.items()):
+            row = {"namespace": namespace, **summarize(totals)}
+            row.update(memory_bytes=totals["memory_bytes"], disk_bytes=totals["disk_bytes"], symbols=totals["symbols"])
+            namespaces.append(row)
+        fallback = {row["namespace"]: row["avg_fetch_seconds"] for row in namespaces}
+
+        symbols = []
+        for namespace, symbol in idents:
+            row = {"namespace": namespace, "symbol": symbol,
+                   **summarize(counters.get((namespace, symbol), {}), fallback[namespace])}
+            row.update(memory_bytes=memory_bytes.get((namespace, symbol), 0),
+                       disk_bytes=disk_bytes.get((namespace, symbol), 0))
+            symbols.append(row)
+        symbols.sort(key=lambda row: (-(row["time_saved_seconds"] or 0), -row["hits"], row["namespace"], row["symbol"]))
+        return {"namespaces": namespaces, "symbols": symbols}
+
+
+# 全局缓存管理器
+cache_manager = CacheManager(shared=_shared_store_from_env(), metrics=cache_metrics)
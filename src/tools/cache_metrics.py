@@ -0,0 +1,246 @@
+"""
+缓存效果统计
+
+data_provider_fix.check_all_caches 只能检查缓存文件是否是有效的 pickle，看不出缓存是否真的起作用。
+这里按命名空间和股票代码记录缓存管理器各层的：
+- 命中次数（分内存、本地磁盘、共享存储三层）、未命中次数、出错时返回过期数据的次数
+- 内存层淘汰的记录数
+- 未命中后获取新数据的次数和耗时，据此估算命中节省的时间（命中次数 × 平均获取耗时）
+
+Streamlit 界面每次分析都会启动新的 src/main.py 进程，计数器只保存在进程内时看不到累计效果，
+因此计数器定期累加到缓存目录下的 SQLite 数据库中（多个进程同时写入时按增量累加，互不覆盖）。
+占用的字节数是当前状态而不是累计值，由 CacheManager.report 在查询时从各层读取。
+
+查看方式：python fix_cache.py --stats，或界面侧边栏的「缓存统计」面板。
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+
+# 定义缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+CACHE_METRICS_DB = os.path.join(CACHE_DIR, "cache_metrics.sqlite")
+
+# 两次写盘之间的最短间隔（秒）
+SAVE_INTERVAL_SECONDS = 30
+# 未命中后超过该时间仍未写入的记录不再计入获取耗时（秒），例如数据源全部失败的情况
+PENDING_FETCH_TIMEOUT = 10 * 60
+# 最多同时跟踪的未命中记录数
+MAX_PENDING_FETCHES = 10000
+# 等待其他进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT = 30
+
+# 计数器字段
+COUNTERS = ("memory_hits", "disk_hits", "shared_hits", "misses", "stale_serves",
+            "evictions", "fetches", "fetch_seconds")
+# 缓存层名称到计数器的对应关系
+TIER_COUNTERS = {"memory": "memory_hits", "disk": "disk_hits", "shared": "shared_hits"}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS counters (
+    namespace TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    {", ".join(f"{name} {'REAL' if name == 'fetch_seconds' else 'INTEGER'} NOT NULL DEFAULT 0" for name in COUNTERS)},
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, symbol)
+)
+"""
+
+
+def symbol_of(key):
+    """从缓存键中取出股票代码（make_key 构建的键以股票代码开头）"""
+    return str(key).split("|", 1)[0]
+
+
+def summarize(counters, fallback_latency=None):
+    """
+    由计数器计算命中率、平均获取耗时和节省的时间
+
+    Args:
+        counters: 计数器字典
+        fallback_latency: 没有获取记录时使用的平均获取耗时（秒），例如所属命名空间的平均值
+
+    Returns:
+        dict: 计数器加上 hits、hit_rate、avg_fetch_seconds、time_saved_seconds
+    """
+    row = {name: counters.get(name, 0) for name in COUNTERS}
+    hits = row["memory_hits"] + row["disk_hits"] + row["shared_hits"]
+    lookups = hits + row["misses"]
+    avg_latency = row["fetch_seconds"] / row["fetches"] if row["fetches"] else fallback_latency
+    row.update({
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else None,
+        "avg_fetch_seconds": avg_latency,
+        "time_saved_seconds": hits * avg_latency if avg_latency is not None else None,
+    })
+    return row
+
+
+class CacheMetrics:
+    """按命名空间和股票代码记录缓存效果，线程安全"""
+
+    def __init__(self, path=CACHE_METRICS_DB):
+        """
+        初始化统计
+
+        Args:
+            path: SQLite 数据库文件路径，为None时只在进程内统计
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # 尚未写入数据库的增量 (namespace, symbol) -> {计数器: 值}
+        self._pending = {}
+        # 已写入数据库的本进程计数，path 为None时也保留在这里
+        self._saved = {}
+        # 未命中的记录 (namespace, key) -> 开始时间，写入新数据时据此计算获取耗时
+        self._misses_started = {}
+        self._last_save = time.time()
+
+    def _add(self, namespace, key, name, amount=1):
+        should_save = False
+        with self._lock:
+            counters = self._pending.setdefault((namespace, symbol_of(key)), {})
+            counters[name] = counters.get(name, 0) + amount
+            if self.path and time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+                should_save = True
+        if should_save:
+            self.save()
+
+    def record_hit(self, namespace, key, tier="memory"):
+        """记录一次命中，tier 为 memory / disk / shared"""
+        self._add(namespace, key, TIER_COUNTERS[tier])
+
+    def record_miss(self, namespace, key):
+        """记录一次未命中，之后写入同一个键时计算获取耗时"""
+        now = time.time()
+        with self._lock:
+            if len(self._misses_started) >= MAX_PENDING_FETCHES:
+                self._misses_started = {k: t for k, t in self._misses_started.items()
+                                        if now - t < PENDING_FETCH_TIMEOUT}
+                if len(self._misses_started) >= MAX_PENDING_FETCHES:
+                    self._misses_started.clear()
+            self._misses_started[(namespace, key)] = now
+        self._add(namespace, key, "misses")
+
+    def record_stale(self, namespace, key):
+        """记录一次返回过期数据（获取新数据失败），之前的未命中不再计入获取耗时"""
+        with self._lock:
+            self._misses_started.pop((namespace, key), None)
+        self._add(namespace, key, "stale_serves")
+
+    def record_eviction(self, namespace, key):
+        """记录内存层淘汰的一条记录"""
+        self._add(namespace, key, "evictions")
+
+    def record_fetch(self, namespace, key, seconds=None):
+        """
+        记录一次获取新数据
+
+        Args:
+            namespace: 命名空间
+            key: 缓存键
+            seconds: 获取耗时；为None时按该键最近一次未命中到现在的时间计算，没有未命中记录时不计入
+        """
+        with self._lock:
+            started = self._misses_started.pop((namespace, key), None)
+        if seconds is None:
+            if started is None or time.time() - started >= PENDING_FETCH_TIMEOUT:
+                return
+            seconds = time.time() - started
+        self._add(namespace, key, "fetches")
+        self._add(namespace, key, "fetch_seconds", seconds)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    def _merge(self, target, pending):
+        for ident, counters in pending.items():
+            merged = target.setdefault(ident, {})
+            for name, amount in counters.items():
+                merged[name] = merged.get(name, 0) + amount
+
+    def save(self):
+        """把尚未写入的增量累加到数据库，写入失败时保留增量，下次保存时重试"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_save = time.time()
+            if not self.path:
+                self._merge(self._saved, pending)
+        if not self.path or not pending:
+            return
+
+        columns = ", ".join(COUNTERS)
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTERS)
+        now = time.time()
+        rows = [(namespace, symbol, *[counters.get(name, 0) for name in COUNTERS], now)
+                for (namespace, symbol), counters in pending.items()]
+        try:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    f"INSERT INTO counters (namespace, symbol, {columns}, updated_at) "
+                    f"VALUES (?, ?, {', '.join('?' for _ in COUNTERS)}, ?) "
+                    f"ON CONFLICT (namespace, symbol) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                    rows,
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[缓存统计] 保存统计失败，下次保存时重试: {e}")
+            with self._lock:
+                self._merge(self._pending, pending)
+            return
+        with self._lock:
+            self._merge(self._saved, pending)
+
+    def counters(self):
+        """
+        返回累计的计数器
+
+        Returns:
+            dict: (namespace, symbol) -> {计数器: 值}，包括其他进程写入数据库的部分和本进程尚未写入的增量
+        """
+        self.save()
+        totals = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                conn = self._connect()
+                try:
+                    for row in conn.execute(f"SELECT namespace, symbol, {', '.join(COUNTERS)} FROM counters"):
+                        totals[(row[0], row[1])] = dict(zip(COUNTERS, row[2:]))
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"[缓存统计] 读取统计失败: {e}")
+        elif not self.path:
+            with self._lock:
+                totals = {ident: dict(counters) for ident, counters in self._saved.items()}
+        return totals
+
+    def reset(self):
+        """清空所有统计"""
+        with self._lock:
+            self._pending.clear()
+            self._saved.clear()
+            self._misses_started.clear()
+        if self.path and os.path.exists(self.path):
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute("DELETE FROM counters")
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"[缓存统计] 清空统计失败: {e}")
+
+
+# 全局缓存统计
+cache_metrics = CacheMetrics()
+atexit.register(cache_metrics.save)
@@ -0,0 +1,229 @@
+"""
+盘前缓存预热
+
+每只股票当天的第一次分析都要冷启动获取全部数据：股票名称表、一年的K线、三张财务报表、
+财务指标、全市场行情快照和新闻。这里在开盘（9:30）之前按自选股列表预先获取这些数据，
+写入可跨进程使用的缓存，盘中的交互分析直接命中：
+- 股票名称表：data_provider 的名称缓存文件
+- 历史K线：K线仓库（bar_store.py），与 get_price_history 的默认区间相同（截至昨天的一年）
+- 财务指标、财务报表、市场数据：缓存管理器的本地磁盘层
+- 全市场行情快照：缓存管理器的 spot_snapshot 命名空间；盘前的快照和市场数据一直有效到开盘
+- 新闻：news_crawler 按日期保存的新闻文件
+
+所有请求都经过共享的连接池和按主机限流（见 rate_limiter.py），同时预热的股票数由 max_workers 限制。
+
+自选股列表为文本文件，每行一个或多个股票代码（以空白或逗号分隔），# 之后为注释。
+命令行入口见项目根目录的 warm_cache.py。
+"""
+
+import os
+import re
+import time
+import threading
+from datetime import datetime, timedelta, time as dtime
+
+from src.tools.api import (get_financial_metrics, get_financial_statements, get_market_data,
+                           get_price_history_batch)
+from src.tools.cache_manager import cache_manager
+from src.tools.data_provider import STOCK_NAMES_CACHE_FILE, load_stock_names
+from src.tools.executors import get_executor, submit_windowed
+from src.tools.spot_snapshot import spot_snapshot
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WATCHLIST_FILE = os.path.join(PROJECT_ROOT, "watchlist.txt")
+
+# 开盘时间
+MARKET_OPEN = dtime(9, 30)
+# 默认的预热时间
+DEFAULT_WARM_TIME = "09:00"
+# 预热的新闻条数（界面最多分析20条）
+DEFAULT_NEWS_COUNT = 20
+# 同时预热的股票数
+WARM_WORKERS = 4
+
+# 股票名称表的缓存文件超过该时间时重新下载（data_provider 在7天后才会重新下载）
+STOCK_NAMES_REFRESH_AGE = timedelta(days=6)
+
+
+def load_watchlist(path=WATCHLIST_FILE):
+    """
+    读取自选股列表
+
+    Args:
+        path: 列表文件路径
+
+    Returns:
+        list: 去重后的股票代码，保持文件中的顺序
+    """
+    symbols = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            for token in re.split(r"[\s,，]+", line.split("#", 1)[0].strip()):
+                if not token:
+                    continue
+                if not re.fullmatch(r"\d{6}", token):
+                    print(f"[缓存预热] 忽略自选股列表第 {line_number} 行的无效代码: {token}")
+                    continue
+                symbols.append(token)
+    return list(dict.fromkeys(symbols))
+
+
+def parse_time(value):
+    """把 "HH:MM" 转换为 time"""
+    return datetime.strptime(value, "%H:%M").time()
+
+
+def seconds_until_open(now=None):
+    """
+    距当天开盘的秒数
+
+    Returns:
+        float: 工作日开盘之前返回距开盘的秒数，其他时间返回None
+    """
+    now = now or datetime.now()
+    if now.weekday() >= 5:
+        return None
+    open_at = datetime.combine(now.date(), MARKET_OPEN)
+    if now >= open_at:
+        return None
+    return (open_at - now).total_seconds()
+
+
+def next_run_time(at=DEFAULT_WARM_TIME, now=None):
+    """
+    下一次预热的时间：now 之后最近的一个工作日的 at 时刻
+
+    Args:
+        at: 预热时间 "HH:MM"
+        now: 当前时间
+
+    Returns:
+        datetime: 下一次预热的时间
+    """
+    now = now or datetime.now()
+    run_at = datetime.combine(now.date(), parse_time(at))
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    while run_at.weekday() >= 5:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+def _warm_stock_names():
+    """名称表缓存文件即将过期时重新下载，避免盘中的分析进程在加载时下载"""
+    if os.path.exists(STOCK_NAMES_CACHE_FILE):
+        age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(STOCK_NAMES_CACHE_FILE))
+        if age < STOCK_NAMES_REFRESH_AGE:
+            return
+    load_stock_names(force_refresh=True)
+
+
+def _warm_market_data(symbol, until_open):
+    result = get_market_data(symbol)
+    if until_open:
+        # 开盘前行情不变，市场数据一直有效到开盘，不必在开盘前因默认有效期过期而重新获取
+        cache_manager.set("market_data", symbol, result, ttl=until_open)
+    return bool(result)
+
+
+def _warm_financial_metrics(symbol):
+    result = get_financial_metrics(symbol)
+    return bool(result and result[0])
+
+
+def _warm_financial_statements(symbol):
+    result = get_financial_statements(symbol)
+    # 获取失败时返回全为0的默认值
+    return bool(result and any(result[0].values()))
+
+
+def warm_caches(symbols, start_date=None, end_date=None, num_of_news=DEFAULT_NEWS_COUNT,
+                include_news=True, max_workers=WARM_WORKERS):
+    """
+    预热自选股的缓存
+
+    Args:
+        symbols: 股票代码列表
+        start_date: K线开始日期，格式：YYYY-MM-DD，默认为结束日期前一年
+        end_date: K线结束日期，格式：YYYY-MM-DD，默认为昨天
+        num_of_news: 预热的新闻条数
+        include_news: 是否预热新闻
+        max_workers: 同时预热的股票数
+
+    Returns:
+        dict: {"symbols": 股票数, "elapsed_seconds": 总耗时, "failed": {数据类型: [股票代码, ...]}}
+    """
+    symbols = list(dict.fromkeys(symbols))
+    start_time = time.time()
+    failed = {}
+    print(f"[缓存预热] 开始预热 {len(symbols)} 只股票的缓存")
+
+    _warm_stock_names()
+
+    # 一次下载全市场行情，后续的市场数据和财务指标都从快照中读取
+    until_open = seconds_until_open()
+    if not spot_snapshot.refresh(persist_ttl=until_open):
+        failed["spot_snapshot"] = ["all"]
+
+    batch = get_price_history_batch(symbols, start_date=start_date, end_date=end_date)
+    if batch.failed:
+        failed["price_history"] = list(batch.failed)
+
+    get_stock_news = None
+    if include_news:
+        try:
+            from src.tools.news_crawler import get_stock_news
+        except ImportError as e:
+            print(f"[缓存预热] 无法导入新闻模块，跳过新闻预热: {e}")
+
+    tasks = {
+        "market_data": lambda symbol: _warm_market_data(symbol, until_open),
+        "financial_metrics": _warm_financial_metrics,
+        "financial_statements": _warm_financial_statements,
+    }
+    if get_stock_news is not None:
+        tasks["news"] = lambda symbol: bool(get_stock_news(symbol, max_news=num_of_news))
+
+    def warm(symbol):
+        results = {}
+        for name, task in tasks.items():
+            try:
+                results[name] = task(symbol)
+            except Exception as e:
+                print(f"[缓存预热] 预热 {symbol} 的 {name} 失败: {e}")
+                results[name] = False
+        return results
+
+    # 滑动窗口提交，本次预热最多占用共享线程池中的 max_workers 个线程
+    for symbol, future in submit_windowed(get_executor("fanout"), warm, symbols, max_workers):
+        for name, ok in future.result().items():
+            if not ok:
+                failed.setdefault(name, []).append(symbol)
+
+    summary = {"symbols": len(symbols), "elapsed_seconds": round(time.time() - start_time, 2), "failed": failed}
+    print(f"[缓存预热] 完成，耗时 {summary['elapsed_seconds']:.2f} 秒")
+    for name, failed_symbols in failed.items():
+        print(f"- {name} 失败 {len(failed_symbols)} 只: {', '.join(failed_symbols[:10])}")
+    return summary
+
+
+def run_daemon(path=WATCHLIST_FILE, at=DEFAULT_WARM_TIME, stop_event=None, **kwargs):
+    """
+    每个工作日在 at 时刻预热一次，每次重新读取自选股列表
+
+    Args:
+        path: 自选股列表文件路径
+        at: 预热时间 "HH:MM"
+        stop_event: 设置后退出循环（threading.Event），为None时一直运行
+        **kwargs: 传给 warm_caches 的参数
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        run_at = next_run_time(at)
+        print(f"[缓存预热] 下一次预热时间: {run_at.strftime('%Y-%m-%d %H:%M')}")
+        if stop_event.wait(max((run_at - datetime.now()).total_seconds(), 0)):
+            break
+        try:
+            warm_caches(load_watchlist(path), **kwargs)
+        except Exception as e:
+            print(f"[缓存预热] 预热失败: {e}")
@@ -0,0 +1,227 @@
+"""
+数据源熔断器
+
+每个上游数据源的每个接口一个熔断器（如 ("price_history", "新浪财经")），在 api.py、fast_api.py、
+data_provider.py 之间共享。同一数据源的不同接口互不影响，一个接口出错不会暂停该数据源的其他接口。
+只有抛出异常（包括请求超时）才计为失败；某只股票没有数据（返回None或空结果）是正常应答，
+否则几只停牌、退市或新上市的股票就会让正常的数据源熔断。
+
+- closed（关闭）：正常请求，连续失败达到阈值后打开
+- open（打开）：直接失败，不再请求上游，冷却时间过后进入半开
+- half_open（半开）：放行少量探测请求，成功则关闭，失败则重新打开
+"""
+
+import time
+import threading
+import functools
+
+# 连续失败多少次后打开熔断器
+FAILURE_THRESHOLD = 3
+# 打开后多久进入半开状态（秒）
+RECOVERY_TIMEOUT = 60
+# 半开状态下同时放行的探测请求数
+HALF_OPEN_MAX_CALLS = 1
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时抛出，表示数据源暂时不可用"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"数据源 {name} 已熔断，{retry_in:.0f} 秒后重试")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """单个数据源的熔断器"""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 recovery_timeout=RECOVERY_TIMEOUT, half_open_max_calls=HALF_OPEN_MAX_CALLS):
+        """
+        初始化熔断器
+
+        Args:
+            name: 数据源名称
+            failure_threshold: 连续失败多少次后打开
+            recovery_timeout: 打开后多久进入半开状态（秒）
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        # 统计信息
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """
+        请求前检查，熔断器打开时抛出 CircuitOpenError
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout - (time.time() - self._opened_at))
+            if state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"[熔断器] 数据源 {self.name} 已恢复")
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.trips += 1
+                    print(f"[熔断器] 数据源 {self.name} 连续失败 {self._failures} 次，暂停请求 {self.recovery_timeout} 秒")
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._probes = 0
+
+    def call(self, func, *args, is_valid=None, **kwargs):
+        """
+        通过熔断器调用函数
+
+        Args:
+            func: 数据获取函数
+            is_valid: 结果校验函数，返回False时计为失败；默认只有抛出异常才计为失败
+
+        Returns:
+            func 的返回值
+        """
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        if is_valid is not None and not is_valid(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def reset(self):
+        """手动关闭熔断器"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def snapshot(self):
+        """返回熔断器当前状态"""
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(self.recovery_timeout - (time.time() - self._opened_at), 0) if state == OPEN else 0
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in_seconds": round(retry_in, 1),
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def breaker_name(endpoint, name):
+    """熔断器的显示名称，如 "price_history/新浪财经"，未指定接口时为数据源名称"""
+    return f"{endpoint}/{name}" if endpoint else name
+
+
+class CircuitBreakerRegistry:
+    """按 (接口, 数据源名称) 管理熔断器"""
+
+    def __init__(self, **defaults):
+        self._defaults = defaults
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, endpoint=None):
+        """获取指定接口、指定数据源的熔断器，不存在时创建"""
+        key = (endpoint, name)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    key, CircuitBreaker(breaker_name(endpoint, name), **self._defaults))
+        return breaker
+
+    def wrap(self, name, func, endpoint=None):
+        """包装数据获取函数，使其经过指定接口、指定数据源的熔断器，只有抛出异常才计为失败"""
+        breaker = self.get(name, endpoint)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return breaker.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def states(self):
+        """返回所有熔断器的状态，键为熔断器的显示名称"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {breaker.name: breaker.snapshot() for breaker in breakers.values()}
+
+    def reset(self, name=None, endpoint=None):
+        """手动关闭熔断器：指定数据源时关闭该数据源的熔断器（指定接口时只关闭该接口的），否则关闭全部"""
+        with self._lock:
+            breakers = [breaker for (breaker_endpoint, breaker_source), breaker in self._breakers.items()
+                        if name is None or (breaker_source == name
+                                            and (endpoint is None or breaker_endpoint == endpoint))]
+        for breaker in breakers:
+            breaker.reset()
+
+
+# 全局熔断器注册表
+circuit_breakers = CircuitBreakerRegistry()
+
+
+def protect_sources(endpoint, sources):
+    """
+    让数据源列表中的每个获取函数经过该接口、该数据源的熔断器
+
+    Args:
+        endpoint: 接口类型，与 rank_sources 使用的相同，如 "price_history"
+        sources: [(数据源名称, 获取函数), ...]
+
+    Returns:
+        list: 包装后的 [(数据源名称, 获取函数), ...]
+    """
+    return [(name, circuit_breakers.wrap(name, func, endpoint)) for name, func in sources]
+
+
+def breaker_states():
+    """返回所有数据源熔断器的状态，供诊断界面和命令行查看"""
+    return circuit_breakers.states()
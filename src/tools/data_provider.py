@@ -7,7 +7,22 @@ import pandas as pd
 import akshare as ak
 from functools import wraps
 import threading
-import concurrent.futures
+
+from src.tools.bar_store import bar_store
+from src.tools.interval_cache import get_cached_price_bars
+from src.tools.adjust_factors import fetch_adjustment_factors
+from src.tools.spot_snapshot import spot_snapshot
+from src.tools.parallel_fetcher import race_sources
+from src.tools.source_ranking import rank_sources, source_ranker
+from src.tools.circuit_breaker import circuit_breakers, protect_sources
+from src.tools.request_context import allow_retry
+from src.tools.executors import get_executor, submit_windowed
+from src.tools.stock_index import StockIndex
+from src.tools.single_flight import patch_akshare_single_flight
+from src.tools.cache_manager import cache_manager
+
+# 合并并发的重复akshare请求（批量获取时同一股票可能被同时请求）
+patch_akshare_single_flight()
 
 # 定义缓存目录
 CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
@@ -22,10 +37,11 @@ os.makedirs(HISTORICAL_DATA_CACHE_DIR, exist_ok=True)
 # 缓存锁，防止多线程同时写入
 _cache_lock = threading.Lock()
 
-# 内存缓存
-_market_data_cache = {}
-_cache_expiry = {}
+# 市场数据和K线由 cache_manager 统一缓存，与 api、fast_api 共用命名空间
 _stock_names_df = None
+# 由 _stock_names_df 构建的代码/名称索引
+_stock_index = None
+_stock_index_source = None
 
 def log_data_operation(operation_type, details=""):
     """记录数据操作日志"""
@@ -91,7 +107,7 @@ def check_pickle_validity(cache_file):
         return False
 
 def retry_on_exception(max_retries=3, initial_delay=1, backoff_factor=2):
-    """重试装饰器，用于网络请求等容易失败的操作"""
+    """重试装饰器，用于网络请求等容易失败的操作，遵守当前请求的截止时间和重试预算"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -100,8 +116,8 @@ def retry_on_exception(max_retries=3, initial_delay=1, backoff_factor=2):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    if retry == max_retries - 1:
-                        # 最后一次重试失败，抛出异常
+                    if retry == max_retries - 1 or not allow_retry(delay):
+                        # 最后一次重试失败，或剩余时间、重试次数不足，抛出异常
                         raise
                     log_data_operation("重试警告", f"函数 {func.__name__} 执行失败 (尝试 {retry+1}/{max_retries}): {str(e)}")
                     time.sleep(delay)
@@ -233,6 +249,41 @@ def load_stock_names(force_refresh=False):
         _stock_names_df = pd.DataFrame(columns=["code", "name"])
         return _stock_names_df
 
+def get_stock_index():
+    """
+    获取股票代码/名称索引，股票名称数据刷新后自动重建
+
+    Returns:
+        StockIndex: 股票索引
+    """
+    global _stock_index, _stock_index_source
+
+    stock_df = load_stock_names()
+    if _stock_index is None or _stock_index_source is not stock_df:
+        with _cache_lock:
+            if _stock_index is None or _stock_index_source is not stock_df:
+                _stock_index = StockIndex.from_dataframe(stock_df)
+                _stock_index_source = stock_df
+                log_data_operation("股票名称", f"成功构建股票索引，共 {len(_stock_index)} 只股票")
+    return _stock_index
+
+def search_stocks(query, limit=10):
+    """
+    按代码、名称或拼音前缀搜索股票
+
+    Args:
+        query: 搜索词，如"600"、"贵州"、"gzmt"
+        limit: 最多返回的结果数
+
+    Returns:
+        list: [(代码, 名称), ...]
+    """
+    try:
+        return get_stock_index().search(query, limit)
+    except Exception as e:
+        log_data_operation("错误", f"搜索股票时出错: {str(e)}")
+        return []
+
 def get_stock_name(ticker):
     """
     根据股票代码获取股票名称
@@ -244,19 +295,32 @@ def get_stock_name(ticker):
         str: 股票名称，如获取失败则返回"未知股票"
     """
     try:
-        # 获取股票数据
-        stock_df = load_stock_names()
-
-        # 查找匹配的股票
-        stock_info = stock_df[stock_df['code'] == ticker]
-        if not stock_info.empty:
-            return stock_info['name'].values[0]
-
-        return "未知股票"
+        return get_stock_index().name_of(ticker, "未知股票")
     except Exception as e:
         log_data_operation("错误", f"获取股票名称时出错: {str(e)}")
         return "未知股票"
 
+def _rename_hist_columns(df):
+    """将东方财富历史行情的中文列名转换为英文列名"""
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    df = df.rename(columns={
+        '日期': 'date',
+        '开盘': 'open',
+        '收盘': 'close',
+        '最高': 'high',
+        '最低': 'low',
+        '成交量': 'volume',
+        '成交额': 'amount',
+        '振幅': 'amplitude',
+        '涨跌幅': 'pct_change',
+        '涨跌额': 'change_amount',
+        '换手率': 'turnover'
+    })
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
 @retry_on_exception(max_retries=3, initial_delay=2, backoff_factor=2)
 def get_historical_data(symbol, start_date=None, end_date=None, use_cache=True):
     """
@@ -266,7 +330,7 @@ def get_historical_data(symbol, start_date=None, end_date=None, use_cache=True):
         symbol: 股票代码
         start_date: 开始日期，格式为'YYYY-MM-DD'，如果为None则取一年前
         end_date: 结束日期，格式为'YYYY-MM-DD'，如果为None则取昨天
-        use_cache: 是否使用缓存
+        use_cache: 是否使用本地K线仓库
 
     Returns:
         DataFrame: 包含历史数据的DataFrame
@@ -283,90 +347,52 @@ def get_historical_data(symbol, start_date=None, end_date=None, use_cache=True):
             start_datetime = end_datetime - timedelta(days=365)
             start_date = start_datetime.strftime('%Y-%m-%d')
 
-        # 缓存文件路径
-        cache_file = os.path.join(HISTORICAL_DATA_CACHE_DIR, f"{symbol}_{start_date}_{end_date}.pkl")
-
-        # 如果使用缓存且缓存文件存在，直接加载
-        if use_cache and os.path.exists(cache_file):
-            # 验证缓存文件有效性
-            if not check_pickle_validity(cache_file):
-                log_data_operation("警告", f"历史数据缓存文件无效: {cache_file}，将重新获取数据")
-                if os.path.exists(cache_file):
-                    os.remove(cache_file)
-            else:
-                file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
-                current_time = datetime.now()
-
-                # 如果缓存文件不超过1天，直接使用
-                if (current_time - file_time) < timedelta(days=1):
-                    try:
-                        log_data_operation("历史数据", f"使用缓存的历史数据 ({symbol}, {start_date} 至 {end_date})")
-                        with open(cache_file, 'rb') as f:
-                            return pickle.load(f)
-                    except Exception as load_e:
-                        log_data_operation("错误", f"从缓存加载历史数据时出错: {str(load_e)}")
-                        # 删除可能损坏的缓存文件
-                        if os.path.exists(cache_file):
-                            os.remove(cache_file)
+        def fetch_range(fetch_start, fetch_end, adjust="qfq"):
+            """获取指定区间的K线，接口出错时返回None"""
+            try:
+                range_df = circuit_breakers.get("东方财富", "price_history").call(
+                    ak.stock_zh_a_hist,
+                    symbol=symbol,
+                    period="daily",
+                    start_date=fetch_start.strftime('%Y%m%d'),
+                    end_date=fetch_end.strftime('%Y%m%d'),
+                    adjust=adjust
+                )
+            except Exception as e:
+                log_data_operation("警告", f"获取 {symbol} 的历史数据出错: {str(e)}")
+                return None
+            return _rename_hist_columns(range_df)
 
         log_data_operation("历史数据", f"获取历史数据 ({symbol}, {start_date} 至 {end_date})")
 
-        # 判断股票代码前缀
-        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        format_symbol = f"{prefix}{symbol}"
-
-        # 转换日期格式为YYYYMMDD
-        format_start_date = start_date.replace('-', '')
-        format_end_date = end_date.replace('-', '')
-
-        # 获取历史数据
-        df = ak.stock_zh_a_hist(
-            symbol=symbol,
-            period="daily",
-            start_date=format_start_date,
-            end_date=format_end_date,
-            adjust="qfq"
-        )
+        if use_cache:
+            # 只请求列式仓库中缺失的日期区间
+            df = get_cached_price_bars(symbol, start_date, end_date, "qfq", fetch_range,
+                                       fetch_factors=fetch_adjustment_factors)
+        else:
+            df = fetch_range(datetime.strptime(start_date, '%Y-%m-%d'), datetime.strptime(end_date, '%Y-%m-%d'))
 
         # 检查数据有效性
         if df is None or df.empty:
             log_data_operation("警告", f"获取 {symbol} 的历史数据为空，尝试不限日期获取")
 
             # 尝试不限制日期获取
-            df = ak.stock_zh_a_hist(
+            df = _rename_hist_columns(circuit_breakers.get("东方财富", "price_history").call(
+                ak.stock_zh_a_hist,
                 symbol=symbol,
                 period="daily",
                 adjust="qfq"
-            )
+            ))
 
-        # 如果仍然没有数据，返回空DataFrame
-        if df is None or df.empty:
-            log_data_operation("错误", f"无法获取 {symbol} 的历史数据")
-            return pd.DataFrame()
-
-        # 处理列名
-        df = df.rename(columns={
-            '日期': 'date',
-            '开盘': 'open',
-            '收盘': 'close',
-            '最高': 'high',
-            '最低': 'low',
-            '成交量': 'volume',
-            '成交额': 'amount',
-            '振幅': 'amplitude',
-            '涨跌幅': 'pct_change',
-            '涨跌额': 'change',
-            '换手率': 'turnover'
-        })
-
-        # 保存到缓存
-        try:
-            with _cache_lock:
-                with open(cache_file, 'wb') as f:
-                    pickle.dump(df, f)
-            log_data_operation("历史数据", f"成功缓存历史数据 ({symbol})")
-        except Exception as cache_e:
-            log_data_operation("警告", f"缓存历史数据时出错: {str(cache_e)}")
+            # 如果仍然没有数据，返回空DataFrame
+            if df.empty:
+                log_data_operation("错误", f"无法获取 {symbol} 的历史数据")
+                return pd.DataFrame()
+
+            # 合并到列式仓库，当日K线尚未收盘，不计入已覆盖区间
+            covered_end = min(end_date, (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'))
+            if use_cache and bar_store.write(symbol, df, df['date'].min(), covered_end, adjust="qfq"):
+                log_data_operation("历史数据", f"成功缓存历史数据 ({symbol})")
 
         log_data_operation("历史数据", f"成功获取 {symbol} 的历史数据，共 {len(df)} 条记录")
         return df
@@ -387,14 +413,11 @@ def get_market_data(symbol):
         dict: 市场数据
     """
     # 检查缓存
-    cache_key = f"market_data_{symbol}"
-    current_time = datetime.now()
-
     # 如果缓存存在且未过期，直接返回缓存数据
-    if (cache_key in _market_data_cache and
-        _cache_expiry.get(cache_key, datetime.min) > current_time):
+    cached = cache_manager.get("market_data", symbol)
+    if cached is not None:
         log_data_operation("市场数据", f"使用缓存的市场数据 (symbol={symbol})")
-        return _market_data_cache[cache_key]
+        return cached
 
     start_time = time.time()
 
@@ -404,7 +427,8 @@ def get_market_data(symbol):
         log_data_operation("市场数据", f"直接获取 {symbol} 的市场数据...")
         # 判断股票代码前缀
         prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        realtime_data = ak.stock_zh_a_daily(symbol=f"{prefix}{symbol}", adjust="")
+        realtime_data = circuit_breakers.get("腾讯财经", "market_data").call(
+            ak.stock_zh_a_daily, symbol=f"{prefix}{symbol}", adjust="")
 
         if realtime_data is not None and not realtime_data.empty:
             # 获取最新一天的数据
@@ -435,9 +459,7 @@ def get_market_data(symbol):
             log_data_operation("市场数据", f"直接获取成功，耗时 {elapsed:.2f} 秒")
 
             # 更新缓存
-            _market_data_cache[cache_key] = result
-            # 缓存保留1小时
-            _cache_expiry[cache_key] = current_time + timedelta(hours=1)
+            cache_manager.set("market_data", symbol, result)
 
             return result
     except Exception as e:
@@ -446,17 +468,12 @@ def get_market_data(symbol):
     # 如果直接获取失败，尝试通过定义的数据源获取
     # 从东方财富获取数据
     def get_data_from_eastmoney():
-        try:
-            realtime_data = ak.stock_zh_a_spot_em()
-            if realtime_data is None or realtime_data.empty:
-                return None
-
-            stock_data = realtime_data[realtime_data['代码'] == symbol]
-            if stock_data.empty:
-                return None
-
-            stock_data = stock_data.iloc[0]
+        # 上游请求的异常直接抛出，由熔断器计为失败；只在整理数据时捕获异常
+        stock_data = spot_snapshot.get(symbol, raise_on_error=True)
+        if stock_data is None:
+            return None
 
+        try:
             # 构建结果
             result = {
                 "market_cap": float(stock_data.get("总市值", 0)),
@@ -476,11 +493,11 @@ def get_market_data(symbol):
 
     # 从新浪获取数据
     def get_data_from_sina():
-        try:
-            realtime_data = ak.stock_zh_a_spot()
-            if realtime_data is None or realtime_data.empty:
-                return None
+        realtime_data = ak.stock_zh_a_spot()
+        if realtime_data is None or realtime_data.empty:
+            return None
 
+        try:
             stock_data = realtime_data[realtime_data['代码'] == symbol]
             if stock_data.empty:
                 return None
@@ -510,31 +527,12 @@ def get_market_data(symbol):
         ("新浪财经", get_data_from_sina)
     ]
 
-    # 并行获取数据
-    result = None
-    error_messages = []
-
-    # 使用线程池并发执行请求
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        # 提交所有任务
-        future_to_source = {
-            executor.submit(lambda func: func(), get_data_func): source_name
-            for source_name, get_data_func in data_sources
-        }
-
-        # 获取最快返回的有效结果
-        for future in concurrent.futures.as_completed(future_to_source, timeout=5):
-            source_name = future_to_source[future]
-            try:
-                data = future.result(timeout=2)  # 单个结果超时设置为2秒
-                if data is not None:
-                    result = data
-                    log_data_operation("市场数据", f"成功从{source_name}获取市场数据")
-                    break  # 一旦获得一个有效结果就停止等待
-                else:
-                    error_messages.append(f"从{source_name}获取数据失败")
-            except Exception as e:
-                error_messages.append(f"从{source_name}获取数据出错: {str(e)}")
+    # 并行获取数据：各数据源竞速，取最快的有效结果并取消其余请求
+    ranked_sources = protect_sources("market_data", rank_sources("market_data", data_sources))
+    source_name, result, error_messages = race_sources(
+        ranked_sources, deadline=5, hedge_delay=source_ranker.hedge_delay("market_data", ranked_sources))
+    if result is not None:
+        log_data_operation("市场数据", f"成功从{source_name}获取市场数据")
 
     # 如果所有数据源都失败，检查缓存
     if result is None:
@@ -543,9 +541,10 @@ def get_market_data(symbol):
         error_messages.append(error_message)
 
         # 如果有缓存但已过期，在出错时仍然返回过期的缓存数据，但标记为过期
-        if cache_key in _market_data_cache:
+        cached_data = cache_manager.get("market_data", symbol, allow_expired=True)
+        if cached_data is not None:
             log_data_operation("市场数据", f"使用过期的缓存数据 (symbol={symbol})")
-            cached_data = _market_data_cache[cache_key].copy()
+            cached_data = cached_data.copy()
             cached_data["is_expired_cache"] = True
             cached_data["error_messages"] = error_messages
             return cached_data
@@ -557,9 +556,13 @@ def get_market_data(symbol):
     if "market_cap" in result and result["market_cap"] <= 0:
         log_data_operation("警告", f"股票 {symbol} 的市值数据无效或缺失")
         # 尝试从其他数据源补充市值数据
-        for source_name, get_data_func in data_sources:
+        for source_name, get_data_func in ranked_sources:
             if source_name != result["data_source"]:
-                supplementary_data = get_data_func()
+                try:
+                    supplementary_data = get_data_func()
+                except Exception as e:
+                    log_data_operation("警告", f"从{source_name}补充市值数据失败: {e}")
+                    continue
                 if supplementary_data is not None and supplementary_data.get("market_cap", 0) > 0:
                     result["market_cap"] = supplementary_data["market_cap"]
                     log_data_operation("市场数据", f"使用{source_name}的市值数据进行补充")
@@ -570,9 +573,7 @@ def get_market_data(symbol):
         result["volume"] = 0
 
     # 更新缓存
-    _market_data_cache[cache_key] = result
-    # 缓存保留较短时间（当日行情数据变化快）
-    _cache_expiry[cache_key] = current_time + timedelta(minutes=30)
+    cache_manager.set("market_data", symbol, result)
 
     log_data_operation("市场数据", f"成功获取 {symbol} 的市场数据，总耗时 {time.time() - start_time:.2f} 秒")
     return result
@@ -591,20 +592,15 @@ def get_market_data_batch(symbols, max_workers=5):
     """
     results = {}
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        future_to_symbol = {executor.submit(get_market_data, symbol): symbol for symbol in symbols}
-
-        # 获取结果
-        for future in concurrent.futures.as_completed(future_to_symbol):
-            symbol = future_to_symbol[future]
-            try:
-                data = future.result()
-                results[symbol] = data
-            except Exception as e:
-                log_data_operation("错误", f"获取 {symbol} 的市场数据失败: {str(e)}")
-                # 添加错误信息
-                results[symbol] = {"error": str(e), "is_error": True}
+    # 滑动窗口提交，本批次最多占用共享线程池中的 max_workers 个线程
+    for symbol, future in submit_windowed(get_executor("fanout"), get_market_data, symbols, max_workers):
+        try:
+            data = future.result()
+            results[symbol] = data
+        except Exception as e:
+            log_data_operation("错误", f"获取 {symbol} 的市场数据失败: {str(e)}")
+            # 添加错误信息
+            results[symbol] = {"error": str(e), "is_error": True}
 
     return results
 
@@ -12,6 +12,7 @@ os.makedirs(CACHE_DIR, exist_ok=True)
 STOCK_NAMES_CACHE_FILE = os.path.join(CACHE_DIR, "stock_names_cache.pkl")
 HISTORICAL_DATA_CACHE_DIR = os.path.join(CACHE_DIR, "historical_data")
 os.makedirs(HISTORICAL_DATA_CACHE_DIR, exist_ok=True)
+BAR_STORE_DIR = os.path.join(CACHE_DIR, "bar_store")
 
 def check_pickle_validity(cache_file):
     """
@@ -81,6 +82,12 @@ def reset_cache():
             if os.path.isfile(file_path):
                 os.remove(file_path)
 
+        # 备份并清空列式K线仓库
+        if os.path.exists(BAR_STORE_DIR):
+            shutil.copytree(BAR_STORE_DIR, os.path.join(backup_dir, "bar_store"))
+            shutil.rmtree(BAR_STORE_DIR, ignore_errors=True)
+            os.makedirs(BAR_STORE_DIR, exist_ok=True)
+
         print(f"已重置所有缓存文件，原始文件已备份到 {backup_dir}")
         return True
     except Exception as e:
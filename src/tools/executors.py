@@ -0,0 +1,206 @@
+"""
+进程内共享的线程池注册表
+
+按用途划分为几个有界线程池，避免每次调用都创建、销毁线程池，
+同时限制同时处理大量股票时的总并发数：
+- io: 单次数据源请求（akshare、HTTP）
+- fanout: 按股票展开的批量任务，内部会等待 io 池中的请求
+- llm: 大模型调用
+
+同一线程池中的任务不要阻塞等待提交到同一线程池的任务，否则线程池占满时会互相等待。
+批量任务用 submit_windowed 限制同时提交的任务数，不要一次提交全部任务再在任务内部用信号量排队，
+否则排队的任务占着线程，其他使用同一线程池的调用方会被饿死。
+线程数可以通过环境变量 EXECUTOR_<NAME>_WORKERS 配置，例如 EXECUTOR_IO_WORKERS=32。
+提交任务时会复制当前的 contextvars 上下文，任务中可以读取提交方的请求上下文（截止时间、重试预算）。
+"""
+
+import os
+import atexit
+import threading
+import contextvars
+import concurrent.futures
+
+# 默认线程数
+DEFAULT_POOL_SIZES = {
+    "io": 16,
+    "fanout": 8,
+    "llm": 4,
+}
+
+
+class TrackedExecutor(concurrent.futures.ThreadPoolExecutor):
+    """记录排队和执行中任务数的线程池，任务在提交方的上下文中执行"""
+
+    def __init__(self, name, max_workers):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self.name = name
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, fn, *args, **kwargs):
+        context = contextvars.copy_context()
+
+        def run():
+            with self._stats_lock:
+                self.started += 1
+            try:
+                return context.run(fn, *args, **kwargs)
+            except BaseException:
+                with self._stats_lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._stats_lock:
+                    self.completed += 1
+
+        future = super().submit(run)
+        with self._stats_lock:
+            self.submitted += 1
+        return future
+
+    def stats(self):
+        """返回线程池统计信息"""
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": max(self.submitted - self.started, 0),
+                "running": self.started - self.completed,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+class ExecutorRegistry:
+    """按名称管理共享线程池"""
+
+    def __init__(self, sizes=None):
+        """
+        初始化注册表
+
+        Args:
+            sizes: 各线程池的默认线程数，未指定时使用 DEFAULT_POOL_SIZES
+        """
+        self._sizes = dict(DEFAULT_POOL_SIZES)
+        self._sizes.update(sizes or {})
+        self._executors = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _size_of(self, name):
+        env_value = os.getenv(f"EXECUTOR_{name.upper()}_WORKERS")
+        if env_value:
+            try:
+                return max(1, int(env_value))
+            except ValueError:
+                print(f"[线程池] 环境变量 EXECUTOR_{name.upper()}_WORKERS 的值无效: {env_value}")
+        return self._sizes.get(name, DEFAULT_POOL_SIZES["io"])
+
+    def get(self, name):
+        """
+        获取指定名称的线程池，首次使用时创建
+
+        Args:
+            name: 线程池名称，如 "io"、"fanout"、"llm"
+
+        Returns:
+            TrackedExecutor: 线程池
+        """
+        executor = self._executors.get(name)
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("线程池注册表已关闭")
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = TrackedExecutor(name, self._size_of(name))
+                self._executors[name] = executor
+            return executor
+
+    def configure(self, name, max_workers):
+        """
+        设置线程池大小，已创建的线程池会在现有任务完成后被替换
+
+        Args:
+            name: 线程池名称
+            max_workers: 线程数
+        """
+        with self._lock:
+            self._sizes[name] = max(1, int(max_workers))
+            old = self._executors.pop(name, None)
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def stats(self):
+        """返回所有已创建线程池的统计信息"""
+        with self._lock:
+            executors = dict(self._executors)
+        return {name: executor.stats() for name, executor in executors.items()}
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        关闭所有线程池
+
+        Args:
+            wait: 是否等待执行中的任务完成
+            cancel_futures: 是否取消尚未开始的任务
+        """
+        with self._lock:
+            self._closed = True
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+# 全局线程池注册表
+executors = ExecutorRegistry()
+
+
+def get_executor(name):
+    """获取全局注册表中的线程池"""
+    return executors.get(name)
+
+
+def submit_windowed(executor, fn, items, max_in_flight):
+    """
+    按滑动窗口提交批量任务：同时提交的任务不超过 max_in_flight 个，完成一个再提交下一个
+
+    Args:
+        executor: 线程池
+        fn: 任务函数 fn(item)
+        items: 任务参数
+        max_in_flight: 同时提交的任务数上限
+
+    Yields:
+        (item, future)：按完成顺序返回
+    """
+    items = iter(items)
+    pending = {}
+
+    def submit_next():
+        for item in items:
+            pending[executor.submit(fn, item)] = item
+            return True
+        return False
+
+    for _ in range(max(1, int(max_in_flight))):
+        if not submit_next():
+            break
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            submit_next()
+            yield item, future
+
+
+# 进程退出时取消排队任务，等待执行中的任务结束
+atexit.register(executors.shutdown, wait=True, cancel_futures=True)
@@ -10,37 +10,33 @@ from src.tools.api import (
     ak
 )
 from src.tools.data_protocol import PriceDataProtocol
+from src.tools.interval_cache import get_cached_price_bars, standardize_bars
+from src.tools.adjust_factors import fetch_adjustment_factors
+from src.tools.source_ranking import rank_sources
+from src.tools.circuit_breaker import CircuitOpenError, protect_sources
+from src.tools.spot_snapshot import spot_snapshot
+from src.tools.cache_manager import cache_manager, make_key
 
-# 设置全局缓存
-_price_history_cache = {}
-_price_cache_expiry = {}
-_market_data_cache = {}
-_market_cache_expiry = {}
+# 缓存由 cache_manager 统一管理：市场数据与 api、data_provider 共用 market_data 命名空间，
+# 原始K线共用 price_bars 命名空间，带指标的K线使用 fast_price_history 命名空间
 
-# 缓存过期时间（按数据类型区分）
-CACHE_EXPIRY = {
-    'market_data': timedelta(minutes=5),  # 当日行情数据5分钟过期
-    'price_history': timedelta(hours=6),  # 历史价格数据6小时过期
-}
-
-# 创建并行数据获取器实例
+# 创建并行数据获取器实例（共享 io 线程池，不在每次调用时创建）
 fetcher = ParallelDataFetcher(timeout=15, max_workers=3)
+# 超短超时的获取器，用于市场数据的快速尝试
+ultra_quick_fetcher = ParallelDataFetcher(timeout=2, max_workers=3)
+# 短超时的获取器，用于历史数据缺失区间
+quick_fetcher = ParallelDataFetcher(timeout=3, max_workers=3)
 
 
 # 定义数据获取函数
 def get_data_from_eastmoney(symbol: str) -> Dict[str, Any]:
     """从东方财富获取市场数据"""
-    try:
-        realtime_data = ak.stock_zh_a_spot_em()
-        if realtime_data is None or realtime_data.empty:
-            return None
-
-        stock_data = realtime_data[realtime_data['代码'] == symbol]
-        if stock_data.empty:
-            return None
-
-        stock_data = stock_data.iloc[0]
+    # 上游请求的异常直接抛出，由熔断器计为失败；只在整理数据时捕获异常
+    stock_data = spot_snapshot.get(symbol, raise_on_error=True)
+    if stock_data is None:
+        return None
 
+    try:
         # 构建结果
         result = {
             "market_cap": float(stock_data.get("总市值", 0)),
@@ -60,11 +56,11 @@ def get_data_from_eastmoney(symbol: str) -> Dict[str, Any]:
 
 def get_data_from_sina(symbol: str) -> Dict[str, Any]:
     """从新浪财经获取市场数据"""
-    try:
-        realtime_data = ak.stock_zh_a_spot()
-        if realtime_data is None or realtime_data.empty:
-            return None
+    realtime_data = ak.stock_zh_a_spot()
+    if realtime_data is None or realtime_data.empty:
+        return None
 
+    try:
         stock_data = realtime_data[realtime_data['代码'] == symbol]
         if stock_data.empty:
             return None
@@ -90,14 +86,14 @@ def get_data_from_sina(symbol: str) -> Dict[str, Any]:
 
 def get_data_from_tencent(symbol: str) -> Dict[str, Any]:
     """从腾讯财经获取市场数据"""
-    try:
-        # 判断股票代码前缀
-        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        realtime_data = ak.stock_zh_a_daily(symbol=f"{prefix}{symbol}", adjust="")
+    # 判断股票代码前缀
+    prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+    realtime_data = ak.stock_zh_a_daily(symbol=f"{prefix}{symbol}", adjust="")
 
-        if realtime_data is None or realtime_data.empty:
-            return None
+    if realtime_data is None or realtime_data.empty:
+        return None
 
+    try:
         # 获取最新一天的数据
         latest_data = realtime_data.iloc[-1]
 
@@ -128,20 +124,20 @@ def get_data_from_tencent(symbol: str) -> Dict[str, Any]:
         return None
 
 
-def get_data_from_akshare(symbol: str, start_date, end_date) -> pd.DataFrame:
+def get_data_from_akshare(symbol: str, start_date, end_date, adjust: str = "qfq") -> Optional[pd.DataFrame]:
     """从akshare获取历史价格数据"""
-    try:
-        df = ak.stock_zh_a_hist(
-            symbol=symbol,
-            period="daily",
-            start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
-            end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
-            adjust="qfq"
-        )
-
-        if df is None or df.empty:
-            return pd.DataFrame()
+    df = ak.stock_zh_a_hist(
+        symbol=symbol,
+        period="daily",
+        start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
+        end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
 
+    try:
         # 重命名列以匹配技术分析代理的需求
         df = df.rename(columns={
             "日期": "date",
@@ -157,69 +153,55 @@ def get_data_from_akshare(symbol: str, start_date, end_date) -> pd.DataFrame:
             "换手率": "turnover"
         })
 
-        # 确保日期列为datetime类型
-        df["date"] = pd.to_datetime(df["date"])
-        return df
+        return standardize_bars(df)
     except Exception as e:
         print(f"从akshare获取数据时出错: {e}")
-        return pd.DataFrame()
+        return None
 
 
-def get_data_from_netease(symbol: str, start_date, end_date) -> pd.DataFrame:
+def get_data_from_netease(symbol: str, start_date, end_date, adjust: str = "qfq") -> Optional[pd.DataFrame]:
     """从网易财经获取历史价格数据"""
+    # 使用可替代的API，原先的stock_zh_a_hist_163在akshare中不存在
+    # 使用腾讯的API作为替代
+    prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+    df = ak.stock_zh_a_daily(
+        symbol=f"{prefix}{symbol}",
+        start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
+        end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
+
     try:
-        # 使用可替代的API，原先的stock_zh_a_hist_163在akshare中不存在
-        # 使用腾讯的API作为替代
-        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        df = ak.stock_zh_a_daily(
-            symbol=f"{prefix}{symbol}",
-            start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
-            end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
-            adjust="qfq"
-        )
-
-        if df is None or df.empty:
-            return pd.DataFrame()
-
-        # 确保日期列为datetime类型
-        df["date"] = pd.to_datetime(df["date"])
-        return df
+        # 新浪接口的成交量单位为股，换手率为比例
+        return standardize_bars(df, volume_in_shares=True, turnover_as_ratio=True)
     except Exception as e:
         print(f"从网易财经(替代API)获取数据时出错: {str(e)}")
-        return pd.DataFrame()
+        return None
 
 
-def get_data_from_sina_hist(symbol: str, start_date, end_date) -> pd.DataFrame:
+def get_data_from_sina_hist(symbol: str, start_date, end_date, adjust: str = "qfq") -> Optional[pd.DataFrame]:
     """从新浪财经获取历史价格数据"""
-    try:
-        # 判断股票代码前缀
-        prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
-        df = ak.stock_zh_a_daily(
-            symbol=f"{prefix}{symbol}",
-            start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
-            end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
-            adjust="qfq"
-        )
-
-        if df is None or df.empty:
-            return pd.DataFrame()
-
-        # 重命名列以匹配技术分析代理的需求
-        df = df.rename(columns={
-            "date": "date",
-            "open": "open",
-            "high": "high",
-            "low": "low",
-            "close": "close",
-            "volume": "volume"
-        })
+    # 判断股票代码前缀
+    prefix = "sh" if symbol.startswith(("6", "9")) else "sz"
+    df = ak.stock_zh_a_daily(
+        symbol=f"{prefix}{symbol}",
+        start_date=start_date.strftime("%Y%m%d") if isinstance(start_date, datetime) else start_date,
+        end_date=end_date.strftime("%Y%m%d") if isinstance(end_date, datetime) else end_date,
+        adjust=adjust
+    )
+
+    if df is None or df.empty:
+        return pd.DataFrame()
 
-        # 确保日期列为datetime类型
-        df["date"] = pd.to_datetime(df["date"])
-        return df
+    try:
+        # 新浪接口的成交量单位为股，换手率为比例
+        return standardize_bars(df, volume_in_shares=True, turnover_as_ratio=True)
     except Exception as e:
         print(f"从新浪财经获取数据时出错: {e}")
-        return pd.DataFrame()
+        return None
 
 
 def get_market_data_fast(symbol: str) -> Dict[str, Any]:
@@ -233,14 +215,11 @@ def get_market_data_fast(symbol: str) -> Dict[str, Any]:
         市场数据字典
     """
     # 检查缓存
-    cache_key = f"market_data_{symbol}"
-    current_time = datetime.now()
-
     # 如果缓存存在且未过期，直接返回缓存数据
-    if (cache_key in _market_data_cache and
-        _market_cache_expiry.get(cache_key, datetime.min) > current_time):
+    cached = cache_manager.get("market_data", symbol)
+    if cached is not None:
         print(f"使用缓存的市场数据 (symbol={symbol})")
-        return _market_data_cache[cache_key]
+        return cached
 
     # 先尝试最快的单个数据源
     start_time = time.time()
@@ -250,8 +229,7 @@ def get_market_data_fast(symbol: str) -> Dict[str, Any]:
         if result is not None:
             elapsed = time.time() - start_time
             print(f"直接获取成功，耗时 {elapsed:.2f} 秒")
-            _market_data_cache[cache_key] = result
-            _market_cache_expiry[cache_key] = current_time + CACHE_EXPIRY['market_data']
+            cache_manager.set("market_data", symbol, result)
             return result
     except Exception as e:
         print(f"直接获取失败: {e}，尝试并行获取...")
@@ -265,16 +243,13 @@ def get_market_data_fast(symbol: str) -> Dict[str, Any]:
     ]
 
     # 使用超短超时的并行获取器
-    ultra_quick_fetcher = ParallelDataFetcher(timeout=2, max_workers=3)
-
     # 并行获取数据，先尝试快速获取
     print(f"并行获取 {symbol} 的市场数据...")
     result = ultra_quick_fetcher.fetch_market_data(symbol, data_sources)
 
     # 如果获取成功，更新缓存
     if result is not None:
-        _market_data_cache[cache_key] = result
-        _market_cache_expiry[cache_key] = current_time + CACHE_EXPIRY['market_data']
+        cache_manager.set("market_data", symbol, result)
         print(f"市场数据获取成功，耗时 {time.time() - start_time:.2f} 秒")
         return result
 
@@ -283,16 +258,16 @@ def get_market_data_fast(symbol: str) -> Dict[str, Any]:
         print(f"快速获取失败，使用标准超时重试...")
         result = fetcher.fetch_market_data(symbol, data_sources)
         if result is not None:
-            _market_data_cache[cache_key] = result
-            _market_cache_expiry[cache_key] = current_time + CACHE_EXPIRY['market_data']
+            cache_manager.set("market_data", symbol, result)
             print(f"标准超时重试成功，耗时 {time.time() - start_time:.2f} 秒")
             return result
 
     # 如果当前获取失败，但有过期缓存数据，则使用过期缓存
-    if cache_key in _market_data_cache:
+    cached_data = cache_manager.get("market_data", symbol, allow_expired=True)
+    if cached_data is not None:
         print(f"所有数据源获取失败，使用过期的缓存数据 (symbol={symbol})")
         # 标记为使用过期数据
-        cached_data = _market_data_cache[cache_key].copy()
+        cached_data = cached_data.copy()
         cached_data["is_expired_cache"] = True
         return cached_data
 
@@ -344,72 +319,67 @@ def get_price_history_fast(
         start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
 
     # 构建缓存键
-    cache_key = f"price_history_{symbol}_{start_date}_{end_date}_{adjust}"
+    cache_key = make_key(symbol, start_date, end_date, adjust)
 
     # 检查缓存
-    if (cache_key in _price_history_cache and
-        _price_cache_expiry.get(cache_key, datetime.min) > current_date):
+    df = cache_manager.get("fast_price_history", cache_key)
+    if df is not None:
         print(f"使用缓存的历史价格数据 (symbol={symbol})")
-        df = _price_history_cache[cache_key]
 
         # 如果需要计算技术指标且缓存数据没有指标
         if compute_indicators and 'momentum_1m' not in df.columns:
             print("缓存数据中没有技术指标，计算技术指标...")
             compute_technical_indicators(df)
-            # 更新缓存
-            _price_history_cache[cache_key] = df
+            # 更新缓存（增加了指标列，重新计算占用的内存）
+            cache_manager.memory("fast_price_history").set(
+                cache_key, df, expires_at=cache_manager.expires_at("fast_price_history", cache_key))
 
         return df
 
-    # 最简单的方式：直接尝试新浪的API (通常最稳定)
     start_time = time.time()
-    try:
-        # 先尝试直接使用新浪API，这通常是最快的方式
-        print(f"直接获取 {symbol} 的历史价格数据...")
-        df = get_data_from_sina_hist(symbol, start_date, end_date)
-        if df is not None and not df.empty and len(df) >= 5:
-            print(f"直接获取成功，共 {len(df)} 条记录，耗时 {time.time() - start_time:.2f} 秒")
-            df = PriceDataProtocol.standardize(df)
-
-            # 计算技术指标
-            if compute_indicators:
-                print("计算技术指标...")
-                compute_technical_indicators(df)
-
-            # 更新缓存
-            _price_history_cache[cache_key] = df
-            _price_cache_expiry[cache_key] = current_date + CACHE_EXPIRY['price_history']
 
-            return df
-    except Exception as e:
-        print(f"直接获取失败: {str(e)}，尝试并行获取...")
-
-    # 如果直接获取失败，尝试并行获取
-    print(f"使用并行方式获取历史价格数据...")
-
-    # 创建更简单的包装函数
-    def wrapped_getter(func):
-        def wrapper(symbol, start_date, end_date, adjust):
-            try:
-                return func(symbol, start_date, end_date)
-            except Exception as e:
-                print(f"获取数据出错: {str(e)}")
-                return pd.DataFrame()
-        return wrapper
-
-    # 定义数据源列表（根据成功率排序）
+    # 定义数据源列表（实际尝试顺序由数据源排序器根据历史耗时和成功率决定）
+    # 数据源的异常不在这里捕获，由熔断器计为失败
     data_sources = [
-        ("新浪财经", wrapped_getter(get_data_from_sina_hist)),
-        ("网易财经", wrapped_getter(get_data_from_netease)),
-        ("东方财富", wrapped_getter(get_data_from_akshare))
+        ("新浪财经", get_data_from_sina_hist),
+        ("网易财经", get_data_from_netease),
+        ("东方财富", get_data_from_akshare)
     ]
 
-    # 使用超快速的并行获取器（超时时间短）
-    quick_fetcher = ParallelDataFetcher(timeout=3, max_workers=3)
-    df = quick_fetcher.fetch_price_history(symbol, start_date, end_date, data_sources, adjust)
+    def fetch_range(fetch_start, fetch_end, adjust):
+        """获取本地K线仓库缺失的区间，所有数据源都失败时返回None"""
+        # 先直接尝试当前排名最高的数据源，这通常是最快的方式
+        source_name, get_data_func = protect_sources(
+            "price_history", rank_sources("price_history", data_sources, is_valid=lambda df: df is not None)[:1])[0]
+        try:
+            range_df = get_data_func(symbol, fetch_start, fetch_end, adjust)
+        except CircuitOpenError as e:
+            print(str(e))
+            range_df = None
+        except Exception as e:
+            print(f"从{source_name}获取数据出错: {str(e)}")
+            range_df = None
+        if range_df is not None:
+            return range_df
+
+        # 如果直接获取失败，尝试并行获取（缺失区间可能只有一两根K线，不限制记录数）
+        print(f"直接获取失败，使用并行方式获取历史价格数据...")
+        other_sources = [source for source in data_sources if source[0] != source_name]
+        range_df = quick_fetcher.fetch_price_history(
+            symbol, fetch_start, fetch_end, other_sources, adjust, min_rows=1)
+        return range_df if not range_df.empty else None
+
+    # 只请求本地K线仓库中缺失的日期区间
+    try:
+        print(f"获取 {symbol} 的历史价格数据...")
+        df = get_cached_price_bars(symbol, start_date_obj, end_date_obj, adjust, fetch_range,
+                                   fetch_factors=fetch_adjustment_factors)
+    except Exception as e:
+        print(f"获取历史价格数据失败: {str(e)}")
+        df = pd.DataFrame()
 
     # 验证获取到的数据
-    if df is not None and not df.empty:
+    if df is not None and len(df) >= 5:
         # 使用数据协议进行标准化
         try:
             df = PriceDataProtocol.standardize(df)
@@ -420,18 +390,18 @@ def get_price_history_fast(
                 compute_technical_indicators(df)
 
             # 更新缓存
-            _price_history_cache[cache_key] = df
-            _price_cache_expiry[cache_key] = current_date + CACHE_EXPIRY['price_history']
+            cache_manager.set("fast_price_history", cache_key, df)
 
-            print(f"历史价格数据获取和处理成功，总耗时 {time.time() - start_time:.2f} 秒")
+            print(f"历史价格数据获取和处理成功，共 {len(df)} 条记录，总耗时 {time.time() - start_time:.2f} 秒")
             return df
         except Exception as e:
             print(f"数据标准化或处理失败: {str(e)}")
 
     # 如果获取失败，但有过期缓存
-    if cache_key in _price_history_cache:
+    stale = cache_manager.get("fast_price_history", cache_key, allow_expired=True)
+    if stale is not None:
         print(f"所有数据源获取失败，使用过期的缓存数据 (symbol={symbol})")
-        return _price_history_cache[cache_key]
+        return stale
 
     # 所有方法都失败，返回空DataFrame
     print(f"无法获取历史价格数据 (symbol={symbol})")
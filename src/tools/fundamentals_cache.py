@@ -0,0 +1,281 @@
+"""
+财务数据的磁盘缓存
+
+财务指标和财务报表每个季度才更新一次，但 Streamlit 界面每次分析都会启动新的 src/main.py 进程，
+进程内的字典缓存总是空的。这里把结果保存到缓存目录下的 SQLite 数据库中：
+- 每条记录按 (类型, 股票代码) 保存，带有获取时间、过期时间和数据所属的报告期
+- 过期时间按定期报告的披露日历计算：下一个报告期结束之前不可能出现更新的报告，
+  记录一直有效；进入披露窗口后才按固定间隔重新验证；公司超过法定截止日仍未披露时降低验证频率
+- 使用 WAL 模式，多个进程可以同时读写；写入冲突时等待而不是报错
+- 数据源全部失败时，调用方可以取回已过期的记录作为兜底
+
+记录的值用 pickle 序列化，可以保存字典、列表或 DataFrame。
+cache_manager.py 用它作为分层缓存的本地磁盘层，类型即命名空间（财务数据、市场数据等）。
+"""
+
+import os
+import time
+from datetime import date, datetime, timedelta
+import pickle
+import sqlite3
+import threading
+
+# 定义缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+FUNDAMENTALS_DB = os.path.join(CACHE_DIR, "fundamentals.sqlite")
+
+# 等待其他进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT = 30
+# 公司超过法定截止日仍未披露新报告时，重新验证的间隔（秒）
+LATE_REPORT_RECHECK = 7 * 24 * 3600
+
+# 定期报告的报告期末（月, 日）和法定披露截止日（月, 日, 年份偏移）
+REPORT_PERIODS = (
+    ((3, 31), (4, 30, 0)),    # 一季报：4月30日前
+    ((6, 30), (8, 31, 0)),    # 半年报：8月31日前
+    ((9, 30), (10, 31, 0)),   # 三季报：10月31日前
+    ((12, 31), (4, 30, 1)),   # 年报：次年4月30日前
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    value BLOB NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    period TEXT,
+    PRIMARY KEY (kind, symbol)
+)
+"""
+
+
+def parse_period(value):
+    """把报告期（如 "2024-09-30"、"20240930" 或日期对象）转换为 date，无法识别时返回None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()[:10].replace("-", "").replace("/", "")
+    try:
+        return datetime.strptime(text[:8], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def next_report_period(period):
+    """下一个报告期的期末日期"""
+    period = parse_period(period)
+    index = (period.month - 1) // 3
+    quarter_end = date(period.year, *REPORT_PERIODS[index][0])
+    if period < quarter_end:
+        # 不是标准的报告期末时，下一期为所在季度的期末
+        return quarter_end
+    if index == len(REPORT_PERIODS) - 1:
+        return date(period.year + 1, *REPORT_PERIODS[0][0])
+    return date(period.year, *REPORT_PERIODS[index + 1][0])
+
+
+def disclosure_deadline(period):
+    """报告期的法定披露截止日"""
+    period = parse_period(period)
+    for (month, day), (deadline_month, deadline_day, year_offset) in REPORT_PERIODS:
+        if (period.month, period.day) == (month, day):
+            return date(period.year + year_offset, deadline_month, deadline_day)
+    return None
+
+
+def report_expiry(period, ttl, now=None):
+    """
+    按披露日历计算缓存的过期时间
+
+    Args:
+        period: 缓存数据所属的最新报告期
+        ttl: 披露窗口内重新验证的间隔（秒）
+        now: 当前时间戳，默认为现在
+
+    Returns:
+        float: 过期时间戳
+    """
+    now = time.time() if now is None else now
+    period = parse_period(period)
+    if period is None:
+        return now + ttl
+
+    # 下一个报告期结束之前不会有更新的报告
+    upcoming = next_report_period(period)
+    window_opens = datetime.combine(upcoming + timedelta(days=1), datetime.min.time()).timestamp()
+    if now < window_opens:
+        return window_opens
+
+    # 已超过下一期的截止日仍未披露：公司延期披露或停牌，降低验证频率
+    late_after = datetime.combine(disclosure_deadline(upcoming) + timedelta(days=1), datetime.min.time()).timestamp()
+    if now >= late_after:
+        return now + LATE_REPORT_RECHECK
+
+    # 披露窗口内，按固定间隔重新验证
+    return now + ttl
+
+
+class FundamentalsCache:
+    """可跨进程共享的财务数据缓存"""
+
+    def __init__(self, path=FUNDAMENTALS_DB):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite 数据库文件路径，为None时不使用磁盘缓存
+        """
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.writes = 0
+
+    def _connect(self):
+        """返回当前线程的数据库连接，路径变化时重新连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.path == self.path:
+            return conn
+        if conn is not None:
+            conn.close()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        if "period" not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN period TEXT")
+        self._local.conn, self._local.path = conn, self.path
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, kind, symbol, allow_expired=False):
+        """
+        读取缓存
+
+        Args:
+            kind: 数据类型，如 "financial_metrics"
+            symbol: 股票代码
+            allow_expired: 是否返回已过期的记录
+
+        Returns:
+            tuple: (值, 过期时间戳)，没有可用记录时返回None
+        """
+        if not self.path:
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM entries WHERE kind = ? AND symbol = ?", (kind, symbol)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[财务缓存] 读取 {kind}/{symbol} 失败: {e}")
+            return None
+
+        if row is None:
+            self._count("misses")
+            return None
+        expired = row[1] <= time.time()
+        if expired and not allow_expired:
+            self._count("misses")
+            return None
+
+        try:
+            value = pickle.loads(row[0])
+        except Exception as e:
+            print(f"[财务缓存] {kind}/{symbol} 的记录已损坏: {e}")
+            self.delete(kind, symbol)
+            return None
+        self._count("stale_hits" if expired else "hits")
+        return value, row[1]
+
+    def put(self, kind, symbol, value, ttl, period=None):
+        """
+        写入缓存
+
+        Args:
+            kind: 数据类型
+            symbol: 股票代码
+            value: 要缓存的值
+            ttl: 没有报告期或处于披露窗口内时的有效期（秒）
+            period: 数据所属的最新报告期，用于按披露日历计算过期时间
+
+        Returns:
+            float: 过期时间戳
+        """
+        now = time.time()
+        expires_at = report_expiry(period, ttl, now)
+        if not self.path:
+            return expires_at
+        period = parse_period(period)
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (kind, symbol, value, fetched_at, expires_at, period) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, symbol, sqlite3.Binary(pickle.dumps(value)), now, expires_at,
+                 period.isoformat() if period else None),
+            )
+            self._count("writes")
+        except sqlite3.Error as e:
+            print(f"[财务缓存] 写入 {kind}/{symbol} 失败: {e}")
+        return expires_at
+
+    def delete(self, kind, symbol=None):
+        """删除某类数据中一只股票或全部股票的记录"""
+        if not self.path:
+            return
+        try:
+            if symbol is None:
+                self._connect().execute("DELETE FROM entries WHERE kind = ?", (kind,))
+            else:
+                self._connect().execute("DELETE FROM entries WHERE kind = ? AND symbol = ?", (kind, symbol))
+        except sqlite3.Error as e:
+            print(f"[财务缓存] 删除 {kind}/{symbol} 失败: {e}")
+
+    def usage(self):
+        """
+        返回每条记录占用的磁盘空间
+
+        Returns:
+            list: [(类型, 股票代码, 字节数), ...]
+        """
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            return self._connect().execute("SELECT kind, symbol, length(value) FROM entries").fetchall()
+        except sqlite3.Error as e:
+            print(f"[财务缓存] 读取占用空间失败: {e}")
+            return []
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            stats = {
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "writes": self.writes,
+            }
+        if self.path:
+            try:
+                stats["entries"] = self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return stats
+
+
+# 全局财务数据缓存
+fundamentals_cache = FundamentalsCache()
@@ -0,0 +1,201 @@
+"""
+共享的 HTTP 连接池
+
+所有 akshare 请求和新闻抓取共用一个 requests.Session：
+- 按主机复用 keep-alive 连接，省去每次请求的 TCP/TLS 握手（requests 默认启用 gzip 压缩）
+- 每个主机的连接数有上限，超过时排队等待空闲连接
+- 默认超时时间来自配置，且不超过当前请求上下文的剩余时间
+- 请求发出前按主机获取限流令牌（见 rate_limiter.py）
+
+akshare 的各个模块通过 `import requests` 后调用 `requests.get/post`，
+install_akshare_session() 只替换这些模块中的 requests 引用，不修改全局的 requests 函数。
+自行创建 `requests.Session()` 的 akshare 代码（如 akshare.utils.request.request_with_retry）
+得到的是 LimitedSession，连接由它自己管理，但同样按主机限流并使用默认超时。
+连接池大小可以通过环境变量 HTTP_POOL_CONNECTIONS（缓存的主机数）和
+HTTP_POOL_MAXSIZE（每个主机的连接数）配置。
+"""
+
+import os
+import sys
+import atexit
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.tools.request_context import check_deadline, clamp_timeout
+from src.tools.rate_limiter import rate_limiter
+
+# 默认超时时间（秒）
+DEFAULT_TIMEOUT = 30
+# 缓存连接池的主机数
+DEFAULT_POOL_CONNECTIONS = 32
+# 每个主机的最大连接数
+DEFAULT_POOL_MAXSIZE = 8
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value:
+        try:
+            return max(1, int(value))
+        except ValueError:
+            print(f"[HTTP连接池] 环境变量 {name} 的值无效: {value}")
+    return default
+
+
+def _request_timeout(requested, default):
+    """
+    计算单次HTTP请求的超时时间：未指定时使用默认值，且不超过当前请求上下文的剩余时间
+
+    Args:
+        requested: 调用方指定的超时时间，可以是 (连接超时, 读取超时) 元组
+        default: 默认超时时间（秒）
+    """
+    check_deadline("HTTP请求")
+    if requested is None:
+        requested = default
+    if isinstance(requested, tuple):
+        return tuple(clamp_timeout(value) for value in requested)
+    return clamp_timeout(requested)
+
+
+class LimitedSession(requests.Session):
+    """带默认超时和按主机限流的 Session"""
+
+    def __init__(self, timeout=None):
+        """
+        初始化会话
+
+        Args:
+            timeout: 默认超时时间（秒），为None时使用共享会话的默认超时时间
+        """
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        rate_limiter.acquire(url)
+        default = self.timeout if self.timeout is not None else get_session().timeout
+        kwargs["timeout"] = _request_timeout(kwargs.get("timeout"), default)
+        return super().request(method, url, **kwargs)
+
+
+class PooledSession(LimitedSession):
+    """带连接池、默认超时和按主机限流的 Session"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_connections=None, pool_maxsize=None):
+        """
+        初始化会话
+
+        Args:
+            timeout: 默认超时时间（秒）
+            pool_connections: 缓存连接池的主机数
+            pool_maxsize: 每个主机的最大连接数
+        """
+        super().__init__(timeout)
+        pool_connections = pool_connections or _env_int("HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS)
+        pool_maxsize = pool_maxsize or _env_int("HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)
+        # pool_block=True：某个主机的连接用完时等待空闲连接，而不是临时新建连接
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """返回进程内共享的 PooledSession，首次使用时创建"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
+
+
+def configure_session(timeout=None):
+    """
+    修改共享会话的配置
+
+    Args:
+        timeout: 默认超时时间（秒）
+    """
+    session = get_session()
+    if timeout is not None:
+        session.timeout = timeout
+    return session
+
+
+def close_session():
+    """关闭共享会话中的所有连接"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+class _PooledRequests:
+    """
+    替代 akshare 模块中 requests 引用的对象
+
+    get/post 等请求函数改由共享会话发出，Session 替换为 LimitedSession，
+    其余属性（exceptions、adapters 等）仍来自 requests。
+    """
+
+    Session = LimitedSession
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def session(self):
+        return LimitedSession()
+
+    def request(self, method, url, **kwargs):
+        return get_session().request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return get_session().get(url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return get_session().post(url, data=data, json=json, **kwargs)
+
+    def head(self, url, **kwargs):
+        return get_session().head(url, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return get_session().put(url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return get_session().patch(url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return get_session().delete(url, **kwargs)
+
+
+pooled_requests = _PooledRequests()
+
+
+def install_akshare_session(package="akshare"):
+    """
+    让 akshare 各模块的 requests.get/post 调用经过共享会话
+
+    Args:
+        package: 包名
+
+    Returns:
+        int: 替换了 requests 引用的模块数
+    """
+    count = 0
+    for name, module in list(sys.modules.items()):
+        if module is None or not (name == package or name.startswith(package + ".")):
+            continue
+        if getattr(module, "requests", None) is requests:
+            module.requests = pooled_requests
+            count += 1
+    return count
+
+
+atexit.register(close_session)
@@ -0,0 +1,245 @@
+"""
+按区间增量获取历史K线
+
+以 BarStore 记录的已覆盖区间为准，只向数据源请求缺失的子区间，
+再从本地仓库切片拼出完整结果。日期窗口每天滚动一天时，
+只需要补充最新的一根K线。
+
+前复权和后复权K线由不复权K线和复权因子表计算（见 adjust_factors.py），
+三种复权方式共用仓库中的同一份不复权K线。
+
+仓库带有缓存统计（BarStore.metrics）时，每次请求记录到 bar_store 命名空间：
+仓库已覆盖整个区间记为命中，需要补充缺失区间记为未命中并记录补充耗时，
+补充失败、只返回仓库中已有部分时记为返回过期数据。
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.tools.adjust_factors import adjust_bars, load_adjustment_factors
+from src.tools.bar_store import bar_store, merge_ranges
+from src.tools.cache_manager import cache_manager, make_key
+
+# 追加尾部数据时，向前多取一段用作复权基准校验的锚点（自然日）
+ANCHOR_LOOKBACK_DAYS = 10
+# 仓库命中情况在缓存统计中的命名空间
+BAR_STORE_NAMESPACE = "bar_store"
+
+# 写入仓库的K线列：成交量单位为手，成交额单位为元，振幅、涨跌幅和换手率为百分比
+BAR_COLUMNS = ("date", "open", "high", "low", "close", "volume", "amount",
+               "amplitude", "pct_change", "change_amount", "turnover")
+
+
+def standardize_bars(df, volume_in_shares=False, turnover_as_ratio=False):
+    """
+    把各数据源的K线转换为统一的列和单位
+
+    不同数据源拼接到同一个仓库序列中，列和单位必须一致。数据源没有提供的
+    振幅、涨跌幅和涨跌额由前一根K线的收盘价计算（第一根K线无法计算时为空，写入时保留仓库中的旧值），
+    其他缺失的列为空。
+
+    Args:
+        df: 已重命名为英文列名的K线
+        volume_in_shares: 成交量单位是否为股（如新浪财经）
+        turnover_as_ratio: 换手率是否为比例而不是百分比（如新浪财经）
+
+    Returns:
+        DataFrame: 只包含 BAR_COLUMNS 的K线，按日期升序排列
+    """
+    if df is None or df.empty or "date" not in df.columns:
+        return pd.DataFrame(columns=list(BAR_COLUMNS))
+
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.sort_values("date").reset_index(drop=True)
+    for col in BAR_COLUMNS[1:]:
+        df[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else float("nan")
+
+    if volume_in_shares:
+        df["volume"] = df["volume"] / 100
+    if turnover_as_ratio:
+        df["turnover"] = df["turnover"] * 100
+
+    pre_close = df["close"].shift(1)
+    derived = {
+        "amplitude": (df["high"] - df["low"]) / pre_close * 100,
+        "pct_change": (df["close"] - pre_close) / pre_close * 100,
+        "change_amount": df["close"] - pre_close,
+    }
+    for col, values in derived.items():
+        df[col] = df[col].fillna(values.round(2))
+
+    return df[list(BAR_COLUMNS)]
+
+
+def missing_ranges(covered, start_date, end_date):
+    """
+    计算请求区间中尚未覆盖的子区间
+
+    Args:
+        covered: 已覆盖区间 [(start, end), ...]
+        start_date: 请求开始日期
+        end_date: 请求结束日期
+
+    Returns:
+        list: 缺失的 [(Timestamp, Timestamp), ...]，按日期排序
+    """
+    start, end = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+    if start > end:
+        return []
+
+    gaps = []
+    cursor = start
+    for range_start, range_end in merge_ranges(covered):
+        if range_end < cursor:
+            continue
+        if range_start > end:
+            break
+        if range_start > cursor:
+            gaps.append((cursor, range_start - timedelta(days=1)))
+        cursor = max(cursor, range_end + timedelta(days=1))
+        if cursor > end:
+            break
+
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def get_price_bars(symbol, start_date, end_date, adjust, fetch_func, store=bar_store, verbose=True):
+    """
+    获取历史K线，只向数据源请求本地仓库缺失的部分
+
+    Args:
+        symbol: 股票代码
+        start_date: 开始日期（datetime 或 YYYY-MM-DD）
+        end_date: 结束日期（datetime 或 YYYY-MM-DD）
+        adjust: 复权类型
+        fetch_func: 数据获取函数 fetch_func(start: datetime, end: datetime)，
+                    数据源正常应答时返回DataFrame（区间内无交易日时可以为空），
+                    所有数据源都失败时返回None；单位与 BAR_COLUMNS 不同的数据源先用 standardize_bars 转换
+        store: K线仓库
+        verbose: 是否打印每次增量获取的区间
+
+    Returns:
+        DataFrame: 按日期升序排列的K线；数据源失败时返回已有的部分数据
+    """
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    # 只有已收盘的交易日才计入覆盖区间
+    last_closed_day = pd.Timestamp(datetime.now() - timedelta(days=1)).normalize()
+    cached_end = min(end, last_closed_day)
+
+    # 第二轮用于处理写入时发现复权基准变化、旧数据被丢弃的情况
+    failed = set()
+    fetch_count = 0
+    fetch_seconds = 0.0
+    for _ in range(2):
+        gaps = [gap for gap in missing_ranges(store.ranges(symbol, adjust), start, cached_end)
+                if gap not in failed]
+        if not gaps:
+            break
+
+        for gap_start, gap_end in gaps:
+            # 区间内没有工作日，无需请求
+            if len(pd.bdate_range(gap_start, gap_end)) == 0:
+                store.write(symbol, pd.DataFrame(), gap_start, gap_end, adjust=adjust)
+                continue
+
+            fetch_start = gap_start
+            anchor = store.last_date(symbol, gap_start, adjust=adjust)
+            if anchor is not None and (gap_start - anchor).days <= ANCHOR_LOOKBACK_DAYS:
+                fetch_start = anchor
+
+            if verbose:
+                print(f"增量获取 {symbol} 的K线: {fetch_start.strftime('%Y-%m-%d')} 至 {gap_end.strftime('%Y-%m-%d')}")
+            fetch_count += 1
+            fetch_start_time = time.time()
+            df = fetch_func(fetch_start.to_pydatetime(), gap_end.to_pydatetime())
+            fetch_seconds += time.time() - fetch_start_time
+            if df is None:
+                print(f"警告：{symbol} 在 {gap_start.strftime('%Y-%m-%d')} 至 {gap_end.strftime('%Y-%m-%d')} 的K线获取失败")
+                failed.add((gap_start, gap_end))
+                continue
+            store.write(symbol, standardize_bars(df), fetch_start, gap_end, adjust=adjust)
+
+    metrics = getattr(store, "metrics", None)
+    if metrics is not None:
+        key = make_key(symbol, adjust or "none")
+        if fetch_count == 0:
+            metrics.record_hit(BAR_STORE_NAMESPACE, key, "disk")
+        elif failed:
+            # 只返回仓库中已有的部分
+            metrics.record_stale(BAR_STORE_NAMESPACE, key)
+        else:
+            metrics.record_miss(BAR_STORE_NAMESPACE, key)
+            metrics.record_fetch(BAR_STORE_NAMESPACE, key, fetch_seconds)
+
+    result = store.read(symbol, start, cached_end, adjust=adjust)
+
+    # 请求包含尚未收盘的交易日时，实时获取这一部分但不写入仓库
+    if end > cached_end:
+        live_start = cached_end + timedelta(days=1)
+        live_df = fetch_func(live_start.to_pydatetime(), end.to_pydatetime())
+        if live_df is not None and not live_df.empty and "date" in live_df.columns:
+            live_df = standardize_bars(live_df)
+            live_df = live_df[live_df["date"] > cached_end]
+            result = pd.concat([result, live_df], ignore_index=True)
+
+    return result.reset_index(drop=True)
+
+
+def get_adjusted_bars(symbol, start_date, end_date, adjust, fetch_func, fetch_factors=None, store=bar_store,
+                      verbose=True):
+    """
+    获取复权K线：向数据源请求不复权K线，再按复权因子表在本地换算
+
+    Args:
+        symbol: 股票代码
+        start_date: 开始日期（datetime 或 YYYY-MM-DD）
+        end_date: 结束日期（datetime 或 YYYY-MM-DD）
+        adjust: 复权类型，""、"qfq" 或 "hfq"
+        fetch_func: 数据获取函数 fetch_func(start: datetime, end: datetime, adjust)，返回值约定同 get_price_bars
+        fetch_factors: 复权因子下载函数 fetch_factors(symbol)，为None时直接向数据源请求复权K线
+        store: K线仓库
+        verbose: 是否打印每次增量获取的区间
+
+    Returns:
+        DataFrame: 按日期升序排列的K线；不复权K线或复权因子无法获取时，改为直接请求复权K线
+    """
+    def fetcher(kind):
+        return lambda fetch_start, fetch_end: fetch_func(fetch_start, fetch_end, kind)
+
+    if adjust and fetch_factors is not None:
+        raw = get_price_bars(symbol, start_date, end_date, "", fetcher(""), store=store, verbose=verbose)
+        if raw is not None and not raw.empty:
+            factors = load_adjustment_factors(symbol, raw, fetch_factors, store=store)
+            if factors is not None:
+                return adjust_bars(raw, factors, adjust)
+            print(f"警告：无法获取 {symbol} 的复权因子，直接获取复权K线")
+
+    return get_price_bars(symbol, start_date, end_date, adjust, fetcher(adjust), store=store, verbose=verbose)
+
+
+def get_cached_price_bars(symbol, start_date, end_date, adjust, fetch_func, store=bar_store, verbose=True,
+                          fetch_factors=None):
+    """
+    带进程内缓存的 get_adjusted_bars
+
+    api、fast_api 和 data_provider 获取的同一区间K线共用缓存管理器的 price_bars 命名空间，
+    一条路径获取过的K线对其他路径同样命中。请求包含尚未收盘的交易日或使用其他K线仓库时不缓存。
+    """
+    def fetch():
+        return get_adjusted_bars(symbol, start_date, end_date, adjust, fetch_func, fetch_factors=fetch_factors,
+                                 store=store, verbose=verbose)
+
+    end = pd.Timestamp(end_date).normalize()
+    if store is not bar_store or end >= pd.Timestamp(datetime.now()).normalize():
+        return fetch()
+
+    return cache_manager.get_or_fetch(
+        "price_bars", make_key(symbol, start_date, end_date, adjust), fetch,
+        is_valid=lambda df: df is not None and not df.empty,
+    )
@@ -0,0 +1,298 @@
+"""
+按内存占用限制大小的进程内缓存
+
+api.py、fast_api.py 和 data_provider.py 中的行情、K线和财务数据原来保存在不限大小的字典中，
+过期的记录从不删除，长时间运行的批量任务或界面会话中内存持续增长。这里的缓存：
+- 按 DataFrame.memory_usage(deep=True) 估算每条记录占用的字节数
+- 超出预算时按 LRU（最近最少使用）或 LFU（使用次数最少）淘汰，已过期的记录优先淘汰
+- 记录过期后在 stale_ttl 内仍可作为数据源失败时的兜底，超过后在访问时或后台清理时删除
+
+预算通过环境变量配置：
+- MEMORY_CACHE_MAX_MB: 每个缓存的默认预算（MB），默认256
+- MEMORY_CACHE_<NAME>_MB: 单个缓存的预算，例如 MEMORY_CACHE_PRICE_HISTORY_MB=512
+- MEMORY_CACHE_POLICY: 淘汰策略 lru / lfu，默认 lru
+"""
+
+import os
+import sys
+import time
+import atexit
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+LRU = "lru"
+LFU = "lfu"
+
+# 每个缓存的默认预算（字节）
+DEFAULT_MAX_BYTES = int(float(os.getenv("MEMORY_CACHE_MAX_MB", "256")) * 1024 * 1024)
+# 过期记录作为兜底保留的时间（秒）
+DEFAULT_STALE_TTL = 24 * 3600
+# 后台清理的间隔（秒）
+SWEEP_INTERVAL = 60
+
+# 所有缓存，供后台清理和统计使用
+_caches = weakref.WeakSet()
+_sweeper = None
+_sweeper_lock = threading.Lock()
+_stop_event = threading.Event()
+
+
+def estimate_size(value, _depth=0):
+    """估算值占用的字节数，DataFrame 按 memory_usage(deep=True) 计算"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    size = sys.getsizeof(value)
+    if _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    return size
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "hits")
+
+    def __init__(self, value, size, expires_at):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class MemoryCache:
+    """按字节预算淘汰的进程内缓存，线程安全"""
+
+    def __init__(self, name, max_bytes=None, policy=None, stale_ttl=DEFAULT_STALE_TTL, on_evict=None):
+        """
+        初始化缓存
+
+        Args:
+            name: 缓存名称，用于统计和环境变量 MEMORY_CACHE_<NAME>_MB
+            max_bytes: 字节预算，默认读取环境变量
+            policy: 淘汰策略 lru / lfu，默认读取环境变量
+            stale_ttl: 记录过期后仍保留作为兜底的时间（秒）
+            on_evict: 因超出预算淘汰记录时的回调 on_evict(key)，用于按键统计
+        """
+        self.name = name
+        if max_bytes is None:
+            env_mb = os.getenv(f"MEMORY_CACHE_{name.upper()}_MB")
+            max_bytes = int(float(env_mb) * 1024 * 1024) if env_mb else DEFAULT_MAX_BYTES
+        self.max_bytes = max_bytes
+        policy = (policy or os.getenv("MEMORY_CACHE_POLICY") or LRU).lower()
+        if policy not in (LRU, LFU):
+            print(f"[内存缓存] 未知的淘汰策略 {policy}，使用 {LRU}")
+            policy = LRU
+        self.policy = policy
+        self.stale_ttl = stale_ttl
+        self.on_evict = on_evict
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        _caches.add(self)
+        _start_sweeper()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        return entry
+
+    def _is_dead(self, entry, now):
+        return entry.expires_at is not None and entry.expires_at + self.stale_ttl <= now
+
+    def get(self, key, allow_expired=False):
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            allow_expired: 是否返回已过期（仍在兜底保留期内）的记录
+
+        Returns:
+            缓存的值，没有可用记录时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._is_dead(entry, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            expired = entry.expires_at is not None and entry.expires_at <= now
+            if expired and not allow_expired:
+                self.misses += 1
+                return None
+
+            entry.hits += 1
+            self._entries.move_to_end(key)
+            if expired:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entry.value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 要缓存的值
+            ttl: 有效期（秒或 timedelta）
+            expires_at: 过期时间（datetime 或时间戳），与 ttl 二选一；都为None时不过期
+        """
+        if isinstance(ttl, timedelta):
+            ttl = ttl.total_seconds()
+        if expires_at is None and ttl is not None:
+            expires_at = time.time() + ttl
+        expires_at = _to_timestamp(expires_at)
+        size = estimate_size(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                print(f"[内存缓存] {self.name} 的记录 {key} 约 {size / 1024 / 1024:.1f}MB，超过预算，不缓存")
+                return
+            self._entries[key] = _Entry(value, size, expires_at)
+            self.current_bytes += size
+            self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """超出预算时淘汰记录：先淘汰已过期的，再按策略淘汰"""
+        if self.current_bytes <= self.max_bytes:
+            return
+        now = time.time()
+        expired = [k for k, e in self._entries.items()
+                   if k != keep and e.expires_at is not None and e.expires_at <= now]
+        for key in expired:
+            if self.current_bytes <= self.max_bytes:
+                return
+            self._evicted(key)
+
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            if self.policy == LFU:
+                # 使用次数相同时淘汰最久未使用的
+                victim = min((k for k in self._entries if k != keep), key=lambda k: self._entries[k].hits)
+            else:
+                victim = next(k for k in self._entries if k != keep)
+            self._evicted(victim)
+
+    def _evicted(self, key):
+        self._remove(key)
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def expires_at(self, key):
+        """返回记录的过期时间（datetime），没有记录或不过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at is None:
+                return None
+            return datetime.fromtimestamp(entry.expires_at)
+
+    def delete(self, key):
+        """删除一条记录"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def sweep(self):
+        """删除超过兜底保留期的记录，返回删除的数量"""
+        now = time.time()
+        with self._lock:
+            dead = [k for k, e in self._entries.items() if self._is_dead(e, now)]
+            for key in dead:
+                self._remove(key)
+            self.expirations += len(dead)
+        return len(dead)
+
+    def __contains__(self, key):
+        """是否有未过期的记录（不计入命中统计）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry.expires_at is None or entry.expires_at > time.time())
+
+    def sizes(self):
+        """返回每条记录占用的字节数 {key: bytes}"""
+        with self._lock:
+            return {key: entry.size for key, entry in self._entries.items()}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def _sweep_loop():
+    while not _stop_event.wait(SWEEP_INTERVAL):
+        for cache in list(_caches):
+            try:
+                cache.sweep()
+            except Exception as e:
+                print(f"[内存缓存] 清理 {cache.name} 时出错: {e}")
+
+
+def _start_sweeper():
+    """启动后台清理线程（每个进程一个）"""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is not None and _sweeper.is_alive():
+            return
+        _sweeper = threading.Thread(target=_sweep_loop, name="memory-cache-sweeper", daemon=True)
+        _sweeper.start()
+
+
+def memory_cache_stats():
+    """返回所有内存缓存的统计信息，供诊断界面和命令行查看"""
+    return [cache.stats() for cache in sorted(list(_caches), key=lambda c: c.name)]
+
+
+atexit.register(_stop_event.set)
@@ -11,7 +11,6 @@ from src.tools.akshare_config import configure_akshare_timeout
 configure_akshare_timeout(30)
 
 import akshare as ak
-import requests
 from bs4 import BeautifulSoup
 from src.tools.openrouter_config import get_chat_completion, logger as api_logger
 import time
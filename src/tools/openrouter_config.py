@@ -6,6 +6,11 @@ from dotenv import load_dotenv
 from dataclasses import dataclass
 import backoff
 
+from src.tools.executors import get_executor
+from src.tools.request_context import allow_retry, clamp_timeout, current_context, remaining_time
+from src.tools.rate_limiter import rate_limiter
+from src.tools.upstream_recorder import upstream_recorder
+
 # 设置日志记录
 logger = logging.getLogger('api_calls')
 logger.setLevel(logging.DEBUG)
@@ -98,15 +103,21 @@ client = OpenAI(api_key=api_key, base_url=base_url)
 logger.info(f"{SUCCESS_ICON} OpenAI 客户端初始化成功")
 
 
+def _should_give_up(e):
+    """只重试触发限流的请求，且当前请求的剩余时间和重试预算允许"""
+    return "rate limit" not in str(e).lower() or not allow_retry(5)
+
+
 @backoff.on_exception(
     backoff.expo,
     (Exception),
     max_tries=5,
-    max_time=300,
-    giveup=lambda e: "rate limit" not in str(e).lower()
+    # 在每次调用时计算，不超过当前请求的剩余时间
+    max_time=lambda: min(300, remaining_time(300)),
+    giveup=_should_give_up
 )
 def generate_content_with_retry(model, messages, config=None, tools=None, tool_choice=None):
-    """带重试机制的内容生成函数"""
+    """带重试机制的内容生成函数，重试和请求超时都不超过当前请求的剩余时间"""
     try:
         logger.info(f"{WAIT_ICON} 正在调用 OpenAI API...")
         logger.info(f"请求内容: {messages[:500]}..." if len(
@@ -121,6 +132,14 @@ def generate_content_with_retry(model, messages, config=None, tools=None, tool_c
             "max_tokens": 4096
         }
 
+        # 按大模型服务的主机限流（在环境变量 RATE_LIMITS 中配置）
+        rate_limiter.acquire(base_url or "api.openai.com")
+
+        # 设置了请求上下文时，单次请求不超过剩余时间
+        request_timeout = clamp_timeout(None)
+        if request_timeout is not None:
+            api_params["timeout"] = request_timeout
+
         # 如果提供了工具，添加到参数中
         if tools:
             logger.info(f"使用工具: {tools}")
@@ -131,7 +150,9 @@ def generate_content_with_retry(model, messages, config=None, tools=None, tool_c
             logger.info(f"工具选择: {tool_choice}")
             api_params["tool_choice"] = tool_choice
 
-        response = client.chat.completions.create(**api_params)
+        # 录制/回放模式下保存或返回录制的响应，超时时间不参与匹配
+        response = upstream_recorder.call("openai.chat.completions.create", client.chat.completions.create,
+                                          key_exclude=("timeout",), **api_params)
 
         logger.info(f"{SUCCESS_ICON} API 调用成功")
 
@@ -164,7 +185,7 @@ def generate_content_with_retry(model, messages, config=None, tools=None, tool_c
     except Exception as e:
         if "rate limit" in str(e).lower():
             logger.warning(f"{ERROR_ICON} 触发 API 限制，等待重试... 错误: {str(e)}")
-            time.sleep(5)
+            time.sleep(min(5, remaining_time(5)))
             raise e
         logger.error(f"{ERROR_ICON} API 调用失败: {str(e)}")
         logger.error(f"错误详情: {str(e)}")
@@ -172,7 +193,7 @@ def generate_content_with_retry(model, messages, config=None, tools=None, tool_c
 
 
 def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay=1, tools=None, tool_choice=None):
-    """获取聊天完成结果，包含重试逻辑"""
+    """获取聊天完成结果，包含重试逻辑；超过当前请求的截止时间后返回None"""
     try:
         if model is None:
             model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
@@ -180,21 +201,26 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
         logger.info(f"{WAIT_ICON} 使用模型: {model}")
         logger.debug(f"消息内容: {messages}")
 
+        context = current_context()
         for attempt in range(max_retries):
+            if context is not None and context.expired():
+                logger.error(f"{ERROR_ICON} 请求已超过截止时间，不再调用 API")
+                return None
             try:
-                # 调用 API
-                content = generate_content_with_retry(
+                # 调用 API（在共享的 llm 线程池中执行，限制进程内同时进行的请求数）
+                content = get_executor("llm").submit(
+                    generate_content_with_retry,
                     model=model,
                     messages=messages,
                     tools=tools,
                     tool_choice=tool_choice
-                )
+                ).result()
 
                 if content is None:
                     logger.warning(
                         f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries}: API 返回空值")
-                    if attempt < max_retries - 1:
-                        retry_delay = initial_retry_delay * (2 ** attempt)
+                    retry_delay = initial_retry_delay * (2 ** attempt)
+                    if attempt < max_retries - 1 and allow_retry(retry_delay):
                         logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
                         time.sleep(retry_delay)
                         continue
@@ -206,8 +232,8 @@ def get_chat_completion(messages, model=None, max_retries=3, initial_retry_delay
             except Exception as e:
                 logger.error(
                     f"{ERROR_ICON} 尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
-                if attempt < max_retries - 1:
-                    retry_delay = initial_retry_delay * (2 ** attempt)
+                retry_delay = initial_retry_delay * (2 ** attempt)
+                if attempt < max_retries - 1 and allow_retry(retry_delay):
                     logger.info(f"{WAIT_ICON} 等待 {retry_delay} 秒后重试...")
                     time.sleep(retry_delay)
                 else:
@@ -1,9 +1,151 @@
+import asyncio
 import concurrent.futures
+import contextvars
+import functools
+import threading
 import time
 import random
 from datetime import datetime, timedelta
 import pandas as pd
-from typing import Dict, Any, List, Tuple, Callable
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from src.tools.executors import get_executor
+from src.tools.source_ranking import rank_sources, source_ranker
+from src.tools.circuit_breaker import protect_sources
+from src.tools.request_context import clamp_timeout
+
+
+async def race_sources_async(candidates: List[Tuple[str, Callable[[], Any]]],
+                             is_valid: Optional[Callable[[Any], bool]] = None,
+                             source_timeout: Optional[float] = None,
+                             deadline: Optional[float] = None,
+                             max_concurrency: Optional[int] = None,
+                             executor: Optional[concurrent.futures.Executor] = None,
+                             hedge_delay: Optional[float] = None):
+    """
+    让多个数据源同时竞速，返回第一个有效结果并取消其余请求
+
+    阻塞式调用在有界线程池中执行。一旦有数据源胜出，尚未开始的请求会被取消，
+    已经在执行的请求不再等待，其结果被丢弃。
+    设置 hedge_delay 时按顺序对冲：前一个数据源失败或超过 hedge_delay 秒仍未返回，
+    才启动下一个数据源。
+    单个数据源超时和整体超时都不会超过当前请求上下文的剩余时间。
+
+    Args:
+        candidates: [(数据源名称, 无参获取函数), ...]
+        is_valid: 结果校验函数，默认要求结果不为None
+        source_timeout: 单个数据源的超时时间（秒）
+        deadline: 整体超时时间（秒）
+        max_concurrency: 同时进行的请求数上限
+        executor: 执行阻塞调用的线程池，默认使用共享的 io 线程池
+        hedge_delay: 对冲延迟（秒），为None时所有数据源同时启动
+
+    Returns:
+        tuple: (数据源名称, 数据, 错误信息列表)，全部失败时数据源名称和数据为None
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or get_executor("io")
+    is_valid = is_valid or (lambda data: data is not None)
+    source_timeout = clamp_timeout(source_timeout)
+    deadline = clamp_timeout(deadline)
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    start_time = time.time()
+    errors = []
+    # 已有数据源胜出后，排队中的数据源不再发出请求
+    won = asyncio.Event()
+    finished = [asyncio.Event() for _ in candidates]
+
+    async def attempt(index, source_name, fetch_func):
+        try:
+            if hedge_delay and index > 0:
+                try:
+                    await asyncio.wait_for(finished[index - 1].wait(), timeout=hedge_delay)
+                except asyncio.TimeoutError:
+                    pass
+            if semaphore is not None:
+                async with semaphore:
+                    return await call(source_name, fetch_func)
+            return await call(source_name, fetch_func)
+        finally:
+            finished[index].set()
+
+    async def call(source_name, fetch_func):
+        if won.is_set():
+            raise asyncio.CancelledError()
+        future = loop.run_in_executor(executor, fetch_func)
+        try:
+            if source_timeout is not None:
+                data = await asyncio.wait_for(future, timeout=source_timeout)
+            else:
+                data = await future
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"超过 {source_timeout} 秒未返回")
+        if is_valid(data):
+            won.set()
+        return data
+
+    tasks = {asyncio.ensure_future(attempt(i, name, func)): name
+             for i, (name, func) in enumerate(candidates)}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - (time.time() - start_time)
+                if remaining <= 0:
+                    errors.append(f"总体超时（{deadline} 秒）")
+                    break
+
+            done, pending = await asyncio.wait(pending, timeout=remaining,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source_name = tasks[task]
+                if task.cancelled():
+                    continue
+                try:
+                    data = task.result()
+                except Exception as e:
+                    print(f"从 {source_name} 获取数据时出错: {str(e)}")
+                    errors.append(f"从{source_name}获取数据出错: {str(e)}")
+                    continue
+
+                if is_valid(data):
+                    print(f"成功从 {source_name} 获取数据，耗时 {time.time() - start_time:.2f} 秒")
+                    return source_name, data, errors
+                errors.append(f"从{source_name}获取数据失败")
+    finally:
+        # 取消落后的数据源，不等待仍在执行的阻塞调用
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    return None, None, errors
+
+
+def race_sources(candidates: List[Tuple[str, Callable[[], Any]]], **kwargs):
+    """
+    race_sources_async 的同步版本，参数和返回值相同
+
+    当前线程已有运行中的事件循环时，在独立线程中运行竞速。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(race_sources_async(candidates, **kwargs))
+
+    result = {}
+    # 在新线程中沿用当前的请求上下文
+    context = contextvars.copy_context()
+
+    def runner():
+        result["value"] = context.run(asyncio.run, race_sources_async(candidates, **kwargs))
+
+    thread = threading.Thread(target=runner, name="source-race-loop")
+    thread.start()
+    thread.join()
+    return result["value"]
+
 
 class ParallelDataFetcher:
     """并行数据获取器，用于同时从多个数据源获取数据"""
@@ -14,18 +156,20 @@ class ParallelDataFetcher:
 
         Args:
             timeout: 整体超时时间（秒）
-            max_workers: 最大并行工作线程数
+            max_workers: 同时请求的数据源数量上限
         """
         self.timeout = timeout
         self.max_workers = max_workers
 
-    def fetch_market_data(self, symbol: str, data_sources: List[Tuple[str, Callable]]) -> Dict[str, Any]:
+    def fetch_market_data(self, symbol: str, data_sources: List[Tuple[str, Callable]],
+                          endpoint: str = "market_data") -> Dict[str, Any]:
         """
         并行获取市场数据
 
         Args:
             symbol: 股票代码
             data_sources: 数据源列表，每项为(数据源名称, 获取函数)的元组
+            endpoint: 接口类型，用于数据源自适应排序
 
         Returns:
             从最快返回有效结果的数据源获取的数据
@@ -33,40 +177,23 @@ class ParallelDataFetcher:
         start_time = time.time()
         print(f"开始并行获取 {symbol} 的市场数据...")
 
-        # 使用线程池并发执行所有数据源请求
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有任务
-            future_to_source = {
-                executor.submit(self._fetch_with_timeout, get_data_func, symbol): source_name
-                for source_name, get_data_func in data_sources
-            }
-
-            # 获取最快返回有效结果的数据源
-            results = []
+        # 按历史耗时和错误率排序，较优的数据源先启动
+        candidates = protect_sources(endpoint, rank_sources(
+            endpoint,
+            [(source_name, functools.partial(get_data_func, symbol)) for source_name, get_data_func in data_sources],
+            is_valid=self._is_valid_data,
+        ))
+        source_name, data, _ = race_sources(
+            candidates,
+            is_valid=self._is_valid_data,
+            source_timeout=self.timeout,
+            deadline=self.timeout,
+            max_concurrency=self.max_workers,
+            hedge_delay=source_ranker.hedge_delay(endpoint, candidates),
+        )
 
-            # 使用as_completed获取结果，这样可以处理最快返回的结果
-            for future in concurrent.futures.as_completed(future_to_source, timeout=self.timeout):
-                source_name = future_to_source[future]
-                try:
-                    data = future.result()
-                    if data is not None and self._is_valid_data(data):
-                        elapsed = time.time() - start_time
-                        print(f"成功从 {source_name} 获取数据，耗时 {elapsed:.2f} 秒")
-                        results.append((source_name, data, elapsed))
-                except Exception as e:
-                    print(f"从 {source_name} 获取数据时出错: {str(e)}")
-
-                # 如果已经获取到足够的有效结果，可以提前退出
-                if len(results) > 0:
-                    # 注意：这里不取消其他任务，因为它们可能已经发出请求
-                    # 取消可能不会节省太多时间，且可能导致资源泄漏
-                    break
-
-        # 根据速度排序结果，优先使用最快返回的有效数据
-        if results:
-            results.sort(key=lambda x: x[2])  # 按耗时排序
-            source_name, data, elapsed = results[0]
-            print(f"选择使用 {source_name} 的数据，总耗时 {elapsed:.2f} 秒")
+        if source_name is not None:
+            print(f"选择使用 {source_name} 的数据，总耗时 {time.time() - start_time:.2f} 秒")
             return data
 
         # 如果所有数据源都失败
@@ -74,7 +201,8 @@ class ParallelDataFetcher:
         return None
 
     def fetch_price_history(self, symbol: str, start_date: str, end_date: str,
-                           data_sources: List[Tuple[str, Callable]], adjust: str = "qfq") -> pd.DataFrame:
+                           data_sources: List[Tuple[str, Callable]], adjust: str = "qfq",
+                           min_rows: int = 5, endpoint: str = "price_history") -> pd.DataFrame:
         """
         并行获取历史价格数据
 
@@ -84,6 +212,8 @@ class ParallelDataFetcher:
             end_date: 结束日期
             data_sources: 数据源列表，每项为(数据源名称, 获取函数)的元组
             adjust: 复权类型
+            min_rows: 有效结果至少需要的记录数
+            endpoint: 接口类型，用于数据源自适应排序
 
         Returns:
             价格历史数据DataFrame
@@ -91,72 +221,33 @@ class ParallelDataFetcher:
         start_time = time.time()
         print(f"开始并行获取 {symbol} 的历史行情数据...")
 
-        # 使用线程池并发执行所有数据源请求
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有任务
-            future_to_source = {
-                executor.submit(
-                    self._fetch_price_with_timeout,
-                    get_data_func,
-                    symbol,
-                    start_date,
-                    end_date,
-                    adjust
-                ): source_name
-                for source_name, get_data_func in data_sources
-            }
-
-            # 使用as_completed获取最快的有效结果
-            results = []
-            try:
-                # 设置较短的总超时时间
-                total_timeout = min(self.timeout, 5)
-                for future in concurrent.futures.as_completed(future_to_source, timeout=total_timeout):
-                    source_name = future_to_source[future]
-                    try:
-                        df = future.result(timeout=1.0)  # 单个结果等待时间短，快速失败
-                        if df is not None and not df.empty and self._is_valid_price_data(df):
-                            elapsed = time.time() - start_time
-                            print(f"成功从 {source_name} 获取数据，记录数: {len(df)}，耗时 {elapsed:.2f} 秒")
-                            results.append((source_name, df, elapsed, len(df)))
-
-                            # 一旦有一个可用结果，就不再等待其他结果（针对单股票优化）
-                            if len(results) >= 1:
-                                break
-                    except Exception as e:
-                        print(f"从 {source_name} 获取数据时出错: {str(e)}")
-            except concurrent.futures.TimeoutError:
-                # 总体超时，但可能已经有结果了
-                print(f"获取历史数据总体超时")
-
-            # 选择数据量最大且速度最快的结果
-            if results:
-                # 首先按数据量排序（降序），然后按速度排序（升序）
-                results.sort(key=lambda x: (-x[3], x[2]))
-                source_name, df, elapsed, count = results[0]
-                print(f"选择使用 {source_name} 的数据，{count} 条记录，总耗时 {elapsed:.2f} 秒")
-                return df
+        # 按历史耗时和错误率排序，较优的数据源先启动
+        is_valid = functools.partial(self._is_valid_price_data, min_rows=min_rows)
+        candidates = protect_sources(endpoint, rank_sources(
+            endpoint,
+            [(source_name, functools.partial(get_data_func, symbol, start_date, end_date, adjust))
+             for source_name, get_data_func in data_sources],
+            is_valid=is_valid,
+        ))
+        # 设置较短的总超时时间
+        total_timeout = min(self.timeout, 5)
+        source_name, df, _ = race_sources(
+            candidates,
+            is_valid=is_valid,
+            source_timeout=total_timeout,
+            deadline=total_timeout,
+            max_concurrency=self.max_workers,
+            hedge_delay=source_ranker.hedge_delay(endpoint, candidates),
+        )
+
+        if source_name is not None:
+            print(f"选择使用 {source_name} 的数据，{len(df)} 条记录，总耗时 {time.time() - start_time:.2f} 秒")
+            return df
 
         # 如果所有数据源都失败
         print(f"警告：所有数据源获取 {symbol} 历史数据失败，总耗时 {time.time() - start_time:.2f} 秒")
         return pd.DataFrame()
 
-    def _fetch_with_timeout(self, fetch_func, symbol):
-        """带超时的数据获取函数包装器"""
-        try:
-            return fetch_func(symbol)
-        except Exception as e:
-            print(f"数据获取超时或出错: {str(e)}")
-            return None
-
-    def _fetch_price_with_timeout(self, fetch_func, symbol, start_date, end_date, adjust):
-        """带超时的价格数据获取函数包装器"""
-        try:
-            return fetch_func(symbol, start_date, end_date, adjust)
-        except Exception as e:
-            print(f"价格数据获取超时或出错: {str(e)}")
-            return None
-
     def _is_valid_data(self, data):
         """检查市场数据是否有效"""
         if data is None:
@@ -174,7 +265,7 @@ class ParallelDataFetcher:
 
         return True
 
-    def _is_valid_price_data(self, df):
+    def _is_valid_price_data(self, df, min_rows=5):
         """检查价格数据是否有效"""
         if df is None or df.empty:
             return False
@@ -184,7 +275,7 @@ class ParallelDataFetcher:
             return False
 
         # 检查记录数是否足够
-        if len(df) < 5:  # 至少需要5条记录
+        if len(df) < min_rows:  # 默认至少需要5条记录
             return False
 
-        return True
\ No newline at end of file
+        return True
@@ -0,0 +1,256 @@
+"""
+按上游主机限流的令牌桶
+
+每个上游主机（东方财富、新浪、腾讯等）一个令牌桶，所有线程共享。
+令牌桶状态保存在缓存目录的小文件中，并用文件锁保护，
+因此同时运行的多个进程（例如并行回测）也共享同一个速率上限。
+
+请求按令牌桶预约发出时间：令牌不足时在锁外等待，而不是先突发请求、被封IP后再靠重试恢复。
+限流配置可以通过环境变量 RATE_LIMITS 覆盖，格式为 "主机=每秒请求数:突发数"，多个主机用逗号分隔，
+例如 RATE_LIMITS="eastmoney.com=8:16,sina.com.cn=2:4"。
+"""
+
+import os
+import json
+import time
+import threading
+from urllib.parse import urlsplit
+
+from src.tools.request_context import DeadlineExceeded, remaining_time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 定义缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+RATE_LIMIT_DIR = os.path.join(CACHE_DIR, "rate_limits")
+
+# 默认限流配置：主机后缀 -> (每秒请求数, 突发数)
+DEFAULT_RATE_LIMITS = {
+    "eastmoney.com": (5.0, 10),
+    "sina.com.cn": (3.0, 6),
+    "sinajs.cn": (3.0, 6),
+    "gtimg.cn": (5.0, 10),
+    "qq.com": (5.0, 10),
+    "163.com": (3.0, 6),
+}
+
+
+class TokenBucket:
+    """可跨进程共享的令牌桶"""
+
+    def __init__(self, name, rate, burst, path=None):
+        """
+        初始化令牌桶
+
+        Args:
+            name: 令牌桶名称，通常为主机后缀
+            rate: 每秒补充的令牌数
+            burst: 令牌桶容量，即允许的突发请求数
+            path: 状态文件路径，为None时只在进程内共享
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+        self._tokens = self.burst
+        self._updated = time.time()
+
+        # 统计信息
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _lock_file(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _read_state(self, fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, 256)
+        if raw:
+            try:
+                state = json.loads(raw.decode("utf-8"))
+                return float(state["tokens"]), float(state["updated"])
+            except (ValueError, KeyError):
+                pass
+        return self.burst, time.time()
+
+    def _write_state(self, fd, tokens, updated):
+        data = json.dumps({"tokens": tokens, "updated": updated}).encode("utf-8")
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, data)
+
+    def _reserve(self, tokens, max_wait):
+        """
+        预约令牌，返回需要等待的秒数；等待时间超过 max_wait 时不预约，返回None
+        """
+        with self._lock:
+            fd = None
+            if self.path:
+                try:
+                    fd = self._open()
+                    self._lock_file(fd)
+                except OSError as e:
+                    print(f"[限流] 无法使用状态文件 {self.path}，改为进程内限流: {e}")
+                    self.path = None
+                    fd = None
+            try:
+                if fd is not None:
+                    available, updated = self._read_state(fd)
+                else:
+                    available, updated = self._tokens, self._updated
+
+                now = time.time()
+                available = min(self.burst, available + max(now - updated, 0) * self.rate)
+                # 令牌可以透支，透支部分就是需要等待的时间
+                wait = max(tokens - available, 0) / self.rate
+                if max_wait is not None and wait > max_wait:
+                    return None
+
+                available -= tokens
+                if fd is not None:
+                    self._write_state(fd, available, now)
+                else:
+                    self._tokens, self._updated = available, now
+
+                self.acquired += 1
+                if wait > 0:
+                    self.throttled += 1
+                    self.total_wait += wait
+                return wait
+            finally:
+                if fd is not None:
+                    self._unlock_file(fd)
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时等待
+
+        等待时间超过当前请求上下文的剩余时间时抛出 DeadlineExceeded。
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        wait = self._reserve(tokens, remaining_time())
+        if wait is None:
+            raise DeadlineExceeded(f"访问 {self.name} 需要排队，超过了请求的剩余时间")
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        """返回令牌桶统计信息"""
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait_seconds": round(self.total_wait, 2),
+        }
+
+
+class RateLimiter:
+    """按主机后缀管理令牌桶"""
+
+    def __init__(self, limits=None, state_dir=RATE_LIMIT_DIR):
+        """
+        初始化限流器
+
+        Args:
+            limits: {主机后缀: (每秒请求数, 突发数)}，未指定时使用 DEFAULT_RATE_LIMITS
+            state_dir: 令牌桶状态文件目录，为None时只在进程内限流
+        """
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for host, (rate, burst) in (DEFAULT_RATE_LIMITS if limits is None else limits).items():
+            self.configure(host, rate, burst)
+
+    def configure(self, host, rate, burst):
+        """
+        设置主机的限流配置
+
+        Args:
+            host: 主机后缀，如 "eastmoney.com"，匹配该域名及其所有子域名
+            rate: 每秒请求数
+            burst: 突发请求数
+        """
+        if rate <= 0 or burst <= 0:
+            raise ValueError(f"限流配置无效: {host}={rate}:{burst}")
+        host = host.lower().lstrip(".")
+        path = os.path.join(self.state_dir, f"{host}.bucket") if self.state_dir else None
+        with self._lock:
+            self._buckets[host] = TokenBucket(host, rate, burst, path)
+
+    def bucket_for(self, url_or_host):
+        """返回URL或主机对应的令牌桶，没有限流配置时返回None"""
+        host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+        if not host:
+            return None
+        host = host.lower()
+        # 从完整主机名开始逐级匹配上级域名
+        while host:
+            bucket = self._buckets.get(host)
+            if bucket is not None:
+                return bucket
+            _, _, host = host.partition(".")
+        return None
+
+    def acquire(self, url_or_host):
+        """
+        请求发出前获取对应主机的令牌
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        bucket = self.bucket_for(url_or_host)
+        return bucket.acquire() if bucket is not None else 0.0
+
+    def stats(self):
+        """返回所有令牌桶的统计信息"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {host: bucket.stats() for host, bucket in buckets.items()}
+
+
+def _limits_from_env():
+    """解析环境变量 RATE_LIMITS 中的限流配置"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in filter(None, (part.strip() for part in os.getenv("RATE_LIMITS", "").split(","))):
+        try:
+            host, spec = item.split("=", 1)
+            rate, _, burst = spec.partition(":")
+            limits[host.strip()] = (float(rate), float(burst or rate))
+        except ValueError:
+            print(f"[限流] 环境变量 RATE_LIMITS 中的配置无效: {item}")
+    return limits
+
+
+# 全局限流器
+rate_limiter = RateLimiter(_limits_from_env())
@@ -0,0 +1,175 @@
+"""
+请求上下文：截止时间和重试预算
+
+一次分析请求（run_hedge_fund）创建一个 RequestContext，
+之后的数据获取和大模型调用都从 contextvars 中读取它：
+- 各层重试在等待前检查剩余时间，剩余时间不足时不再重试
+- 整个请求共享一个重试预算，嵌套的重试层不会成倍放大总耗时
+- 竞速、HTTP 请求和大模型调用的超时时间不超过剩余时间
+
+共享线程池（executors.py）在提交任务时复制当前上下文，因此在线程池中执行的任务同样受约束。
+没有设置请求上下文时，各层保持原有的重试策略。
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求已超过截止时间"""
+
+
+class RequestContext:
+    """一次请求的截止时间和重试预算"""
+
+    def __init__(self, timeout=None, retry_budget=None):
+        """
+        初始化请求上下文
+
+        Args:
+            timeout: 请求的总时间预算（秒），为None时不限制
+            retry_budget: 整个请求允许的重试总次数，为None时不限制
+        """
+        self.timeout = timeout
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.retry_budget = retry_budget
+        self.retries_used = 0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """剩余时间（秒），不限制时返回None"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.0)
+
+    def expired(self):
+        """是否已超过截止时间"""
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def check(self, operation="请求"):
+        """已超过截止时间时抛出 DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(f"{operation}已超过截止时间（总预算 {self.timeout} 秒）")
+
+    def clamp(self, timeout):
+        """
+        将超时时间限制在剩余时间之内
+
+        Args:
+            timeout: 原有的超时时间（秒），为None表示不限制
+
+        Returns:
+            float: 不超过剩余时间的超时时间，两者都不限制时返回None
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+    def acquire_retry(self, delay):
+        """
+        申请一次重试
+
+        等待 delay 秒后剩余时间必须仍然大于0，且重试预算未用完，才允许重试。
+
+        Args:
+            delay: 重试前的等待时间（秒）
+
+        Returns:
+            bool: 是否允许重试
+        """
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            return False
+        with self._lock:
+            if self.retry_budget is not None and self.retries_used >= self.retry_budget:
+                return False
+            self.retries_used += 1
+            return True
+
+    def snapshot(self):
+        """返回当前状态"""
+        remaining = self.remaining()
+        return {
+            "timeout": self.timeout,
+            "remaining": round(remaining, 1) if remaining is not None else None,
+            "retry_budget": self.retry_budget,
+            "retries_used": self.retries_used,
+        }
+
+
+_current_context = contextvars.ContextVar("request_context", default=None)
+
+
+def current_context():
+    """返回当前的请求上下文，未设置时返回None"""
+    return _current_context.get()
+
+
+@contextmanager
+def request_context(context=None, timeout=None, retry_budget=None):
+    """
+    在 with 块内设置当前请求上下文
+
+    Args:
+        context: 已有的 RequestContext，为None时按 timeout 和 retry_budget 新建
+        timeout: 请求的总时间预算（秒）
+        retry_budget: 整个请求允许的重试总次数
+    """
+    if context is None:
+        context = RequestContext(timeout=timeout, retry_budget=retry_budget)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+def remaining_time(default=None):
+    """
+    当前请求的剩余时间
+
+    Args:
+        default: 未设置请求上下文或不限制时间时的返回值
+
+    Returns:
+        float: 剩余时间（秒）
+    """
+    context = current_context()
+    if context is None:
+        return default
+    remaining = context.remaining()
+    return default if remaining is None else remaining
+
+
+def clamp_timeout(timeout):
+    """将超时时间限制在当前请求的剩余时间之内"""
+    context = current_context()
+    return timeout if context is None else context.clamp(timeout)
+
+
+def check_deadline(operation="请求"):
+    """当前请求已超过截止时间时抛出 DeadlineExceeded"""
+    context = current_context()
+    if context is not None:
+        context.check(operation)
+
+
+def allow_retry(delay):
+    """
+    各重试层在等待重试前调用：申请当前请求的一次重试预算
+
+    没有设置请求上下文时总是允许重试。
+
+    Args:
+        delay: 重试前的等待时间（秒）
+
+    Returns:
+        bool: 是否应该继续重试
+    """
+    context = current_context()
+    return context is None or context.acquire_retry(delay)
@@ -0,0 +1,163 @@
+"""
+请求合并（single-flight）
+
+相同参数的上游调用同时进行时，只有第一个调用真正发出请求，
+其余调用等待并共享它的结果，避免重复下载、重复解析和重复消耗上游限额。
+"""
+
+import functools
+import threading
+from collections import defaultdict
+
+# 需要合并重复请求的akshare函数
+AKSHARE_COALESCED_FUNCTIONS = [
+    "stock_zh_a_hist",
+    "stock_zh_a_hist_163",
+    "stock_zh_a_daily",
+    "stock_zh_a_spot",
+    "stock_zh_a_spot_em",
+    "stock_financial_analysis_indicator",
+    "stock_financial_report_sina",
+]
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def _share(result):
+    """返回给调用方的结果副本，避免调用方修改彼此的DataFrame"""
+    copy_func = getattr(result, "copy", None)
+    return copy_func() if callable(copy_func) else result
+
+
+class SingleFlight:
+    """按键合并并发的重复调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # 名称 -> {"calls": 调用次数, "executed": 实际执行次数, "deduplicated": 被合并次数, "errors": 出错次数}
+        self._stats = defaultdict(lambda: {"calls": 0, "executed": 0, "deduplicated": 0, "errors": 0})
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行调用，相同key的调用正在进行时等待其结果
+
+        Args:
+            key: 调用的唯一标识，第一个元素作为统计名称
+            func: 实际执行的函数
+
+        Returns:
+            func 的返回值；发起者和等待者都得到结果的副本，原始结果不交给调用方
+        """
+        name = key[0] if isinstance(key, tuple) else key
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                stats["deduplicated"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return _share(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+            # 发起者返回后可能就地修改结果，此时等待者可能还在复制，因此发起者也只拿到副本
+            return _share(call.result)
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def wrap(self, func, name=None):
+        """
+        包装函数，按 (名称, 位置参数, 关键字参数) 合并重复调用
+
+        参数不可哈希时直接调用原函数。
+        """
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            return self.do(key, func, *args, **kwargs)
+
+        wrapper.__single_flight__ = True
+        return wrapper
+
+    def stats(self):
+        """
+        返回各函数的合并统计
+
+        Returns:
+            dict: 名称到统计信息的映射，另含 "total" 汇总
+        """
+        with self._lock:
+            result = {name: dict(values) for name, values in self._stats.items()}
+        total = {"calls": 0, "executed": 0, "deduplicated": 0, "errors": 0}
+        for values in result.values():
+            for field in total:
+                total[field] += values[field]
+        result["total"] = total
+        return result
+
+    def reset_stats(self):
+        """清空统计信息"""
+        with self._lock:
+            self._stats.clear()
+
+
+# 全局实例，供akshare函数共享
+akshare_flight = SingleFlight()
+
+
+def patch_akshare_single_flight(names=None):
+    """
+    为akshare的数据获取函数添加请求合并
+
+    Args:
+        names: 需要包装的函数名列表，默认为 AKSHARE_COALESCED_FUNCTIONS
+    """
+    import akshare as ak
+    from src.tools.upstream_recorder import install_akshare_recorder
+
+    # 录制/回放层需要位于请求合并之内
+    install_akshare_recorder()
+
+    patched = []
+    for name in names or AKSHARE_COALESCED_FUNCTIONS:
+        func = getattr(ak, name, None)
+        if func is None or getattr(func, "__single_flight__", False):
+            continue
+        setattr(ak, name, akshare_flight.wrap(func, name))
+        patched.append(name)
+
+    if patched:
+        print(f"成功为 {len(patched)} 个akshare函数添加请求合并")
+    return patched
@@ -0,0 +1,219 @@
+"""
+数据源自适应排序
+
+按接口类型（如 price_history、market_data）记录每个数据源的
+指数加权平均耗时和错误率，据此调整数据源的尝试顺序。
+排序结果保存在缓存目录中，重启后继续生效。
+长期失败的数据源（例如已经下线的网易接口）会自动排到最后，
+不再在每次调用时白白消耗一次超时。
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+
+# 定义缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
+SOURCE_RANKING_FILE = os.path.join(CACHE_DIR, "source_ranking.json")
+
+# 指数加权平滑系数，越大越偏重最近的观测
+EWMA_ALPHA = 0.3
+# 失败一次相当于多少秒的额外耗时
+FAILURE_PENALTY_SECONDS = 10.0
+# 错误率的半衰期（秒），让失败过的数据源之后还有机会被重新尝试
+ERROR_HALF_LIFE_SECONDS = 6 * 3600
+# 没有观测记录的数据源使用的默认耗时（秒）
+DEFAULT_LATENCY = 1.0
+# 两次写盘之间的最短间隔（秒）
+SAVE_INTERVAL_SECONDS = 30
+
+
+class SourceRanker:
+    """按接口类型对数据源排序"""
+
+    def __init__(self, path=SOURCE_RANKING_FILE, alpha=EWMA_ALPHA):
+        """
+        初始化排序器
+
+        Args:
+            path: 持久化文件路径，为None时不持久化
+            alpha: 指数加权平滑系数
+        """
+        self.path = path
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        # endpoint -> source -> {"latency", "error_rate", "count", "updated_at"}
+        self._stats = self._load()
+        self._dirty = False
+        self._last_save = time.time()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[数据源排序] 读取排序记录失败: {e}")
+            return {}
+
+    def save(self):
+        """将排序记录写入缓存目录"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self._stats, ensure_ascii=False, indent=2)
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(snapshot)
+            os.replace(tmp_file, self.path)
+        except Exception as e:
+            print(f"[数据源排序] 保存排序记录失败: {e}")
+
+    def record(self, endpoint, source, latency, success):
+        """
+        记录一次调用结果
+
+        Args:
+            endpoint: 接口类型，如 "price_history"
+            source: 数据源名称
+            latency: 耗时（秒）
+            success: 是否成功返回有效数据
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {}).get(source)
+            if stats is None:
+                stats = {"latency": latency, "error_rate": 0.0 if success else 1.0, "count": 0}
+            else:
+                error_rate = self._decayed_error_rate(stats, now)
+                stats["latency"] += self.alpha * (latency - stats["latency"])
+                stats["error_rate"] = error_rate + self.alpha * ((0.0 if success else 1.0) - error_rate)
+            stats["count"] += 1
+            stats["updated_at"] = now
+            self._stats[endpoint][source] = stats
+            self._dirty = True
+            should_save = now - self._last_save >= SAVE_INTERVAL_SECONDS
+
+        if should_save:
+            self.save()
+
+    @staticmethod
+    def _decayed_error_rate(stats, now):
+        age = max(now - stats.get("updated_at", now), 0)
+        return stats["error_rate"] * 0.5 ** (age / ERROR_HALF_LIFE_SECONDS)
+
+    def score(self, endpoint, source):
+        """
+        数据源的预期成本（秒），越小越优先
+
+        预期成本 = 平均耗时 + 错误率 × 失败惩罚
+        """
+        with self._lock:
+            stats = self._stats.get(endpoint, {}).get(source)
+            if stats is None:
+                return DEFAULT_LATENCY
+            return stats["latency"] + self._decayed_error_rate(stats, time.time()) * FAILURE_PENALTY_SECONDS
+
+    def rank(self, endpoint, sources):
+        """
+        按预期成本对数据源排序，成本相同时保持原有顺序
+
+        Args:
+            endpoint: 接口类型
+            sources: [(数据源名称, 获取函数), ...]
+
+        Returns:
+            list: 排序后的数据源列表
+        """
+        order = {name: i for i, (name, _) in enumerate(sources)}
+        return sorted(sources, key=lambda item: (self.score(endpoint, item[0]), order[item[0]]))
+
+    def hedge_delay(self, endpoint, sources, minimum=0.2):
+        """
+        建议的对冲延迟：排名第一的数据源的平均耗时，超过该时间仍未返回时再启动下一个数据源
+
+        Returns:
+            float: 延迟秒数
+        """
+        if not sources:
+            return minimum
+        with self._lock:
+            stats = self._stats.get(endpoint, {}).get(sources[0][0])
+        if stats is None:
+            return minimum
+        return max(stats["latency"], minimum)
+
+    def timed(self, endpoint, source, func, is_valid=None):
+        """
+        包装数据获取函数，自动记录耗时和成败
+
+        Args:
+            endpoint: 接口类型
+            source: 数据源名称
+            func: 数据获取函数
+            is_valid: 结果校验函数，默认要求结果不为None且不为空
+
+        Returns:
+            包装后的函数
+        """
+        is_valid = is_valid or _default_is_valid
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.record(endpoint, source, time.time() - start_time, False)
+                raise
+            self.record(endpoint, source, time.time() - start_time, is_valid(result))
+            return result
+
+        return wrapper
+
+    def stats(self):
+        """返回当前的排序记录"""
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+
+def _default_is_valid(result):
+    if result is None:
+        return False
+    empty = getattr(result, "empty", None)
+    if isinstance(empty, bool):
+        return not empty
+    if isinstance(result, (list, tuple, dict)):
+        return bool(result) and not (isinstance(result, list) and not result[0])
+    return True
+
+
+def rank_sources(endpoint, sources, is_valid=None):
+    """
+    对数据源排序，并包装获取函数以记录耗时和成败
+
+    Args:
+        endpoint: 接口类型
+        sources: [(数据源名称, 获取函数), ...]
+        is_valid: 结果校验函数
+
+    Returns:
+        list: 排序并包装后的 [(数据源名称, 获取函数), ...]
+    """
+    ranked = source_ranker.rank(endpoint, sources)
+    return [(name, source_ranker.timed(endpoint, name, func, is_valid)) for name, func in ranked]
+
+
+# 全局数据源排序器
+source_ranker = SourceRanker()
+atexit.register(source_ranker.save)
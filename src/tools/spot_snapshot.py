@@ -0,0 +1,233 @@
+"""
+全市场实时行情快照
+
+ak.stock_zh_a_spot_em() 每次都会下载全部A股（约5000行）的行情，
+这里在进程内只保留一份快照：
+- 每个TTL周期内最多刷新一次
+- 多个线程同时需要刷新时，只有一个线程真正发起请求，其余线程等待其结果
+- 按股票代码建立索引，单只股票查询为O(1)
+- 全局快照同时写入缓存管理器的 spot_snapshot 命名空间（本地磁盘），其他进程在有效期内直接读取，
+  不必各自重新下载；盘前预热（cache_warmer.py）写入的快照一直有效到开盘
+- 每次查询按股票代码记录到缓存统计（cache_metrics.py）的 spot_lookup 命名空间：进程内快照命中、
+  读取其他进程保存的快照、重新下载（含耗时）或下载失败时返回旧快照
+"""
+
+import threading
+import time
+
+import akshare as ak
+import pandas as pd
+
+from src.tools.cache_manager import cache_manager
+from src.tools.cache_metrics import cache_metrics
+
+# 快照有效期（秒）
+SPOT_SNAPSHOT_TTL = 60
+# 刷新失败后，在此时间内不再重试（秒）
+SPOT_RETRY_INTERVAL = 10
+# 持久化快照在缓存管理器中的命名空间和键
+SPOT_NAMESPACE = "spot_snapshot"
+SPOT_KEY = "all"
+# 查询记录在缓存统计中的命名空间
+SPOT_METRICS_NAMESPACE = "spot_lookup"
+
+
+class SpotSnapshot:
+    """进程内共享的全市场行情快照"""
+
+    def __init__(self, fetch_func=None, ttl=SPOT_SNAPSHOT_TTL, code_column="代码", cache=None, metrics=None):
+        """
+        初始化行情快照
+
+        Args:
+            fetch_func: 获取全市场行情的函数，默认为 ak.stock_zh_a_spot_em
+            ttl: 快照有效期（秒）
+            code_column: 股票代码列名
+            cache: 跨进程共享快照的缓存管理器，为None时只保存在进程内
+            metrics: 记录查询命中情况的缓存统计（CacheMetrics），为None时不记录
+        """
+        # 在调用时再查找 akshare 函数，使 akshare_config 中的补丁生效
+        self._fetch_func = fetch_func or (lambda: ak.stock_zh_a_spot_em())
+        self.ttl = ttl
+        self.code_column = code_column
+        self.cache = cache
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._inflight = None  # 正在进行的刷新（threading.Event）
+        self._table = pd.DataFrame()
+        self._index = {}
+        self._fetched_at = 0.0
+        self._last_error = None
+        self._retry_after = 0.0
+        # 从持久化快照加载时使用其剩余有效期
+        self.ttl_override = None
+
+        # 统计信息
+        self.refresh_count = 0
+        self.lookup_count = 0
+
+    def _is_fresh(self):
+        ttl = self.ttl if self.ttl_override is None else self.ttl_override
+        return bool(self._index) and time.time() - self._fetched_at < ttl
+
+    def _load(self, table, fetched_at):
+        codes = table[self.code_column].astype(str).tolist()
+        index = dict(zip(codes, table.to_dict("records")))
+        with self._lock:
+            self._table = table
+            self._index = index
+            self._fetched_at = fetched_at
+            self._last_error = None
+        return index
+
+    def _load_persisted(self):
+        """读取其他进程保存的快照，成功时返回True"""
+        table = self.cache.get(SPOT_NAMESPACE, SPOT_KEY)
+        if table is None or table.empty or self.code_column not in table.columns:
+            return False
+        expires_at = self.cache.expires_at(SPOT_NAMESPACE, SPOT_KEY)
+        remaining = (expires_at.timestamp() - time.time()) if expires_at else 0
+        # 进程内按剩余有效期计算，盘前保存的快照在开盘前一直有效
+        self.ttl_override = max(remaining, 0)
+        self._load(table, time.time())
+        return True
+
+    def _refresh(self, force=False, persist_ttl=None):
+        """
+        刷新快照，同一时刻只有一个线程发起请求
+
+        Returns:
+            tuple: (结果, 下载耗时)，结果为 "fresh"（快照仍有效）、"persisted"（读取其他进程保存的快照）、
+                   "fetched"（重新下载）、"shared"（等待其他线程的下载）或 "failed"（下载失败或在重试间隔内）
+        """
+        with self._lock:
+            if not force and self._is_fresh():
+                return "fresh", 0.0
+            if not force and time.time() < self._retry_after:
+                return "failed", 0.0
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = threading.Event()
+
+        if not leader:
+            # 等待正在进行的刷新完成，直接共享其结果
+            event.wait()
+            return "shared", 0.0
+
+        start_time = time.time()
+        try:
+            if self.cache is not None and not force and self._load_persisted():
+                return "persisted", 0.0
+
+            table = self._fetch_func()
+            if table is None or table.empty or self.code_column not in table.columns:
+                raise ValueError("行情快照为空")
+
+            index = self._load(table, time.time())
+            self.ttl_override = persist_ttl
+            with self._lock:
+                self.refresh_count += 1
+            if self.cache is not None:
+                self.cache.set(SPOT_NAMESPACE, SPOT_KEY, table, ttl=persist_ttl or self.ttl)
+            print(f"[行情快照] 刷新全市场行情，共 {len(index)} 只股票，耗时 {time.time() - start_time:.2f} 秒")
+            return "fetched", time.time() - start_time
+        except Exception as e:
+            self._last_error = e
+            self._retry_after = time.time() + min(self.ttl, SPOT_RETRY_INTERVAL)
+            print(f"[行情快照] 刷新全市场行情失败: {e}")
+            return "failed", 0.0
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+
+    def _record(self, key, outcome, seconds):
+        """把一次查询记录到缓存统计"""
+        if self.metrics is None:
+            return
+        if outcome in ("fresh", "persisted"):
+            self.metrics.record_hit(SPOT_METRICS_NAMESPACE, key, "memory" if outcome == "fresh" else "disk")
+        elif outcome == "failed" and self._index:
+            self.metrics.record_stale(SPOT_METRICS_NAMESPACE, key)
+        else:
+            self.metrics.record_miss(SPOT_METRICS_NAMESPACE, key)
+            if outcome == "fetched":
+                self.metrics.record_fetch(SPOT_METRICS_NAMESPACE, key, seconds)
+
+    def table(self):
+        """
+        获取全市场行情表
+
+        Returns:
+            DataFrame: 行情表；刷新失败时返回上一份快照（可能为空）
+        """
+        self._record(SPOT_KEY, *self._refresh())
+        return self._table
+
+    def get(self, symbol, raise_on_error=False):
+        """
+        按股票代码查询行情
+
+        Args:
+            symbol: 股票代码，如 "600519"
+            raise_on_error: 快照刷新失败时是否抛出异常，而不是返回上一份快照中的记录；
+                            作为数据源被熔断器包装时设为True，使上游故障计为失败
+
+        Returns:
+            dict: 该股票的行情记录，找不到或快照不可用时返回None
+        """
+        self._record(str(symbol), *self._refresh())
+        self.lookup_count += 1
+        if raise_on_error and self._last_error is not None:
+            raise RuntimeError(f"行情快照不可用: {self._last_error}")
+        return self._index.get(str(symbol))
+
+    def get_many(self, symbols):
+        """
+        批量查询行情，只需要一次快照下载
+
+        Returns:
+            dict: 股票代码到行情记录的映射，找不到的股票不包含在结果中
+        """
+        self._record(SPOT_KEY, *self._refresh())
+        self.lookup_count += len(symbols)
+        return {symbol: self._index[str(symbol)] for symbol in symbols if str(symbol) in self._index}
+
+    def refresh(self, persist_ttl=None):
+        """
+        立即重新下载快照
+
+        Args:
+            persist_ttl: 快照的有效期（秒），默认为 ttl；盘前预热时设为距开盘的时间
+
+        Returns:
+            bool: 是否刷新成功
+        """
+        self._refresh(force=True, persist_ttl=persist_ttl)
+        return self._last_error is None
+
+    def invalidate(self):
+        """使当前快照（包括持久化的快照）失效，下次查询时重新下载"""
+        with self._lock:
+            self._fetched_at = 0.0
+            self._retry_after = 0.0
+            self.ttl_override = None
+        if self.cache is not None:
+            self.cache.delete(SPOT_NAMESPACE, SPOT_KEY)
+
+    def stats(self):
+        """返回快照统计信息"""
+        return {
+            "rows": len(self._index),
+            "age_seconds": round(time.time() - self._fetched_at, 1) if self._fetched_at else None,
+            "ttl": self.ttl,
+            "refresh_count": self.refresh_count,
+            "lookup_count": self.lookup_count,
+            "last_error": str(self._last_error) if self._last_error else None,
+        }
+
+
+# 全局行情快照实例
+spot_snapshot = SpotSnapshot(cache=cache_manager, metrics=cache_metrics)
@@ -0,0 +1,127 @@
+"""
+股票代码/名称索引
+
+由 ak.stock_info_a_code_name() 的结果一次性构建，构建后不再修改：
+- 按代码、按名称的字典查询
+- 基于有序数组的前缀搜索（代码、名称、拼音首字母、全拼），用于界面自动补全
+
+拼音搜索依赖可选的 pypinyin 包，未安装时只支持代码和名称搜索。
+"""
+
+import re
+from bisect import bisect_left
+
+try:
+    from pypinyin import lazy_pinyin, Style
+    PINYIN_AVAILABLE = True
+except ImportError:
+    PINYIN_AVAILABLE = False
+
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize_name(name):
+    """去掉名称中的空白（部分名称如“万  科Ａ”带有空格），英文统一为小写"""
+    return _SPACES.sub("", str(name)).lower()
+
+
+def _pinyin_keys(name):
+    """返回名称的拼音首字母和全拼，例如 贵州茅台 -> ("gzmt", "guizhoumaotai")"""
+    if not PINYIN_AVAILABLE:
+        return ()
+    syllables = lazy_pinyin(name, errors="default")
+    initials = lazy_pinyin(name, style=Style.FIRST_LETTER, errors="default")
+    return ("".join(initials).lower(), "".join(syllables).lower())
+
+
+class StockIndex:
+    """不可变的股票代码/名称索引"""
+
+    __slots__ = ("_codes", "_names", "_by_code", "_by_name", "_prefix_keys", "_prefix_rows")
+
+    def __init__(self, codes, names):
+        """
+        构建索引
+
+        Args:
+            codes: 股票代码序列
+            names: 与代码一一对应的股票名称序列
+        """
+        codes = tuple(str(code) for code in codes)
+        names = tuple(str(name) for name in names)
+
+        by_code = {}
+        by_name = {}
+        prefix_entries = []
+        for row, (code, name) in enumerate(zip(codes, names)):
+            by_code[code] = row
+            normalized = _normalize_name(name)
+            by_name.setdefault(normalized, row)
+
+            prefix_entries.append((code, row))
+            prefix_entries.append((normalized, row))
+            for key in _pinyin_keys(normalized):
+                prefix_entries.append((key, row))
+
+        prefix_entries.sort()
+        self._codes = codes
+        self._names = names
+        self._by_code = by_code
+        self._by_name = by_name
+        self._prefix_keys = tuple(key for key, _ in prefix_entries)
+        self._prefix_rows = tuple(row for _, row in prefix_entries)
+
+    @classmethod
+    def from_dataframe(cls, df, code_column="code", name_column="name"):
+        """从 stock_info_a_code_name 返回的DataFrame构建索引"""
+        if df is None or df.empty:
+            return cls((), ())
+        return cls(df[code_column].astype(str).tolist(), df[name_column].astype(str).tolist())
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __contains__(self, code):
+        return str(code) in self._by_code
+
+    def name_of(self, code, default=None):
+        """按代码查询名称"""
+        row = self._by_code.get(str(code))
+        return default if row is None else self._names[row]
+
+    def code_of(self, name, default=None):
+        """按名称查询代码（忽略名称中的空白）"""
+        row = self._by_name.get(_normalize_name(name))
+        return default if row is None else self._codes[row]
+
+    def search(self, query, limit=10):
+        """
+        前缀搜索，支持代码、名称、拼音首字母和全拼
+
+        Args:
+            query: 搜索词，如 "600"、"贵州"、"gzmt"
+            limit: 最多返回的结果数
+
+        Returns:
+            list: [(代码, 名称), ...]，精确匹配的代码排在最前
+        """
+        prefix = _normalize_name(query)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        exact = self._by_code.get(prefix)
+        if exact is not None:
+            results.append((self._codes[exact], self._names[exact]))
+            seen.add(exact)
+
+        keys = self._prefix_keys
+        pos = bisect_left(keys, prefix)
+        while pos < len(keys) and len(results) < limit and keys[pos].startswith(prefix):
+            row = self._prefix_rows[pos]
+            if row not in seen:
+                seen.add(row)
+                results.append((self._codes[row], self._names[row]))
+            pos += 1
+        return results
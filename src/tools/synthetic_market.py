@@ -0,0 +1,659 @@
+"""
+合成A股市场数据
+
+为全市场规模的性能测试生成可复现的合成数据（N只股票 × M年），不需要网络：
+- 行情：带牛熊状态切换的几何布朗运动，个股收益 = β × 市场收益 + 特异收益（t分布厚尾）
+- 交易规则：主板±10%、创业板/科创板±20%、ST股±5%涨跌停，停牌期间没有K线，部分股票在区间内上市
+- 成交量、成交额、换手率、振幅
+- 分红送股及对应的复权因子，可输出不复权、前复权、后复权价格
+- 季度财务报表（年初至今累计口径）、财务指标，按披露日期生效
+- 与行情和财报相关的新闻
+
+数据以 akshare 接口的格式提供（见 akshare_handlers），通过 upstream_recorder 的 synthetic 模式
+替代真实的上游调用，get_price_history、get_financial_metrics、get_stock_news 等函数的缓存、
+合并、重试和指标计算逻辑照常运行，输出的格式与真实数据完全相同。
+
+同一个随机种子生成的数据完全相同；单只股票的数据在首次使用时生成，不会一次性占用全市场的内存。
+"""
+
+import math
+import hashlib
+import functools
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# 市场状态：牛市、熊市的年化收益率、年化波动率和每日维持概率
+REGIMES = {
+    "bull": {"mu": 0.20, "sigma": 0.18, "stay": 0.992},
+    "bear": {"mu": -0.25, "sigma": 0.32, "stay": 0.985},
+}
+# 每只股票每年停牌的平均次数
+SUSPENSIONS_PER_YEAR = 0.5
+# 单只股票行情的缓存数量
+SIMULATION_CACHE_SIZE = 256
+# 板块：(代码起始值, 可用代码数, 占全市场的比例)
+BOARDS = (
+    (600000, 6000, 0.30),  # 沪市主板
+    (1, 2000, 0.15),       # 深市主板
+    (2000, 2000, 0.20),    # 深市主板（原中小板）
+    (300000, 2000, 0.25),  # 创业板
+    (688000, 2000, 0.10),  # 科创板
+)
+
+# 季度报告累计口径下各季度收入占全年的比例
+_QUARTER_SHARES = (0.22, 0.25, 0.25, 0.28)
+# 季度报告的期末日期和披露日期（月, 日, 披露年份偏移）
+_REPORT_PERIODS = (
+    ((3, 31), (4, 25, 0)),
+    ((6, 30), (8, 25, 0)),
+    ((9, 30), (10, 25, 0)),
+    ((12, 31), (4, 20, 1)),
+)
+_NEWS_SOURCES = ("证券时报", "中国证券报", "上海证券报", "证券日报", "财联社", "每日经济新闻")
+
+
+def _trading_calendar(start, end):
+    """工作日减去主要节假日（元旦、春节附近一周、劳动节、国庆节）的近似交易日历"""
+    days = pd.bdate_range(start, end)
+    month, day = days.month, days.day
+    holiday = ((month == 1) & (day == 1)) | \
+              ((month == 2) & (day <= 7)) | \
+              ((month == 5) & (day <= 3)) | \
+              ((month == 10) & (day <= 7))
+    return days[~holiday]
+
+
+def _limit_of(code, name):
+    """涨跌停幅度"""
+    if "ST" in name:
+        return 0.05
+    if code.startswith(("300", "301", "688", "689")):
+        return 0.20
+    return 0.10
+
+
+def _prefixed(code):
+    return f"{'sh' if code.startswith(('6', '9')) else 'sz'}{code}"
+
+
+def _strip_prefix(symbol):
+    symbol = str(symbol)
+    return symbol[2:] if symbol[:2] in ("sh", "sz", "bj") else symbol
+
+
+def _parse_date(value, default):
+    if value is None or value == "":
+        return default
+    return pd.Timestamp(str(value).replace("-", ""))
+
+
+class SyntheticMarket:
+    """可复现的合成A股市场"""
+
+    def __init__(self, n_tickers=100, years=10, end_date=None, seed=42):
+        """
+        初始化合成市场
+
+        Args:
+            n_tickers: 股票数量
+            years: 行情年数
+            end_date: 最后一个交易日，默认为昨天
+            seed: 随机种子
+        """
+        self.n_tickers = n_tickers
+        self.years = years
+        self.seed = seed
+        end = pd.Timestamp(end_date or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")).normalize()
+        self.calendar = _trading_calendar(end - pd.DateOffset(years=years), end)
+        self.end_date = self.calendar[-1]
+        self._years = self.calendar.year.to_numpy()
+        self._ex_months = np.isin(self.calendar.month.to_numpy(), (6, 7))
+
+        rng = np.random.default_rng([seed, 0])
+        self.codes, self.names = self._make_universe(rng)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.regimes, self.market_returns = self._simulate_market(rng)
+
+        self._spot = None
+        self._spot_lock = threading.Lock()
+        # 按实例缓存单只股票的模拟结果
+        self._simulate = functools.lru_cache(maxsize=SIMULATION_CACHE_SIZE)(self._simulate_uncached)
+        self._financials = functools.lru_cache(maxsize=SIMULATION_CACHE_SIZE)(self._financials_uncached)
+
+    # ------------------------------------------------------------------
+    # 股票列表和市场
+    # ------------------------------------------------------------------
+
+    def _make_universe(self, rng):
+        """生成股票代码和名称，板块比例接近真实市场"""
+        capacity = sum(size for _, size, _ in BOARDS)
+        if self.n_tickers > capacity:
+            raise ValueError(f"合成市场最多支持 {capacity} 只股票")
+        choices = rng.choice(len(BOARDS), size=self.n_tickers, p=[share for _, _, share in BOARDS])
+        used = [0] * len(BOARDS)
+        codes, names = [], []
+        for i, board in enumerate(choices):
+            # 板块代码用完时放入下一个有空余的板块
+            while used[board] >= BOARDS[board][1]:
+                board = (board + 1) % len(BOARDS)
+            codes.append(f"{BOARDS[board][0] + used[board]:06d}")
+            used[board] += 1
+            name = f"合成{i:04d}"
+            if rng.random() < 0.03:
+                name = f"ST{name}"
+            names.append(name)
+        return tuple(codes), tuple(names)
+
+    def _simulate_market(self, rng):
+        """生成市场状态路径和市场日收益率"""
+        n = len(self.calendar)
+        regimes = np.empty(n, dtype=np.int8)
+        state = 0
+        stay = np.array([REGIMES["bull"]["stay"], REGIMES["bear"]["stay"]])
+        draws = rng.random(n)
+        for t in range(n):
+            if draws[t] > stay[state]:
+                state = 1 - state
+            regimes[t] = state
+        mu = np.array([REGIMES["bull"]["mu"], REGIMES["bear"]["mu"]])[regimes] / 252
+        sigma = np.array([REGIMES["bull"]["sigma"], REGIMES["bear"]["sigma"]])[regimes] / math.sqrt(252)
+        return regimes, mu + sigma * rng.standard_normal(n)
+
+    def _index_of(self, symbol):
+        code = _strip_prefix(symbol)
+        if code not in self._index:
+            raise KeyError(f"合成市场中没有股票 {symbol}")
+        return self._index[code]
+
+    # ------------------------------------------------------------------
+    # 行情
+    # ------------------------------------------------------------------
+
+    def _simulate_uncached(self, index):
+        """模拟单只股票的不复权日线和后复权因子"""
+        rng = np.random.default_rng([self.seed, 1, index])
+        code, name = self.codes[index], self.names[index]
+        n = len(self.calendar)
+        limit = _limit_of(code, name)
+
+        beta = rng.uniform(0.6, 1.4)
+        idio_sigma = rng.uniform(0.15, 0.45) / math.sqrt(252)
+        drift = rng.normal(0.02, 0.06) / 252
+        # 自由度为4的t分布方差为2，缩放到单位方差
+        returns = drift + beta * self.market_returns + idio_sigma * rng.standard_t(4, n) / math.sqrt(2)
+        open_noise = rng.normal(0, 0.3, n)
+        range_noise = np.abs(rng.normal(0, idio_sigma, (2, n)))
+        volume_noise = rng.lognormal(0, 0.35, n)
+
+        total_shares = float(rng.lognormal(math.log(8e8), 1.0))
+        float_shares = total_shares * rng.uniform(0.3, 1.0)
+        base_turnover = rng.uniform(0.005, 0.03)
+
+        # 约三成股票在区间内上市
+        listed_at = int(rng.integers(0, n // 2)) if rng.random() < 0.3 else 0
+
+        # 停牌区间
+        active = np.zeros(n, dtype=bool)
+        active[listed_at:] = True
+        for _ in range(rng.poisson(SUSPENSIONS_PER_YEAR * self.years)):
+            start = int(rng.integers(listed_at, n))
+            active[start:start + int(rng.geometric(0.2))] = False
+        active[listed_at] = True
+
+        # 每年6~7月除权除息，部分年份送转股
+        ex_events = {}
+        for year in np.unique(self._years):
+            if rng.random() < 0.7:
+                candidates = np.flatnonzero((self._years == year) & self._ex_months & active)
+                candidates = candidates[candidates > listed_at]
+                if len(candidates):
+                    t = int(rng.choice(candidates))
+                    bonus = float(rng.choice([0.0, 0.3, 0.5], p=[0.85, 0.1, 0.05]))
+                    ex_events[t] = (float(rng.uniform(0.005, 0.03)), bonus)
+
+        rows = np.flatnonzero(active)
+        r = returns[rows]
+        # 除权除息日的参考价 = 前收盘价 × (1 - 股息率) / (1 + 送转比例)
+        ex_ratio = np.ones(len(rows))
+        for k in np.flatnonzero(np.isin(rows, list(ex_events))):
+            dividend_yield, bonus = ex_events[int(rows[k])]
+            ex_ratio[k] = (1 - dividend_yield) / (1 + bonus)
+
+        # 涨跌停按参考价计算，先在收益率上截断，再用四舍五入后的前收盘价校正到涨跌停价以内
+        r = np.clip(r, math.log(1 - limit), math.log(1 + limit))
+        first_price = float(np.clip(rng.lognormal(math.log(15), 0.8), 2, 300))
+        close = np.maximum(np.round(first_price * np.cumprod(ex_ratio * np.exp(r)), 2), 0.01)
+        pre_close = np.round(np.concatenate(([first_price], close[:-1])) * ex_ratio, 2)
+        up = np.round(pre_close * (1 + limit), 2)
+        down = np.maximum(np.round(pre_close * (1 - limit), 2), 0.01)
+        close = np.clip(close, down, up)
+
+        open_ = np.clip(np.round(pre_close * np.exp(r * open_noise[rows]), 2), down, up)
+        high = np.minimum(np.round(np.maximum(open_, close) * (1 + range_noise[0, rows]), 2), up)
+        low = np.maximum(np.round(np.minimum(open_, close) * (1 - range_noise[1, rows]), 2), down)
+
+        turnover = base_turnover * volume_noise[rows] * (1 + 8 * np.abs(close / pre_close - 1))
+        # 一字涨跌停时几乎没有成交
+        turnover = np.where(high == low, turnover * 0.1, turnover)
+        volume = np.maximum(np.round(float_shares * turnover / 100), 1)
+
+        # 后复权因子：每次除权除息后乘以 前收盘价 / 参考价
+        hfq_factor = np.cumprod(1 / ex_ratio)
+
+        return {
+            "dates": self.calendar[rows],
+            "open": open_, "high": high, "low": low, "close": close,
+            "volume": volume, "pre_close": pre_close, "hfq_factor": hfq_factor,
+            "total_shares": total_shares, "float_shares": float_shares,
+            "ex_events": {self.calendar[t]: event for t, event in ex_events.items()},
+        }
+
+    def bars(self, symbol, start_date=None, end_date=None, adjust=""):
+        """
+        日线行情，列名与 get_price_history 使用的K线列相同
+
+        Args:
+            symbol: 股票代码
+            start_date: 开始日期，YYYYMMDD 或 YYYY-MM-DD
+            end_date: 结束日期
+            adjust: ""（不复权）、"qfq"（前复权）、"hfq"（后复权）
+
+        Returns:
+            DataFrame: date, open, high, low, close, volume, amount, amplitude, pct_change, change_amount, turnover
+        """
+        sim = self._simulate(self._index_of(symbol))
+        scale = np.ones(len(sim["dates"]))
+        if adjust == "hfq":
+            scale = sim["hfq_factor"]
+        elif adjust == "qfq":
+            scale = sim["hfq_factor"] / sim["hfq_factor"][-1]
+
+        pre_close = sim["pre_close"]
+        df = pd.DataFrame({
+            "date": sim["dates"],
+            "open": np.round(sim["open"] * scale, 2),
+            "high": np.round(sim["high"] * scale, 2),
+            "low": np.round(sim["low"] * scale, 2),
+            "close": np.round(sim["close"] * scale, 2),
+            # 成交量单位为手
+            "volume": sim["volume"],
+            "amount": np.round(sim["volume"] * 100 * (sim["open"] + sim["high"] + sim["low"] + sim["close"]) / 4, 2),
+            "amplitude": np.round((sim["high"] - sim["low"]) / pre_close * 100, 2),
+            "pct_change": np.round((sim["close"] - pre_close) / pre_close * 100, 2),
+            "change_amount": np.round((sim["close"] - pre_close) * scale, 2),
+            "turnover": np.round(sim["volume"] * 100 / sim["float_shares"] * 100, 2),
+        })
+        start = _parse_date(start_date, self.calendar[0])
+        end = _parse_date(end_date, self.end_date)
+        return df[(df["date"] >= start) & (df["date"] <= end)].reset_index(drop=True)
+
+    def adjustment_factors(self, symbol):
+        """
+        复权因子
+
+        Returns:
+            DataFrame: date, hfq_factor, qfq_factor（不复权价格 × 因子 = 复权价格）
+        """
+        sim = self._simulate(self._index_of(symbol))
+        return pd.DataFrame({
+            "date": sim["dates"],
+            "hfq_factor": sim["hfq_factor"],
+            "qfq_factor": sim["hfq_factor"] / sim["hfq_factor"][-1],
+        })
+
+    def price_history(self, symbol, start_date=None, end_date=None, adjust="qfq"):
+        """与 get_price_history 相同的K线数据（不含技术指标）"""
+        return self.bars(symbol, start_date, end_date, adjust)
+
+    # ------------------------------------------------------------------
+    # 财务数据
+    # ------------------------------------------------------------------
+
+    def _financials_uncached(self, index):
+        """模拟单只股票的季度财务数据（累计口径），按报告期从新到旧排列"""
+        rng = np.random.default_rng([self.seed, 2, index])
+        sim = self._simulate(index)
+        shares = sim["total_shares"]
+        first_year = self.calendar[0].year - 1
+        last_year = self.end_date.year
+
+        revenue = shares * float(sim["close"][0]) * rng.uniform(0.2, 1.5)
+        op_margin = rng.uniform(0.03, 0.30)
+        equity = revenue * rng.uniform(0.5, 2.0)
+        leverage = rng.uniform(0.2, 0.7)
+
+        n_years = last_year - first_year + 1
+        year_draws = rng.normal((0.08, 0.0), (0.15, 0.02), (n_years, 2))
+        # 逐个抽取标量随机数太慢，按季度一次抽取：[发布日偏移, 营收, 净利率, 流动资产, 流动负债, 经营现金流, 资本开支, 折旧]
+        lows = np.array([-10, 0.9, 0.7, 0.3, 0.4, 0.6, 0.02, 0.4])
+        highs = np.array([5, 1.1, 0.85, 0.6, 0.8, 1.4, 0.10, 0.9])
+        quarter_draws = lows + (highs - lows) * rng.random((n_years, len(_REPORT_PERIODS), len(lows)))
+
+        reports = []
+        previous_year = {}
+        for y, year in enumerate(range(first_year, last_year + 1)):
+            growth, margin_change = year_draws[y]
+            revenue *= 1 + growth
+            op_margin = min(max(op_margin + margin_change, -0.10), 0.45)
+            cumulative = 0.0
+            for quarter, ((month, day), (pub_month, pub_day, pub_offset)) in enumerate(_REPORT_PERIODS):
+                (pub_shift, revenue_noise, net_ratio, current_asset_ratio, current_liability_ratio,
+                 cash_ratio, capex_ratio, depreciation_ratio) = quarter_draws[y, quarter]
+                period = pd.Timestamp(year, month, day)
+                published = pd.Timestamp(year + pub_offset, pub_month, pub_day) + pd.Timedelta(days=int(pub_shift))
+                if published > self.end_date:
+                    continue
+
+                cumulative += revenue * _QUARTER_SHARES[quarter] * revenue_noise
+                operating_profit = cumulative * op_margin
+                net_income = operating_profit * net_ratio
+                equity *= 1 + net_income / max(equity, 1) * 0.25
+                total_assets = equity / (1 - leverage)
+                current_assets = total_assets * current_asset_ratio
+                current_liabilities = total_assets * leverage * current_liability_ratio
+                operating_cash = net_income * cash_ratio
+                capex = cumulative * capex_ratio
+                depreciation = capex * depreciation_ratio
+
+                last = previous_year.get(quarter)
+                report = {
+                    "period": period,
+                    "published": published,
+                    "revenue": cumulative,
+                    "operating_profit": operating_profit,
+                    "net_income": net_income,
+                    "total_assets": total_assets,
+                    "total_liabilities": total_assets - equity,
+                    "equity": equity,
+                    "current_assets": current_assets,
+                    "current_liabilities": current_liabilities,
+                    "operating_cash": operating_cash,
+                    "capex": capex,
+                    "depreciation": depreciation,
+                    "shares": shares,
+                    "revenue_growth": cumulative / last["revenue"] - 1 if last else 0.0,
+                    "earnings_growth": net_income / last["net_income"] - 1 if last and last["net_income"] else 0.0,
+                    "equity_growth": equity / last["equity"] - 1 if last else 0.0,
+                }
+                previous_year[quarter] = report
+                reports.append(report)
+
+        reports.sort(key=lambda r: r["period"], reverse=True)
+        return reports
+
+    def financial_reports(self, symbol, as_of=None):
+        """截至 as_of 已披露的季度财务数据，从新到旧排列"""
+        as_of = pd.Timestamp(as_of) if as_of is not None else self.end_date
+        return [r for r in self._financials(self._index_of(symbol)) if r["published"] <= as_of]
+
+    def financial_metrics(self, symbol):
+        """与 get_financial_metrics 格式相同的财务指标"""
+        reports = self.financial_reports(symbol)
+        if not reports:
+            return [{}]
+        latest = reports[0]
+        spot = self.spot_row(symbol)
+        annualize = 4 / (latest["period"].quarter)
+        return [{
+            "market_cap": spot["总市值"],
+            "float_market_cap": spot["流通市值"],
+            "return_on_equity": latest["net_income"] * annualize / latest["equity"],
+            "net_margin": latest["net_income"] / latest["revenue"],
+            "operating_margin": latest["operating_profit"] / latest["revenue"],
+            "revenue_growth": latest["revenue_growth"],
+            "earnings_growth": latest["earnings_growth"],
+            "book_value_growth": latest["equity_growth"],
+            "current_ratio": latest["current_assets"] / latest["current_liabilities"],
+            "debt_to_equity": latest["total_liabilities"] / latest["total_assets"],
+            "free_cash_flow_per_share": latest["operating_cash"] / latest["shares"],
+            "earnings_per_share": latest["net_income"] / latest["shares"],
+            "pe_ratio": spot["市盈率-动态"],
+            "price_to_book": spot["市净率"],
+            "price_to_sales": spot["总市值"] / latest["revenue"] if latest["revenue"] > 0 else 0,
+            "data_date": latest["period"].strftime("%Y-%m-%d"),
+            "expected_latest_date": datetime.now().strftime("%Y-%m-%d"),
+        }]
+
+    def financial_indicator_frame(self, symbol, start_year=None):
+        """stock_financial_analysis_indicator 格式的财务指标"""
+        rows = []
+        for r in self.financial_reports(symbol):
+            if start_year and r["period"].year < int(start_year):
+                continue
+            annualize = 4 / r["period"].quarter
+            rows.append({
+                "日期": r["period"].date(),
+                "加权每股收益(元)": round(r["net_income"] / r["shares"], 4),
+                "每股经营性现金流(元)": round(r["operating_cash"] / r["shares"], 4),
+                "净资产收益率(%)": round(r["net_income"] * annualize / r["equity"] * 100, 2),
+                "销售净利率(%)": round(r["net_income"] / r["revenue"] * 100, 2),
+                "营业利润率(%)": round(r["operating_profit"] / r["revenue"] * 100, 2),
+                "主营业务收入增长率(%)": round(r["revenue_growth"] * 100, 2),
+                "净利润增长率(%)": round(r["earnings_growth"] * 100, 2),
+                "净资产增长率(%)": round(r["equity_growth"] * 100, 2),
+                "流动比率": round(r["current_assets"] / r["current_liabilities"], 3),
+                "资产负债率(%)": round(r["total_liabilities"] / r["total_assets"] * 100, 2),
+                "主营业务收入": round(r["revenue"], 2),
+            })
+        return pd.DataFrame(rows)
+
+    def financial_report_frame(self, symbol, statement):
+        """stock_financial_report_sina 格式的财务报表（资产负债表、利润表、现金流量表）"""
+        columns = {
+            "资产负债表": lambda r: {
+                "流动资产合计": r["current_assets"],
+                "资产总计": r["total_assets"],
+                "流动负债合计": r["current_liabilities"],
+                "负债合计": r["total_liabilities"],
+                "所有者权益(或股东权益)合计": r["equity"],
+            },
+            "利润表": lambda r: {
+                "营业总收入": r["revenue"],
+                "营业利润": r["operating_profit"],
+                "净利润": r["net_income"],
+            },
+            "现金流量表": lambda r: {
+                "经营活动产生的现金流量净额": r["operating_cash"],
+                "购建固定资产、无形资产和其他长期资产支付的现金": r["capex"],
+                "固定资产折旧、油气资产折耗、生产性生物资产折旧": r["depreciation"],
+            },
+        }
+        if statement not in columns:
+            raise ValueError(f"不支持的报表类型: {statement}")
+        rows = []
+        for r in self.financial_reports(symbol):
+            row = {"报告日": r["period"].strftime("%Y%m%d")}
+            row.update({k: round(v, 2) for k, v in columns[statement](r).items()})
+            row["公告日期"] = r["published"].strftime("%Y%m%d")
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    # ------------------------------------------------------------------
+    # 实时行情快照
+    # ------------------------------------------------------------------
+
+    def _spot_row_of(self, index):
+        sim = self._simulate(index)
+        code, name = self.codes[index], self.names[index]
+        close, pre_close = float(sim["close"][-1]), float(sim["pre_close"][-1])
+        suspended = sim["dates"][-1] != self.end_date
+        reports = [r for r in self._financials(index) if r["published"] <= self.end_date]
+        annual_earnings = reports[0]["net_income"] * 4 / reports[0]["period"].quarter if reports else 0.0
+        equity = reports[0]["equity"] if reports else 0.0
+        market_cap = close * sim["total_shares"]
+        days_ago = max(len(sim["close"]) - 61, 0)
+        year_start = int(np.searchsorted(sim["dates"], pd.Timestamp(self.end_date.year, 1, 1)))
+        return {
+            "代码": code,
+            "名称": name,
+            "最新价": close,
+            "涨跌幅": 0.0 if suspended else round((close - pre_close) / pre_close * 100, 2),
+            "涨跌额": 0.0 if suspended else round(close - pre_close, 2),
+            "成交量": 0.0 if suspended else float(sim["volume"][-1]),
+            "成交额": 0.0 if suspended else round(float(sim["volume"][-1]) * 100 * close, 2),
+            "振幅": 0.0 if suspended else round((float(sim["high"][-1]) - float(sim["low"][-1])) / pre_close * 100, 2),
+            "最高": float(sim["high"][-1]),
+            "最低": float(sim["low"][-1]),
+            "今开": float(sim["open"][-1]),
+            "昨收": pre_close,
+            "量比": round(float(sim["volume"][-1] / max(sim["volume"][-6:-1].mean(), 1)), 2) if len(sim["volume"]) > 5 else 1.0,
+            "换手率": round(float(sim["volume"][-1]) * 100 / sim["float_shares"] * 100, 2),
+            "市盈率-动态": round(market_cap / annual_earnings, 2) if annual_earnings else 0.0,
+            "市净率": round(market_cap / equity, 2) if equity else 0.0,
+            "总市值": round(market_cap, 2),
+            "流通市值": round(close * sim["float_shares"], 2),
+            "涨速": 0.0,
+            "5分钟涨跌": 0.0,
+            "60日涨跌幅": round((close / float(sim["close"][days_ago]) - 1) * 100, 2),
+            "年初至今涨跌幅": round((close / float(sim["close"][min(year_start, len(sim["close"]) - 1)]) - 1) * 100, 2),
+        }
+
+    def spot_row(self, symbol):
+        """单只股票的实时行情（stock_zh_a_spot_em 的一行）"""
+        return self._spot_row_of(self._index_of(symbol))
+
+    def spot(self):
+        """全市场实时行情，格式与 stock_zh_a_spot_em 相同；首次调用需要模拟全部股票"""
+        with self._spot_lock:
+            if self._spot is None:
+                rows = [self._spot_row_of(i) for i in range(self.n_tickers)]
+                df = pd.DataFrame(rows)
+                df.insert(0, "序号", range(1, len(df) + 1))
+                self._spot = df
+            return self._spot.copy()
+
+    # ------------------------------------------------------------------
+    # 新闻
+    # ------------------------------------------------------------------
+
+    def stock_news(self, symbol, max_news=10):
+        """与 get_stock_news 格式相同的新闻列表，按发布时间从新到旧排列"""
+        df = self.news_frame(symbol).head(max_news)
+        return [{
+            "title": row["新闻标题"],
+            "content": row["新闻内容"],
+            "publish_time": row["发布时间"],
+            "source": row["文章来源"],
+            "url": row["新闻链接"],
+            "keyword": row["关键词"],
+        } for _, row in df.iterrows()]
+
+    def news_frame(self, symbol, limit=100):
+        """stock_news_em 格式的新闻，来自涨跌停、财报披露和除权除息事件"""
+        index = self._index_of(symbol)
+        code, name = self.codes[index], self.names[index]
+        sim = self._simulate(index)
+        limit_pct = _limit_of(code, name) * 100 - 0.5
+        pct = (sim["close"] - sim["pre_close"]) / sim["pre_close"] * 100
+
+        events = []
+        for t in np.flatnonzero(np.abs(pct) >= limit_pct)[-limit:]:
+            day = sim["dates"][t]
+            word = "涨停" if pct[t] > 0 else "跌停"
+            events.append((day + pd.Timedelta(hours=15, minutes=5),
+                           f"{name}（{code}）{word}，收报{sim['close'][t]:.2f}元",
+                           f"{day:%m月%d日}，{name}股价{word}，全天成交{sim['volume'][t]:.0f}手，换手率较前期明显变化。市场人士表示，短期资金关注度上升。"))
+        for r in self.financial_reports(symbol)[:8]:
+            label = {1: "一季度", 2: "半年度", 3: "三季度", 4: "年度"}[r["period"].quarter]
+            direction = "增长" if r["earnings_growth"] >= 0 else "下降"
+            events.append((r["published"] + pd.Timedelta(hours=18),
+                           f"{name}发布{r['period'].year}年{label}报告",
+                           f"{name}披露{r['period'].year}年{label}报告，实现营业总收入{r['revenue'] / 1e8:.2f}亿元，"
+                           f"归母净利润{r['net_income'] / 1e8:.2f}亿元，同比{direction}{abs(r['earnings_growth']) * 100:.1f}%。"))
+        for day, (dividend_yield, bonus) in sim["ex_events"].items():
+            bonus_text = f"，每10股转增{bonus * 10:.0f}股" if bonus else ""
+            events.append((day - pd.Timedelta(days=3) + pd.Timedelta(hours=19),
+                           f"{name}发布权益分派实施公告",
+                           f"{name}公告，本次权益分派股息率约{dividend_yield * 100:.2f}%{bonus_text}，除权除息日为{day:%Y-%m-%d}。"))
+
+        events = [e for e in events if e[0] <= self.end_date + pd.Timedelta(days=1)]
+        events.sort(key=lambda e: e[0], reverse=True)
+        rows = []
+        for when, title, content in events[:limit]:
+            digest = hashlib.md5(f"{code}{when}{title}".encode("utf-8")).hexdigest()[:12]
+            rows.append({
+                "关键词": code,
+                "新闻标题": title,
+                "新闻内容": content,
+                "发布时间": when.strftime("%Y-%m-%d %H:%M:%S"),
+                "文章来源": _NEWS_SOURCES[int(digest, 16) % len(_NEWS_SOURCES)],
+                "新闻链接": f"https://finance.example.com/news/{digest}.html",
+            })
+        return pd.DataFrame(rows, columns=["关键词", "新闻标题", "新闻内容", "发布时间", "文章来源", "新闻链接"])
+
+    # ------------------------------------------------------------------
+    # akshare 接口
+    # ------------------------------------------------------------------
+
+    def akshare_handlers(self):
+        """
+        返回 {akshare函数名: 合成实现}，参数和返回格式与 akshare 相同
+
+        未列出的函数（例如已经下线的网易接口）在 synthetic 模式下会失败，与真实情况一致。
+        """
+        def stock_zh_a_hist(symbol, period="daily", start_date="19700101", end_date="20500101", adjust="", **kwargs):
+            if period != "daily":
+                raise ValueError(f"合成市场只支持日线数据: {period}")
+            df = self.bars(symbol, start_date, end_date, adjust)
+            df.insert(1, "股票代码", _strip_prefix(symbol))
+            df["date"] = df["date"].dt.date
+            return df.rename(columns={
+                "date": "日期", "open": "开盘", "close": "收盘", "high": "最高", "low": "最低",
+                "volume": "成交量", "amount": "成交额", "amplitude": "振幅", "pct_change": "涨跌幅",
+                "change_amount": "涨跌额", "turnover": "换手率",
+            })[["日期", "股票代码", "开盘", "收盘", "最高", "最低", "成交量", "成交额", "振幅", "涨跌幅", "涨跌额", "换手率"]]
+
+        def stock_zh_a_daily(symbol, start_date="19900101", end_date="21000118", adjust=""):
+            if adjust in ("hfq-factor", "qfq-factor"):
+                factors = self.adjustment_factors(symbol)
+                column = adjust.replace("-", "_")
+                # 只保留因子变化的日期，与新浪接口一致
+                changed = factors[column].ne(factors[column].shift())
+                return factors.loc[changed, ["date", column]].iloc[::-1].reset_index(drop=True)
+            df = self.bars(symbol, start_date, end_date, adjust)
+            sim = self._simulate(self._index_of(symbol))
+            return pd.DataFrame({
+                "date": df["date"].dt.date,
+                "open": df["open"], "high": df["high"], "low": df["low"], "close": df["close"],
+                # 新浪接口的成交量单位为股，换手率为比例
+                "volume": df["volume"] * 100,
+                "amount": df["amount"],
+                "outstanding_share": sim["float_shares"],
+                "turnover": df["turnover"] / 100,
+            })
+
+        def stock_zh_a_spot():
+            df = self.spot()
+            return pd.DataFrame({
+                "代码": df["代码"].map(_prefixed), "名称": df["名称"], "最新价": df["最新价"],
+                "涨跌额": df["涨跌额"], "涨跌幅": df["涨跌幅"], "买入": df["最新价"], "卖出": df["最新价"],
+                "昨收": df["昨收"], "今开": df["今开"], "最高": df["最高"], "最低": df["最低"],
+                "成交量": df["成交量"] * 100, "成交额": df["成交额"],
+                "时间戳": "15:00:00",
+            })
+
+        def stock_financial_analysis_indicator(symbol, start_year="1900"):
+            return self.financial_indicator_frame(symbol, start_year)
+
+        def stock_financial_report_sina(stock="sh600600", symbol="资产负债表"):
+            return self.financial_report_frame(stock, symbol)
+
+        def stock_news_em(symbol="300059"):
+            return self.news_frame(symbol)
+
+        def stock_info_a_code_name():
+            return pd.DataFrame({"code": list(self.codes), "name": list(self.names)})
+
+        return {
+            "stock_zh_a_hist": stock_zh_a_hist,
+            "stock_zh_a_daily": stock_zh_a_daily,
+            "stock_zh_a_spot_em": self.spot,
+            "stock_zh_a_spot": stock_zh_a_spot,
+            "stock_financial_analysis_indicator": stock_financial_analysis_indicator,
+            "stock_financial_report_sina": stock_financial_report_sina,
+            "stock_news_em": stock_news_em,
+            "stock_info_a_code_name": stock_info_a_code_name,
+        }
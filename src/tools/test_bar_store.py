@@ -0,0 +1,146 @@
+import os
+import sys
+import tempfile
+import threading
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.bar_store import BarStore, merge_ranges
+
+
+def make_bars(start_date, days, base_price=10.0):
+    """生成指定交易日数量的模拟K线"""
+    dates = pd.bdate_range(start_date, periods=days)
+    close = base_price + np.arange(days) * 0.1
+    return pd.DataFrame({
+        "date": dates,
+        "open": close - 0.05,
+        "high": close + 0.1,
+        "low": close - 0.1,
+        "close": close,
+        "volume": np.full(days, 1000.0),
+    })
+
+
+def test_merge_ranges():
+    """相邻和重叠区间应被合并"""
+    merged = merge_ranges([("2024-01-01", "2024-01-10"),
+                           ("2024-01-11", "2024-01-20"),
+                           ("2024-03-01", "2024-03-05"),
+                           ("2024-01-05", "2024-01-08")])
+    assert [(s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")) for s, e in merged] == [
+        ("2024-01-01", "2024-01-20"),
+        ("2024-03-01", "2024-03-05"),
+    ]
+
+
+def test_write_and_slice():
+    """写入后可以按任意子区间切片读取"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        bars = make_bars("2024-01-01", 60)
+        assert store.write("000001", bars, "2024-01-01", "2024-03-22")
+
+        assert store.covers("000001", "2024-02-01", "2024-02-29")
+        assert not store.covers("000001", "2023-12-01", "2024-02-29")
+
+        sliced = store.read("000001", "2024-02-01", "2024-02-29")
+        expected = bars[(bars["date"] >= "2024-02-01") & (bars["date"] <= "2024-02-29")]
+        assert len(sliced) == len(expected)
+        assert np.allclose(sliced["close"].values, expected["close"].values)
+        print(f"切片读取 {len(sliced)} 条记录")
+
+
+def test_append_new_bars():
+    """追加新K线时合并已覆盖区间"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        bars = make_bars("2024-01-01", 40)
+        store.write("600519", bars.iloc[:30], "2024-01-01", bars["date"].iloc[29])
+        store.write("600519", bars.iloc[29:], bars["date"].iloc[29], bars["date"].iloc[-1])
+
+        assert len(store.read("600519")) == 40
+
+
+def test_rebased_series_replaces_old_data():
+    """重叠部分价格不一致时（复权基准变化）丢弃旧数据"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        bars = make_bars("2024-01-01", 30)
+        store.write("000002", bars, "2024-01-01", bars["date"].iloc[-1])
+
+        rebased = make_bars("2024-01-20", 10, base_price=8.0)
+        store.write("000002", rebased, "2024-01-20", rebased["date"].iloc[-1])
+
+        assert len(store.read("000002")) == 10
+        assert not store.covers("000002", "2024-01-01", "2024-01-10")
+
+
+def test_drop_series():
+    """删除所有股票的指定复权类型序列，其他序列保留"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        bars = make_bars("2024-01-01", 10)
+        for symbol in ("000001", "600519"):
+            store.write(symbol, bars, "2024-01-01", "2024-01-12", adjust="qfq")
+            store.write(symbol, bars, "2024-01-01", "2024-01-12", adjust="")
+
+        assert store.drop_series("qfq") == 2
+        assert store.read("000001", adjust="qfq").empty
+        assert len(store.read("600519", adjust="")) == 10
+
+
+def _write_chunks(root_dir, worker, workers, chunks):
+    store = BarStore(root_dir)
+    bars = make_bars("2024-01-01", 5 * workers * chunks)
+    for chunk in range(worker, workers * chunks, workers):
+        part = bars.iloc[chunk * 5:(chunk + 1) * 5]
+        store.write("600519", part, part["date"].iloc[0], part["date"].iloc[-1])
+
+
+def test_concurrent_writers_keep_all_bars():
+    """多个进程同时写入同一个序列时，每个进程写入的K线都保留"""
+    workers, chunks = 4, 6
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = [multiprocessing.Process(target=_write_chunks, args=(tmp, i, workers, chunks))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert all(process.exitcode == 0 for process in processes)
+
+        store = BarStore(tmp)
+        assert len(store.read("600519")) == 5 * workers * chunks
+        versions = [name for name in os.listdir(os.path.join(tmp, "600519", "qfq")) if name.startswith("v")]
+        assert len(versions) == 1
+
+
+def test_writers_of_other_series_not_blocked():
+    """一个序列的锁被占用时（如其他进程正在写入），其他序列仍可写入"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        bars = make_bars("2024-01-01", 10)
+        writer = threading.Thread(target=store.write, args=("600519", bars, "2024-01-01", "2024-01-12"))
+        with store._series_lock("000001", "qfq"):
+            writer.start()
+            writer.join(timeout=5)
+            assert not writer.is_alive()
+        assert len(store.read("600519")) == 10
+
+
+if __name__ == "__main__":
+    test_merge_ranges()
+    test_write_and_slice()
+    test_append_new_bars()
+    test_rebased_series_replaces_old_data()
+    test_drop_series()
+    test_concurrent_writers_keep_all_bars()
+    test_writers_of_other_series_not_blocked()
+    print("所有测试通过")
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.bar_store import bar_store
+from src.tools.cache_manager import CacheManager, NamespacePolicy, cache_manager, make_key
+from src.tools.cache_metrics import CacheMetrics, cache_metrics
+from src.tools.fundamentals_cache import FundamentalsCache
+from src.tools.interval_cache import get_cached_price_bars
+from src.tools.memory_cache import estimate_size
+from src.tools.test_bar_store import make_bars
+
+# 测试数据不写入缓存统计文件
+cache_metrics.path = None
+
+POLICIES = {
+    "market_data": NamespacePolicy(ttl=60, persist=True, shared=True),
+    "price_bars": NamespacePolicy(ttl=60, copy_on_read=True),
+    "short": NamespacePolicy(ttl=0.1, stale_ttl=60, persist=True),
+}
+
+
+def test_make_key_normalizes_dates():
+    """不同格式的日期得到相同的键"""
+    assert make_key("600519", "2024-01-02", "qfq") == "600519|20240102|qfq"
+    assert make_key("600519", datetime(2024, 1, 2), "qfq") == make_key("600519", pd.Timestamp("2024-01-02"), "qfq")
+    assert make_key("600519", None) == "600519|"
+
+
+def test_tiers_promote_hits():
+    """共享存储命中时回填本地磁盘和内存，其他进程的管理器可以读到磁盘上的记录"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk = FundamentalsCache(os.path.join(tmp_dir, "local.sqlite"))
+        shared = FundamentalsCache(os.path.join(tmp_dir, "shared.sqlite"))
+        shared.put("market_data", "600519", {"price": 1700.0}, ttl=60)
+
+        manager = CacheManager(disk=disk, shared=shared, policies=POLICIES)
+        assert manager.get("market_data", "600519") == {"price": 1700.0}
+        assert disk.get("market_data", "600519")[0] == {"price": 1700.0}
+        assert manager.memory("market_data").stats()["entries"] == 1
+
+        # 只写内存的命名空间不落盘
+        manager.set("price_bars", "600519|20240101|20241231|qfq", make_bars("2024-01-01", 20))
+        assert disk.get("price_bars", "600519|20240101|20241231|qfq") is None
+
+        other = CacheManager(disk=disk, policies=POLICIES)
+        assert other.get("market_data", "600519") == {"price": 1700.0}
+
+
+def test_copy_on_read():
+    """调用方修改读取到的DataFrame不影响缓存"""
+    manager = CacheManager(disk=None, policies=POLICIES)
+    manager.set("price_bars", "k", make_bars("2024-01-01", 20))
+    df = manager.get("price_bars", "k")
+    df["close"] = 0.0
+    assert (manager.get("price_bars", "k")["close"] != 0.0).all()
+
+
+def test_stale_while_error():
+    """获取失败或结果无效时返回过期数据，没有过期数据时照常报错"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = CacheManager(disk=FundamentalsCache(os.path.join(tmp_dir, "local.sqlite")), policies=POLICIES)
+        assert manager.get_or_fetch("short", "600519", lambda: {"price": 1.0}) == {"price": 1.0}
+        assert manager.get_or_fetch("short", "600519", lambda: {"price": 2.0}) == {"price": 1.0}
+
+        time.sleep(0.15)
+
+        def broken():
+            raise ConnectionError("连接被拒绝")
+
+        assert manager.get_or_fetch("short", "600519", broken) == {"price": 1.0}
+        assert manager.get_or_fetch("short", "600519", lambda: None) == {"price": 1.0}
+        # 内存层清空后从磁盘取回过期数据
+        manager.clear_memory()
+        assert manager.get_or_fetch("short", "600519", broken) == {"price": 1.0}
+        assert manager.get_or_fetch("short", "600519", lambda: {"price": 3.0}) == {"price": 3.0}
+
+        with pytest.raises(ConnectionError):
+            manager.get_or_fetch("short", "000001", broken)
+
+
+def test_price_bars_shared_between_code_paths():
+    """一条路径获取的K线对使用其他数据获取函数的路径同样命中"""
+    bars = make_bars("2024-01-01", 64)
+    calls = []
+
+    def fetch_a(start, end, adjust):
+        calls.append("a")
+        return bars[(bars["date"] >= start) & (bars["date"] <= end)].reset_index(drop=True)
+
+    def fetch_b(start, end, adjust):
+        calls.append("b")
+        return bars[(bars["date"] >= start) & (bars["date"] <= end)].reset_index(drop=True)
+
+    old_root = bar_store.root_dir
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bar_store.root_dir = tmp_dir
+        cache_manager.clear_memory("price_bars")
+        try:
+            first = get_cached_price_bars("600519", "2024-01-01", "2024-03-31", "qfq", fetch_a, verbose=False)
+            second = get_cached_price_bars("600519", datetime(2024, 1, 1), datetime(2024, 3, 31), "qfq", fetch_b,
+                                           verbose=False)
+        finally:
+            bar_store.root_dir = old_root
+            cache_manager.clear_memory("price_bars")
+
+    assert calls == ["a"]
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_report_by_namespace_and_symbol():
+    """按命名空间和股票代码统计各层命中、获取耗时、节省的时间和占用的字节数"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = CacheManager(disk=FundamentalsCache(os.path.join(tmp_dir, "local.sqlite")), policies=POLICIES)
+        assert manager.get("market_data", "600519") is None
+        time.sleep(0.05)
+        manager.set("market_data", "600519", {"price": 1700.0})
+        manager.get("market_data", "600519")
+        manager.get("market_data", "600519")
+        manager.clear_memory()
+        manager.get("market_data", "600519")
+        manager.get("price_bars", make_key("000001", "2024-01-01", "2024-12-31", "qfq"))
+
+        report = manager.report()
+
+    namespaces = {row["namespace"]: row for row in report["namespaces"]}
+    market_data = namespaces["market_data"]
+    assert (market_data["memory_hits"], market_data["disk_hits"], market_data["misses"]) == (2, 1, 1)
+    assert market_data["hit_rate"] == 0.75
+    assert market_data["fetches"] == 1 and market_data["avg_fetch_seconds"] >= 0.05
+    assert market_data["time_saved_seconds"] == pytest.approx(3 * market_data["avg_fetch_seconds"])
+    assert market_data["memory_bytes"] > 0 and market_data["disk_bytes"] > 0
+    assert namespaces["price_bars"]["misses"] == 1
+
+    symbols = {(row["namespace"], row["symbol"]): row for row in report["symbols"]}
+    assert symbols[("market_data", "600519")]["hits"] == 3
+    assert symbols[("price_bars", "000001")]["time_saved_seconds"] is None
+    assert report["symbols"][0]["symbol"] == "600519"
+
+
+def test_report_counts_stale_serves_and_evictions():
+    """返回过期数据和内存层淘汰都计入对应股票"""
+    manager = CacheManager(disk=None, policies=POLICIES)
+    manager.get_or_fetch("short", "600519", lambda: {"price": 1.0})
+    time.sleep(0.15)
+    assert manager.get_or_fetch("short", "600519", lambda: None) == {"price": 1.0}
+
+    memory = manager.memory("price_bars")
+    memory.max_bytes = int(1.5 * estimate_size(make_bars("2024-01-01", 20)))
+    manager.set("price_bars", "000001|20240101|20240131|qfq", make_bars("2024-01-01", 20))
+    manager.set("price_bars", "000002|20240101|20240131|qfq", make_bars("2024-01-01", 20))
+
+    symbols = {(row["namespace"], row["symbol"]): row for row in manager.report()["symbols"]}
+    assert symbols[("short", "600519")]["stale_serves"] == 1
+    assert symbols[("price_bars", "000001")]["evictions"] == 1
+    assert symbols[("price_bars", "000001")]["memory_bytes"] == 0
+    assert symbols[("price_bars", "000002")]["memory_bytes"] > 0
+
+
+def test_metrics_accumulate_across_processes():
+    """多个进程的计数器累加到同一个数据库，互不覆盖"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "cache_metrics.sqlite")
+        first, second = CacheMetrics(path), CacheMetrics(path)
+        first.record_hit("market_data", "600519")
+        first.save()
+        second.record_hit("market_data", "600519", tier="disk")
+        second.record_miss("market_data", "600519")
+        second.save()
+        first.record_hit("market_data", "600519")
+
+        counters = first.counters()[("market_data", "600519")]
+        assert (counters["memory_hits"], counters["disk_hits"], counters["misses"]) == (2, 1, 1)
+        assert CacheMetrics(path).counters()[("market_data", "600519")]["memory_hits"] == 2
+
+        second.reset()
+        assert CacheMetrics(path).counters() == {}
+
+
+def test_metrics_kept_when_save_fails():
+    """写入数据库失败时保留增量，下次保存时写入"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "cache_metrics.sqlite")
+        with open(path, "w") as f:
+            f.write("不是数据库文件" * 100)
+        metrics = CacheMetrics(path)
+        metrics.record_hit("market_data", "600519")
+        metrics.save()
+
+        os.remove(path)
+        metrics.record_hit("market_data", "600519")
+        metrics.save()
+        assert CacheMetrics(path).counters()[("market_data", "600519")]["memory_hits"] == 2
+
+
+if __name__ == "__main__":
+    test_make_key_normalizes_dates()
+    test_tiers_promote_hits()
+    test_copy_on_read()
+    test_stale_while_error()
+    test_price_bars_shared_between_code_paths()
+    test_report_by_namespace_and_symbol()
+    test_report_counts_stale_serves_and_evictions()
+    test_metrics_accumulate_across_processes()
+    test_metrics_kept_when_save_fails()
+    print("所有测试通过")
@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools import cache_warmer
+from src.tools.api import PriceHistoryBatch
+from src.tools.cache_manager import CacheManager
+from src.tools.cache_metrics import cache_metrics
+from src.tools.spot_snapshot import SpotSnapshot
+
+# 测试数据不写入缓存统计文件
+cache_metrics.path = None
+
+
+def test_load_watchlist():
+    """支持注释、逗号和空白分隔，忽略无效代码并去重"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "watchlist.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# 白酒\n600519, 000858  # 茅台 五粮液\n\n300750\nABC\n600519\n")
+        assert cache_warmer.load_watchlist(path) == ["600519", "000858", "300750"]
+
+
+def test_schedule():
+    """预热时间跳过周末，开盘前返回距开盘的秒数"""
+    friday_morning = datetime(2024, 6, 7, 8, 0)
+    assert cache_warmer.next_run_time("09:00", friday_morning) == datetime(2024, 6, 7, 9, 0)
+    assert cache_warmer.next_run_time("09:00", datetime(2024, 6, 7, 9, 0)) == datetime(2024, 6, 10, 9, 0)
+    assert cache_warmer.seconds_until_open(friday_morning) == 90 * 60
+    assert cache_warmer.seconds_until_open(datetime(2024, 6, 7, 10, 0)) is None
+    assert cache_warmer.seconds_until_open(datetime(2024, 6, 8, 8, 0)) is None
+
+
+class FakeUpstream:
+    """替换预热使用的数据获取函数，记录调用"""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, name, symbol):
+        with self._lock:
+            self.calls.append((name, symbol))
+        return symbol not in self.broken
+
+    def market_data(self, symbol):
+        if not self.record("market_data", symbol):
+            raise ValueError("无法获取市场数据")
+        return {"close": 10.0}
+
+    def financial_metrics(self, symbol):
+        return [{"pe_ratio": 10.0}] if self.record("financial_metrics", symbol) else [{}]
+
+    def financial_statements(self, symbol):
+        ok = self.record("financial_statements", symbol)
+        return [{"net_income": 1.0 if ok else 0}, {"net_income": 0}]
+
+    def price_history_batch(self, symbols, start_date=None, end_date=None):
+        for symbol in symbols:
+            self.record("price_history", symbol)
+        return PriceHistoryBatch(pd.DataFrame(columns=["symbol", "date"]), {}, 0.0)
+
+
+def test_warm_caches():
+    """每只股票的各项数据都预热一次，全市场行情只下载一次，失败的股票出现在结果中"""
+    fake = FakeUpstream(broken={"000858"})
+    spot_calls = []
+
+    def spot_source():
+        spot_calls.append(1)
+        return pd.DataFrame({"代码": ["600519", "000858"], "总市值": [2e12, 5e11]})
+
+    names = ["get_market_data", "get_financial_metrics", "get_financial_statements",
+             "get_price_history_batch", "_warm_stock_names", "spot_snapshot", "cache_manager"]
+    original = {name: getattr(cache_warmer, name) for name in names}
+    cache_warmer.get_market_data = fake.market_data
+    cache_warmer.get_financial_metrics = fake.financial_metrics
+    cache_warmer.get_financial_statements = fake.financial_statements
+    cache_warmer.get_price_history_batch = fake.price_history_batch
+    cache_warmer._warm_stock_names = lambda: None
+    cache_warmer.spot_snapshot = SpotSnapshot(fetch_func=spot_source)
+    cache_warmer.cache_manager = CacheManager(disk=None)
+    try:
+        summary = cache_warmer.warm_caches(["600519", "000858", "600519"], include_news=False, max_workers=2)
+    finally:
+        for name, value in original.items():
+            setattr(cache_warmer, name, value)
+
+    assert summary["symbols"] == 2
+    assert len(spot_calls) == 1
+    for name in ("price_history", "market_data", "financial_metrics", "financial_statements"):
+        assert sorted(symbol for task, symbol in fake.calls if task == name) == ["000858", "600519"]
+    assert summary["failed"] == {name: ["000858"]
+                                 for name in ("market_data", "financial_metrics", "financial_statements")}
+
+
+if __name__ == "__main__":
+    test_load_watchlist()
+    test_schedule()
+    test_warm_caches()
+    print("所有测试通过")
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools import fast_api
+from src.tools.circuit_breaker import (
+    CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, CLOSED, OPEN, HALF_OPEN,
+    FAILURE_THRESHOLD, circuit_breakers, protect_sources
+)
+
+
+class FlakySource:
+    """可切换上下线状态的模拟数据源"""
+
+    def __init__(self):
+        self.up = False
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if not self.up:
+            raise ConnectionError("数据源不可用")
+        return "ok"
+
+
+def call_ignoring_errors(breaker, func):
+    try:
+        return breaker.call(func)
+    except (ConnectionError, CircuitOpenError):
+        return None
+
+
+def test_opens_after_threshold_and_fails_fast():
+    """连续失败达到阈值后打开，不再请求上游"""
+    source = FlakySource()
+    breaker = CircuitBreaker("东方财富", failure_threshold=3, recovery_timeout=60)
+    for _ in range(3):
+        call_ignoring_errors(breaker, source)
+    assert breaker.state == OPEN
+
+    for _ in range(10):
+        call_ignoring_errors(breaker, source)
+    assert source.calls == 3
+    assert breaker.snapshot()["rejected"] == 10
+
+
+def test_half_open_probe_recovers():
+    """冷却后放行探测请求，成功则关闭"""
+    source = FlakySource()
+    breaker = CircuitBreaker("新浪财经", failure_threshold=1, recovery_timeout=0.1)
+    call_ignoring_errors(breaker, source)
+    assert breaker.state == OPEN
+
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    source.up = True
+    assert breaker.call(source) == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    """半开状态下探测失败则重新打开"""
+    source = FlakySource()
+    breaker = CircuitBreaker("网易财经", failure_threshold=1, recovery_timeout=0.1)
+    call_ignoring_errors(breaker, source)
+    time.sleep(0.15)
+    call_ignoring_errors(breaker, source)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["trips"] == 2
+
+
+def test_registry_wrap_and_states():
+    """注册表按 (接口, 数据源) 共享熔断器，只有异常计为失败"""
+    registry = CircuitBreakerRegistry(failure_threshold=2, recovery_timeout=60)
+
+    # 没有数据的股票（返回None）不计为失败
+    no_data = registry.wrap("腾讯财经", lambda: None, "market_data")
+    for _ in range(3):
+        assert no_data() is None
+    assert registry.states()["market_data/腾讯财经"]["state"] == CLOSED
+
+    source = FlakySource()
+    for _ in range(2):
+        call_ignoring_errors(registry.get("腾讯财经", "market_data"), source)
+    assert registry.states()["market_data/腾讯财经"]["state"] == OPEN
+    try:
+        registry.wrap("腾讯财经", lambda: "ok", "market_data")()
+        assert False, "熔断器打开时应直接失败"
+    except CircuitOpenError:
+        pass
+
+    # 同一数据源的其他接口不受影响
+    assert registry.wrap("腾讯财经", lambda: "ok", "price_history")() == "ok"
+
+    registry.reset("腾讯财经")
+    assert registry.states()["market_data/腾讯财经"]["state"] == CLOSED
+
+
+def test_upstream_errors_open_source_breakers():
+    """数据源的上游请求抛出异常时，市场数据和历史行情的熔断器都会打开"""
+    def upstream_down(*args, **kwargs):
+        raise ConnectionError("上游不可用")
+
+    original_spot, original_daily = fast_api.ak.stock_zh_a_spot, fast_api.ak.stock_zh_a_daily
+    fast_api.ak.stock_zh_a_spot = upstream_down
+    fast_api.ak.stock_zh_a_daily = upstream_down
+    try:
+        [(_, market_data)] = protect_sources("market_data", [("新浪财经", fast_api.get_data_from_sina)])
+        [(_, price_history)] = protect_sources("price_history", [("新浪财经", fast_api.get_data_from_sina_hist)])
+        for _ in range(FAILURE_THRESHOLD):
+            for call in (lambda: market_data("600519"),
+                         lambda: price_history("600519", "2024-01-01", "2024-01-31", "")):
+                try:
+                    call()
+                    assert False, "上游异常应当抛出"
+                except ConnectionError:
+                    pass
+        assert circuit_breakers.get("新浪财经", "market_data").state == OPEN
+        assert circuit_breakers.get("新浪财经", "price_history").state == OPEN
+    finally:
+        fast_api.ak.stock_zh_a_spot, fast_api.ak.stock_zh_a_daily = original_spot, original_daily
+        circuit_breakers.reset("新浪财经")
+
+
+if __name__ == "__main__":
+    test_opens_after_threshold_and_fails_fast()
+    test_half_open_probe_recovers()
+    test_failed_probe_reopens()
+    test_registry_wrap_and_states()
+    test_upstream_errors_open_source_breakers()
+    print("所有测试通过")
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.executors import ExecutorRegistry, submit_windowed
+
+
+def test_pools_are_shared_and_bounded():
+    """同名线程池只创建一次，并限制并发数"""
+    registry = ExecutorRegistry({"io": 2})
+    assert registry.get("io") is registry.get("io")
+
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def task():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    futures = [registry.get("io").submit(task) for _ in range(6)]
+    for future in futures:
+        future.result()
+
+    assert max(peak) <= 2
+    stats = registry.stats()["io"]
+    assert stats["submitted"] == 6
+    assert stats["completed"] == 6
+    assert stats["queued"] == 0
+    registry.shutdown()
+
+
+def test_queue_depth_and_failures():
+    """统计排队任务数和失败任务数"""
+    registry = ExecutorRegistry({"cpu": 1})
+    gate = threading.Event()
+    executor = registry.get("cpu")
+    first = executor.submit(gate.wait)
+    queued = [executor.submit(lambda: 1) for _ in range(3)]
+    time.sleep(0.05)
+    assert registry.stats()["cpu"]["queued"] == 3
+    gate.set()
+    first.result()
+    for future in queued:
+        future.result()
+
+    failing = executor.submit(lambda: 1 / 0)
+    try:
+        failing.result()
+    except ZeroDivisionError:
+        pass
+    assert registry.stats()["cpu"]["failed"] == 1
+    registry.shutdown()
+
+
+def test_environment_override():
+    """可以通过环境变量配置线程数"""
+    os.environ["EXECUTOR_LLM_WORKERS"] = "3"
+    try:
+        registry = ExecutorRegistry()
+        assert registry.get("llm").max_workers == 3
+        registry.shutdown()
+    finally:
+        del os.environ["EXECUTOR_LLM_WORKERS"]
+
+
+def test_windowed_batch_leaves_threads_for_others():
+    """批量任务按窗口提交，不占满共享线程池，其他调用方的任务不必等批量任务完成"""
+    registry = ExecutorRegistry({"fanout": 3})
+    executor = registry.get("fanout")
+    other_done = []
+
+    def slow(item):
+        if item == 0:
+            # 批量任务进行中，其他调用方提交的任务可以立即执行
+            other = executor.submit(lambda: other_done.append(time.time()))
+            other.result(timeout=1)
+        time.sleep(0.05)
+        return item * 2
+
+    start = time.time()
+    results = {}
+    for item, future in submit_windowed(executor, slow, range(8), 2):
+        results[item] = future.result()
+        assert executor.stats()["running"] + executor.stats()["queued"] <= 2
+
+    assert results == {i: i * 2 for i in range(8)}
+    assert other_done and other_done[0] - start < 0.05
+    registry.shutdown()
+
+
+if __name__ == "__main__":
+    test_pools_are_shared_and_bounded()
+    test_queue_depth_and_failures()
+    test_environment_override()
+    test_windowed_batch_leaves_threads_for_others()
+    print("所有测试通过")
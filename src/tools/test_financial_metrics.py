@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools import api
+from src.tools.cache_manager import cache_manager
+from src.tools.fundamentals_cache import fundamentals_cache
+from src.tools.cache_metrics import cache_metrics
+from src.tools.source_ranking import source_ranker
+from src.tools.spot_snapshot import SpotSnapshot
+from src.tools.synthetic_market import SyntheticMarket
+
+# 测试中的模拟数据源不写入排序记录和缓存统计文件
+source_ranker.path = None
+cache_metrics.path = None
+
+market = SyntheticMarket(n_tickers=4, years=2, end_date="2024-12-31", seed=7)
+handlers = market.akshare_handlers()
+
+
+class Counter:
+    """记录调用次数的包装函数"""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        return self.func(*args, **kwargs)
+
+
+def fetch_metrics(symbol, indicator_sources, spot_func):
+    """用指定的财务指标数据源和行情函数获取财务指标，不使用任何缓存"""
+    original = api.FINANCIAL_INDICATOR_SOURCES, api.spot_snapshot, fundamentals_cache.path
+    api.FINANCIAL_INDICATOR_SOURCES = indicator_sources
+    api.spot_snapshot = SpotSnapshot(fetch_func=spot_func)
+    fundamentals_cache.path = None
+    cache_manager.clear_memory("financial_metrics")
+    try:
+        return api.get_financial_metrics(symbol)
+    finally:
+        api.FINANCIAL_INDICATOR_SOURCES, api.spot_snapshot, fundamentals_cache.path = original
+
+
+def indicators_from_market(symbol):
+    df = handlers["stock_financial_analysis_indicator"](symbol=symbol)
+    df["日期"] = api.pd.to_datetime(df["日期"])
+    return df.sort_values("日期", ascending=False).iloc[0]
+
+
+def test_each_dataset_downloaded_once():
+    """财务指标和全市场行情各只下载一次"""
+    indicators = Counter(indicators_from_market)
+    spot = Counter(handlers["stock_zh_a_spot_em"])
+    result = fetch_metrics(market.codes[0], [("合成指标", indicators)], spot)
+
+    assert indicators.calls == 1 and spot.calls == 1
+    metrics = result[0]
+    assert metrics["market_cap"] > 0 and metrics["pe_ratio"] != 0
+    assert metrics["data_date"] <= "2024-12-31"
+
+
+def test_falls_back_to_next_indicator_source():
+    """第一个数据源没有数据时使用下一个数据源，行情仍然只下载一次"""
+    empty = Counter(lambda symbol: None)
+    indicators = Counter(indicators_from_market)
+    spot = Counter(handlers["stock_zh_a_spot_em"])
+    result = fetch_metrics(market.codes[1], [("空数据源", empty), ("备用指标", indicators)], spot)
+
+    assert empty.calls == 1 and indicators.calls == 1 and spot.calls == 1
+    assert result[0]["return_on_equity"] != 0
+
+
+def test_spot_failure_does_not_repeat_downloads():
+    """行情获取失败时返回空结果，不再重复下载财务指标"""
+    def broken_spot():
+        raise ConnectionError("连接被拒绝")
+
+    indicators = Counter(indicators_from_market)
+    result = fetch_metrics(market.codes[2], [("合成指标", indicators)], broken_spot)
+
+    assert result == [{}]
+    assert indicators.calls == 1
+
+
+if __name__ == "__main__":
+    test_each_dataset_downloaded_once()
+    test_falls_back_to_next_indicator_source()
+    test_spot_failure_does_not_repeat_downloads()
+    print("所有测试通过")
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools import api
+from src.tools.cache_manager import cache_manager
+from src.tools.cache_metrics import cache_metrics
+from src.tools.fundamentals_cache import fundamentals_cache
+from src.tools.synthetic_market import SyntheticMarket
+
+# 测试数据不写入缓存统计文件
+cache_metrics.path = None
+
+market = SyntheticMarket(n_tickers=4, years=2, end_date="2024-12-31", seed=5)
+
+
+class FakeReports:
+    """从合成市场读取财务报表，模拟网络延迟并记录最大并发数"""
+
+    def __init__(self, broken=(), delay=0.2):
+        self.handler = market.akshare_handlers()["stock_financial_report_sina"]
+        self.broken = set(broken)
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, stock, symbol):
+        with self._lock:
+            self.calls.append(symbol)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if symbol in self.broken:
+                raise ConnectionError("连接被拒绝")
+            return self.handler(stock=stock, symbol=symbol)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def fetch_statements(fake, symbol):
+    original_func, original_path = api.ak.stock_financial_report_sina, fundamentals_cache.path
+    api.ak.stock_financial_report_sina = fake
+    fundamentals_cache.path = None
+    cache_manager.clear_memory("financial_statements")
+    try:
+        return api.get_financial_statements(symbol)
+    finally:
+        api.ak.stock_financial_report_sina, fundamentals_cache.path = original_func, original_path
+
+
+def test_reports_fetched_concurrently():
+    """三张报表并发获取，总耗时接近单次请求"""
+    fake = FakeReports()
+    start_time = time.time()
+    line_items = fetch_statements(fake, market.codes[0])
+    elapsed = time.time() - start_time
+
+    assert sorted(fake.calls) == sorted(api.FINANCIAL_REPORT_NAMES)
+    assert fake.max_active == 3
+    assert elapsed < 2 * fake.delay
+    assert len(line_items) == 2
+    assert line_items[0]["operating_revenue"] != 0
+    assert line_items[0]["free_cash_flow"] != 0
+
+
+def test_failed_report_falls_back_to_empty():
+    """一张报表失败时，其余报表的数据照常返回"""
+    fake = FakeReports(broken={"现金流量表"}, delay=0.01)
+    line_items = fetch_statements(fake, market.codes[1])
+
+    assert line_items[0]["net_income"] != 0
+    assert line_items[0]["working_capital"] != 0
+    assert line_items[0]["capital_expenditure"] == 0
+    assert line_items[0]["free_cash_flow"] == 0
+
+
+if __name__ == "__main__":
+    test_reports_fetched_concurrently()
+    test_failed_report_falls_back_to_empty()
+    print("所有测试通过")
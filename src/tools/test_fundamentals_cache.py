@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from datetime import date, datetime
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.fundamentals_cache import (
+    FundamentalsCache, LATE_REPORT_RECHECK, disclosure_deadline, next_report_period, report_expiry,
+)
+
+
+def _ts(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M").timestamp()
+
+
+def test_put_get_and_expiry():
+    """有效期内返回缓存，过期后只在允许时返回"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = FundamentalsCache(os.path.join(tmp_dir, "fundamentals.sqlite"))
+        assert cache.get("financial_metrics", "600519") is None
+
+        metrics = [{"pe_ratio": 30.5, "data_date": "2024-09-30"}]
+        cache.put("financial_metrics", "600519", metrics, ttl=0.2)
+        value, expires_at = cache.get("financial_metrics", "600519")
+        assert value == metrics
+        assert expires_at > time.time()
+
+        time.sleep(0.3)
+        assert cache.get("financial_metrics", "600519") is None
+        assert cache.get("financial_metrics", "600519", allow_expired=True)[0] == metrics
+
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["stale_hits"] == 1 and stats["entries"] == 1
+
+
+def test_dataframe_values_and_delete():
+    """可以缓存DataFrame，按类型删除记录"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = FundamentalsCache(os.path.join(tmp_dir, "fundamentals.sqlite"))
+        df = pd.DataFrame({"日期": ["2024-09-30"], "净利润": [1.5e9]})
+        cache.put("income_statement", "000001", df, ttl=60)
+        cache.put("income_statement", "000002", df, ttl=60)
+        pd.testing.assert_frame_equal(cache.get("income_statement", "000001")[0], df)
+
+        cache.delete("income_statement", "000001")
+        assert cache.get("income_statement", "000001") is None
+        cache.delete("income_statement")
+        assert cache.get("income_statement", "000002") is None
+
+
+def test_disabled_cache():
+    """路径为None时不读写磁盘"""
+    cache = FundamentalsCache(None)
+    cache.put("financial_metrics", "600519", [{}], ttl=60)
+    assert cache.get("financial_metrics", "600519") is None
+
+
+def test_report_calendar():
+    """报告期的顺序和法定披露截止日"""
+    assert next_report_period("2024-03-31") == date(2024, 6, 30)
+    assert next_report_period("20240930") == date(2024, 12, 31)
+    assert next_report_period(date(2024, 12, 31)) == date(2025, 3, 31)
+    assert next_report_period("2024-11-15") == date(2024, 12, 31)
+    assert disclosure_deadline("2024-06-30") == date(2024, 8, 31)
+    assert disclosure_deadline("2024-12-31") == date(2025, 4, 30)
+
+
+def test_report_expiry():
+    """下一期结束前一直有效，披露窗口内按间隔重新验证，延期披露时降低频率"""
+    ttl = 12 * 3600
+    # 持有三季报，年报期末之前不会有新报告
+    now = _ts("2024-11-20 10:00")
+    assert report_expiry("2024-09-30", ttl, now) == _ts("2025-01-01 00:00")
+    # 年报披露窗口内
+    now = _ts("2025-03-10 10:00")
+    assert report_expiry("2024-09-30", ttl, now) == now + ttl
+    # 超过年报截止日仍未披露
+    now = _ts("2025-05-06 10:00")
+    assert report_expiry("2024-09-30", ttl, now) == now + LATE_REPORT_RECHECK
+    # 没有报告期时使用固定有效期
+    assert report_expiry(None, ttl, now) == now + ttl
+
+
+def test_put_with_period():
+    """带报告期写入时按披露日历计算过期时间"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = FundamentalsCache(os.path.join(tmp_dir, "fundamentals.sqlite"))
+        next_year = datetime.now().year + 1
+        # 报告期在未来时，下一期结束之前都不会过期
+        expires_at = cache.put("financial_metrics", "600519", [{}], ttl=1, period=f"{next_year}-09-30")
+        assert expires_at == _ts(f"{next_year + 1}-01-01 00:00")
+        assert cache.get("financial_metrics", "600519")[1] == expires_at
+
+
+def _write_many(path, worker, count):
+    cache = FundamentalsCache(path)
+    for i in range(count):
+        cache.put("financial_metrics", f"{worker}-{i}", [{"value": i}], ttl=60)
+
+
+def test_shared_across_processes():
+    """多个进程同时写入，所有记录对新进程可见"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "fundamentals.sqlite")
+        workers = [multiprocessing.Process(target=_write_many, args=(path, w, 50)) for w in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert all(worker.exitcode == 0 for worker in workers)
+
+        cache = FundamentalsCache(path)
+        assert cache.stats()["entries"] == 150
+        assert cache.get("financial_metrics", "2-49")[0] == [{"value": 49}]
+
+
+if __name__ == "__main__":
+    test_put_get_and_expiry()
+    test_dataframe_values_and_delete()
+    test_disabled_cache()
+    test_report_calendar()
+    test_report_expiry()
+    test_put_with_period()
+    test_shared_across_processes()
+    print("所有测试通过")
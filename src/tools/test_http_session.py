@@ -0,0 +1,100 @@
+import os
+import sys
+import types
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.http_session import LimitedSession, PooledSession, install_akshare_session, pooled_requests
+from src.tools.rate_limiter import TokenBucket, rate_limiter
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    """记录客户端连接数的测试服务器"""
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        CountingHandler.connections.add(self.client_address)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_connections_are_reused():
+    """多次请求复用同一个 keep-alive 连接"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        CountingHandler.connections = set()
+        session = PooledSession(timeout=5)
+        url = f"http://127.0.0.1:{server.server_address[1]}/quote"
+        for _ in range(20):
+            assert session.get(url).json() == {"ok": True}
+        assert len(CountingHandler.connections) == 1
+        session.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_install_replaces_module_requests():
+    """只替换 akshare 模块中的 requests 引用，不修改全局 requests"""
+    original_get = requests.get
+    module = types.ModuleType("fakeshare.stock")
+    module.requests = requests
+    sys.modules["fakeshare.stock"] = module
+    try:
+        assert install_akshare_session("fakeshare") == 1
+        assert module.requests is pooled_requests
+        assert module.requests.exceptions is requests.exceptions
+        assert requests.get is original_get
+    finally:
+        del sys.modules["fakeshare.stock"]
+
+
+def test_akshare_own_sessions_are_rate_limited():
+    """akshare 自行创建的 Session（request_with_retry）同样按主机获取限流令牌"""
+    import akshare.utils.request as akshare_request
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    replaced = [module for name, module in list(sys.modules.items())
+                if name.startswith("akshare") and getattr(module, "requests", None) is requests]
+    bucket = TokenBucket("127.0.0.1", rate=1000, burst=1000)
+    rate_limiter._buckets["127.0.0.1"] = bucket
+    try:
+        install_akshare_session()
+        assert akshare_request.requests is pooled_requests
+        assert isinstance(akshare_request.requests.Session(), LimitedSession)
+
+        url = f"http://127.0.0.1:{server.server_address[1]}/quote"
+        for _ in range(3):
+            assert akshare_request.request_with_retry(url).json() == {"ok": True}
+        assert bucket.stats()["acquired"] == 3
+    finally:
+        for module in replaced:
+            module.requests = requests
+        rate_limiter._buckets.pop("127.0.0.1", None)
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_install_replaces_module_requests()
+    test_akshare_own_sessions_are_rate_limited()
+    print("所有测试通过")
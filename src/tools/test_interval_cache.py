@@ -0,0 +1,202 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.bar_store import BarStore
+from src.tools.cache_metrics import CacheMetrics
+from src.tools.interval_cache import BAR_COLUMNS, BAR_STORE_NAMESPACE, missing_ranges, get_adjusted_bars, get_price_bars, standardize_bars
+from src.tools.synthetic_market import SyntheticMarket
+from src.tools.test_bar_store import make_bars
+
+market = SyntheticMarket(n_tickers=12, years=2, end_date="2024-12-31", seed=3)
+
+
+class FakeSource:
+    """模拟数据源，记录每次请求的区间"""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((pd.Timestamp(start), pd.Timestamp(end)))
+        mask = (self.bars["date"] >= start) & (self.bars["date"] <= end)
+        return self.bars[mask].reset_index(drop=True)
+
+
+def test_missing_ranges():
+    """只返回未覆盖的子区间"""
+    covered = [("2024-01-10", "2024-01-20"), ("2024-02-01", "2024-02-10")]
+    gaps = missing_ranges(covered, "2024-01-01", "2024-02-15")
+    assert [(s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d")) for s, e in gaps] == [
+        ("2024-01-01", "2024-01-09"),
+        ("2024-01-21", "2024-01-31"),
+        ("2024-02-11", "2024-02-15"),
+    ]
+    assert missing_ranges(covered, "2024-01-12", "2024-01-18") == []
+
+
+def test_shifted_window_fetches_only_new_bars():
+    """窗口向后滚动时只请求新增部分"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        source = FakeSource(make_bars("2024-01-01", 80))
+
+        first = get_price_bars("000001", "2024-01-01", "2024-03-29", "qfq", source, store=store)
+        assert len(source.calls) == 1
+        assert len(first) == 65
+
+        # 窗口向后滚动一周：只请求新增的尾部（带一根锚点K线）
+        shifted = get_price_bars("000001", "2024-01-08", "2024-04-05", "qfq", source, store=store)
+        assert len(source.calls) == 2
+        tail_start, tail_end = source.calls[-1]
+        assert tail_start == pd.Timestamp("2024-03-29")
+        assert tail_end == pd.Timestamp("2024-04-05")
+        assert shifted["date"].iloc[0] == pd.Timestamp("2024-01-08")
+        assert shifted["date"].iloc[-1] == pd.Timestamp("2024-04-05")
+
+        # 完全命中时不再请求
+        get_price_bars("000001", "2024-02-01", "2024-03-01", "qfq", source, store=store)
+        assert len(source.calls) == 2
+
+
+def test_store_hits_and_gap_fetches_recorded():
+    """仓库完全覆盖记为命中，补充缺失区间记为未命中并记录耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics = CacheMetrics(path=None)
+        store = BarStore(tmp, metrics=metrics)
+        source = FakeSource(make_bars("2024-01-01", 80))
+
+        get_price_bars("000001", "2024-01-01", "2024-03-29", "", source, store=store, verbose=False)
+        get_price_bars("000001", "2024-02-01", "2024-03-01", "", source, store=store, verbose=False)
+        get_price_bars("000001", "2024-01-01", "2024-03-29", "", lambda s, e: None, store=store, verbose=False)
+        get_price_bars("000001", "2024-01-01", "2024-04-30", "", lambda s, e: None, store=store, verbose=False)
+
+        counters = metrics.counters()[(BAR_STORE_NAMESPACE, "000001")]
+        assert counters["disk_hits"] == 2
+        assert counters["misses"] == 1
+        assert counters["fetches"] == 1
+        assert counters["stale_serves"] == 1
+
+
+def test_failed_source_is_not_recorded_as_covered():
+    """数据源失败时不记录覆盖区间，下次重新请求"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        df = get_price_bars("000002", "2024-01-01", "2024-01-31", "qfq", lambda s, e: None, store=store)
+        assert df.empty
+        assert store.ranges("000002", "qfq") == []
+
+
+def test_sources_stitched_with_same_units():
+    """不同数据源填补的区间转换为统一单位后拼接，成交量不会在区间边界跳变"""
+    bars = market.bars("000001", "20240101", "20240331")
+
+    def eastmoney(start, end):
+        return bars[(bars["date"] >= start) & (bars["date"] <= end)].reset_index(drop=True)
+
+    def sina(start, end):
+        # 新浪接口：成交量单位为股，换手率为比例，没有振幅和涨跌幅
+        df = eastmoney(start, end)
+        df = df.assign(volume=df["volume"] * 100, turnover=df["turnover"] / 100, outstanding_share=1e9)
+        return standardize_bars(df.drop(columns=["amplitude", "pct_change", "change_amount"]),
+                                volume_in_shares=True, turnover_as_ratio=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        get_price_bars("000001", "2024-01-01", "2024-02-29", "", eastmoney, store=store, verbose=False)
+        df = get_price_bars("000001", "2024-01-01", "2024-03-31", "", sina, store=store, verbose=False)
+
+        assert list(df.columns) == list(BAR_COLUMNS)
+        assert df["volume"].tolist() == bars["volume"].tolist()
+        assert not df[["amount", "pct_change", "turnover"]].isna().any().any()
+
+
+def test_unit_mismatch_replaces_old_bars():
+    """重叠日期的成交量单位不一致时丢弃旧数据，不拼接成一个序列"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        lots = make_bars("2024-01-01", 20)
+        store.write("000001", lots, "2024-01-01", "2024-01-26", adjust="")
+        shares = lots.iloc[15:].assign(volume=lots["volume"].iloc[15:] * 100)
+        store.write("000001", shares, "2024-01-22", "2024-02-02", adjust="")
+        assert store.ranges("000001", "") == [(pd.Timestamp("2024-01-22"), pd.Timestamp("2024-02-02"))]
+        assert len(store.read("000001", adjust="")) == 5
+
+
+class MarketSource:
+    """从合成市场读取K线和复权因子，记录每次请求的复权类型"""
+
+    def __init__(self):
+        self.calls = []
+        self.factor_calls = 0
+
+    def __call__(self, start, end, adjust):
+        self.calls.append(adjust)
+        return market.bars("000001", start, end, adjust)
+
+    def factors(self, symbol):
+        self.factor_calls += 1
+        return market.adjustment_factors(symbol)[["date", "hfq_factor"]]
+
+
+def test_adjusted_bars_share_one_raw_download():
+    """前复权和后复权K线由同一份不复权K线和复权因子计算，与数据源的复权K线一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        source = MarketSource()
+        for adjust in ("qfq", "hfq", ""):
+            df = get_adjusted_bars("000001", "2024-01-01", "2024-12-31", adjust, source,
+                                   fetch_factors=source.factors, store=store, verbose=False)
+            expected = market.bars("000001", "2024-01-01", "2024-12-31", adjust)
+            assert df["close"].tolist() == expected["close"].tolist()
+            assert df["volume"].tolist() == expected["volume"].tolist()
+
+        assert source.calls == [""]
+        assert source.factor_calls == 1
+
+
+def test_dividend_does_not_invalidate_raw_bars():
+    """新的除权除息只更新因子表，已保存的不复权K线不重新下载"""
+    factors = market.adjustment_factors("000001")[["date", "hfq_factor"]]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        source = MarketSource()
+        # 昨天获取的因子表还没有 2024-06-04 的除权除息
+        store.write_factors("000001", factors[factors["date"] < "2024-06-04"], datetime.now() - timedelta(days=1))
+        before = get_adjusted_bars("000001", "2024-01-01", "2024-05-31", "qfq", source,
+                                   fetch_factors=source.factors, store=store, verbose=False)
+        # 没有新的除权除息，因子表未过期，不重新下载
+        assert source.factor_calls == 0
+
+        after = get_adjusted_bars("000001", "2024-01-01", "2024-06-28", "qfq", source,
+                                  fetch_factors=source.factors, store=store, verbose=False)
+        # 不复权K线中出现因子表之后的除权日，重新下载因子表
+        assert source.calls == ["", ""]
+        assert source.factor_calls == 1
+        assert store.ranges("000001", "") == [(pd.Timestamp("2024-01-01"), pd.Timestamp("2024-06-28"))]
+        # 除权后前复权基准变化，旧K线按新因子重新换算
+        assert after["close"].iloc[0] < before["close"].iloc[0]
+        expected = market.bars("000001", "2024-01-01", "2024-06-28", "hfq")["close"]
+        hfq = get_adjusted_bars("000001", "2024-01-01", "2024-06-28", "hfq", source,
+                                fetch_factors=source.factors, store=store, verbose=False)
+        assert hfq["close"].tolist() == expected.tolist()
+
+
+if __name__ == "__main__":
+    test_missing_ranges()
+    test_shifted_window_fetches_only_new_bars()
+    test_store_hits_and_gap_fetches_recorded()
+    test_failed_source_is_not_recorded_as_covered()
+    test_sources_stitched_with_same_units()
+    test_unit_mismatch_replaces_old_bars()
+    test_adjusted_bars_share_one_raw_download()
+    test_dividend_does_not_invalidate_raw_bars()
+    print("所有测试通过")
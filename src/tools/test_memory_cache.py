@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.memory_cache import MemoryCache, estimate_size, memory_cache_stats
+
+
+def make_frame(rows=1000):
+    return pd.DataFrame({"close": np.random.rand(rows), "code": ["600519"] * rows})
+
+
+def test_estimate_size_uses_deep_memory_usage():
+    """DataFrame按 memory_usage(deep=True) 计算，嵌套在容器中时同样计入"""
+    df = make_frame()
+    size = estimate_size(df)
+    assert size == df.memory_usage(deep=True).sum()
+    assert estimate_size({"df": df, "rows": [1, 2, 3]}) > size
+
+
+def test_lru_eviction_under_budget():
+    """超出预算时淘汰最久未使用的记录"""
+    frame_size = estimate_size(make_frame())
+    cache = MemoryCache("test_lru", max_bytes=int(frame_size * 2.5), policy="lru")
+    cache.set("a", make_frame(), ttl=60)
+    cache.set("b", make_frame(), ttl=60)
+    assert cache.get("a") is not None  # a 变为最近使用
+    cache.set("c", make_frame(), ttl=60)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] <= stats["max_bytes"]
+
+
+def test_lfu_eviction_under_budget():
+    """LFU 策略淘汰使用次数最少的记录"""
+    frame_size = estimate_size(make_frame())
+    cache = MemoryCache("test_lfu", max_bytes=int(frame_size * 2.5), policy="lfu")
+    cache.set("a", make_frame(), ttl=60)
+    cache.set("b", make_frame(), ttl=60)
+    for _ in range(5):
+        cache.get("a")
+    cache.get("b")  # b 是最近使用的，LRU 会淘汰 a
+    cache.set("c", make_frame(), ttl=60)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+def test_expired_entries_kept_for_fallback_then_dropped():
+    """过期记录在兜底保留期内只在允许时返回，超过后访问或清理时删除"""
+    cache = MemoryCache("test_expiry", stale_ttl=0.2)
+    cache.set("a", {"price": 1.0}, ttl=0.1)
+    cache.set("b", {"price": 2.0}, ttl=0.1)
+    time.sleep(0.15)
+    assert cache.get("a") is None
+    assert cache.get("a", allow_expired=True) == {"price": 1.0}
+
+    time.sleep(0.2)
+    assert cache.get("a", allow_expired=True) is None
+    assert cache.sweep() == 1
+    assert len(cache) == 0 and cache.stats()["bytes"] == 0
+    assert cache.stats()["expirations"] == 2
+
+
+def test_oversized_value_not_cached():
+    """单条记录超过预算时不缓存"""
+    cache = MemoryCache("test_oversized", max_bytes=1000)
+    cache.set("big", make_frame(), ttl=60)
+    assert cache.get("big") is None
+    assert any(s["name"] == "test_oversized" for s in memory_cache_stats())
+
+
+if __name__ == "__main__":
+    test_estimate_size_uses_deep_memory_usage()
+    test_lru_eviction_under_budget()
+    test_lfu_eviction_under_budget()
+    test_expired_entries_kept_for_fallback_then_dropped()
+    test_oversized_value_not_cached()
+    print("所有测试通过")
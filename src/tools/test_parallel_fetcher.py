@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.parallel_fetcher import ParallelDataFetcher, race_sources
+from src.tools.cache_metrics import cache_metrics
+from src.tools.source_ranking import source_ranker
+
+# 测试中的模拟数据源不写入排序记录和缓存统计文件
+source_ranker.path = None
+cache_metrics.path = None
+
+
+def sleeper(delay, value):
+    def fetch():
+        time.sleep(delay)
+        return value
+    return fetch
+
+
+def failing():
+    raise ConnectionError("连接被拒绝")
+
+
+def test_fastest_source_wins_without_waiting_for_slow_ones():
+    """最快的有效结果返回后不等待慢数据源"""
+    start = time.time()
+    source, data, errors = race_sources([
+        ("慢", sleeper(2.0, "slow")),
+        ("出错", failing),
+        ("快", sleeper(0.1, "fast")),
+    ], deadline=5)
+    elapsed = time.time() - start
+
+    assert source == "快"
+    assert data == "fast"
+    assert elapsed < 1.0
+    assert any("出错" in message for message in errors)
+
+
+def test_queued_sources_are_cancelled():
+    """并发受限时，排队中的数据源在胜出后不再执行"""
+    started = []
+
+    def tracked(name, delay):
+        def fetch():
+            started.append(name)
+            time.sleep(delay)
+            return name
+        return fetch
+
+    source, _, _ = race_sources([
+        ("A", tracked("A", 0.1)),
+        ("B", tracked("B", 0.1)),
+    ], max_concurrency=1, deadline=5)
+    time.sleep(0.3)
+
+    assert source == "A"
+    assert started == ["A"]
+
+
+def test_hedged_sources_start_only_when_needed():
+    """对冲模式下，首选数据源及时返回时不启动后备数据源"""
+    started = []
+
+    def tracked(name, delay, value):
+        def fetch():
+            started.append(name)
+            time.sleep(delay)
+            return value
+        return fetch
+
+    source, _, _ = race_sources([
+        ("首选", tracked("首选", 0.05, "primary")),
+        ("后备", tracked("后备", 0.05, "backup")),
+    ], hedge_delay=0.5, deadline=5)
+    assert source == "首选"
+    assert started == ["首选"]
+
+    # 首选数据源出错时立即启动后备数据源
+    start = time.time()
+    source, _, _ = race_sources([("出错", failing), ("后备", sleeper(0.05, "backup"))],
+                                hedge_delay=2.0, deadline=5)
+    assert source == "后备"
+    assert time.time() - start < 1.0
+
+
+def test_deadline_and_invalid_results():
+    """超过整体超时或全部结果无效时返回None"""
+    source, data, errors = race_sources([("慢", sleeper(1.0, "slow"))], deadline=0.2)
+    assert source is None and data is None
+    assert any("超时" in message for message in errors)
+
+    source, _, _ = race_sources([("空", sleeper(0, None))], deadline=1)
+    assert source is None
+
+
+def test_fetch_price_history():
+    """历史数据按最少记录数校验"""
+    fetcher = ParallelDataFetcher(timeout=3, max_workers=3)
+    short = pd.DataFrame({"close": [1.0, 2.0]})
+    full = pd.DataFrame({"close": [1.0] * 10})
+    sources = [
+        ("短", lambda symbol, start, end, adjust: short),
+        ("全", lambda symbol, start, end, adjust: (time.sleep(0.1), full)[1]),
+    ]
+    df = fetcher.fetch_price_history("600519", "2024-01-01", "2024-01-31", sources)
+    assert len(df) == 10
+    df = fetcher.fetch_price_history("600519", "2024-01-01", "2024-01-31", sources[:1], min_rows=1)
+    assert len(df) == 2
+
+
+if __name__ == "__main__":
+    test_fastest_source_wins_without_waiting_for_slow_ones()
+    test_queued_sources_are_cancelled()
+    test_hedged_sources_start_only_when_needed()
+    test_deadline_and_invalid_results()
+    test_fetch_price_history()
+    print("所有测试通过")
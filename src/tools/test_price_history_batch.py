@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools import adjust_factors, api
+from src.tools.bar_store import BarStore
+from src.tools.cache_metrics import cache_metrics
+from src.tools.source_ranking import source_ranker
+from src.tools.synthetic_market import SyntheticMarket
+
+# 测试中的模拟数据源不写入排序记录和缓存统计文件
+source_ranker.path = None
+cache_metrics.path = None
+
+market = SyntheticMarket(n_tickers=12, years=2, end_date="2024-12-31", seed=3)
+
+
+class FakeSource:
+    """从合成市场读取K线的数据源，记录调用次数和最大并发数"""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = 0
+        self.factor_calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, start_date, end_date, adjust):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.02)
+            if symbol in self.broken:
+                raise ConnectionError("连接被拒绝")
+            return market.bars(symbol, start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d"), adjust)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def factors(self, symbol):
+        with self._lock:
+            self.factor_calls += 1
+        return market.adjustment_factors(symbol)[["date", "hfq_factor"]]
+
+
+def run_batch(source, symbols, **kwargs):
+    original = api.PRICE_HISTORY_SOURCES, adjust_factors.ADJUSTMENT_FACTOR_SOURCES
+    api.PRICE_HISTORY_SOURCES = [("批量测试数据源", source)]
+    adjust_factors.ADJUSTMENT_FACTOR_SOURCES = [("批量测试数据源", source.factors)]
+    try:
+        return api.get_price_history_batch(symbols, **kwargs)
+    finally:
+        api.PRICE_HISTORY_SOURCES, adjust_factors.ADJUSTMENT_FACTOR_SOURCES = original
+
+
+def test_batch_returns_long_format_and_fills_store():
+    """返回长格式K线，数据写入K线仓库，再次获取时不请求数据源"""
+    symbols = list(market.codes[:8])
+    progress = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BarStore(tmp)
+        source = FakeSource()
+        result = run_batch(source, symbols, start_date="2024-01-01", end_date="2024-06-30", max_workers=3,
+                           store=store, progress=lambda done, total, symbol, error: progress.append((done, total)))
+
+        assert not result.failed
+        assert set(result.symbols) == set(symbols)
+        assert list(result.bars.columns[:2]) == ["symbol", "date"]
+        expected = market.bars(symbols[0], "20240101", "20240630", "qfq")
+        assert result.get(symbols[0])["close"].tolist() == expected["close"].tolist()
+        assert result.panel("close").shape == (len(result.panel().index), len(symbols))
+        assert progress[-1] == (len(symbols), len(symbols))
+        assert source.max_active <= 3
+
+        # 每只股票只下载一次不复权K线和一次复权因子
+        assert source.calls == len(symbols)
+        assert source.factor_calls == len(symbols)
+
+        again = run_batch(source, symbols, start_date="2024-01-01", end_date="2024-06-30", adjust="hfq", store=store)
+        assert source.calls == len(symbols)
+        assert source.factor_calls == len(symbols)
+        assert len(again.bars) == len(result.bars)
+        expected = market.bars(symbols[0], "20240101", "20240630", "hfq")
+        assert again.get(symbols[0])["close"].tolist() == expected["close"].tolist()
+
+
+def test_batch_reports_partial_failures():
+    """部分股票获取失败时其余股票照常返回，失败原因单独列出"""
+    symbols = list(market.codes[:4])
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run_batch(FakeSource(broken={symbols[1]}), symbols, start_date="2024-01-01",
+                           end_date="2024-03-31", store=BarStore(tmp))
+
+        assert set(result.failed) == {symbols[1]}
+        assert "所有数据源都获取失败" in result.failed[symbols[1]]
+        assert set(result.symbols) == set(symbols) - {symbols[1]}
+        assert result.summary()["failed"] == 1
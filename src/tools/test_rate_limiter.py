@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.rate_limiter import TokenBucket, RateLimiter
+from src.tools.request_context import DeadlineExceeded, request_context
+
+
+def test_burst_then_steady_rate():
+    """突发数以内不等待，之后按速率放行"""
+    bucket = TokenBucket("test", rate=20, burst=3)
+    start = time.time()
+    for _ in range(3):
+        assert bucket.acquire() == 0
+    assert time.time() - start < 0.05
+
+    for _ in range(4):
+        bucket.acquire()
+    # 透支4个令牌，按每秒20个补充约需0.2秒
+    assert time.time() - start >= 0.18
+    assert bucket.stats()["throttled"] == 4
+
+
+def test_host_suffix_matching():
+    """子域名匹配上级域名的限流配置"""
+    limiter = RateLimiter({"eastmoney.com": (5, 10)}, state_dir=None)
+    assert limiter.bucket_for("https://push2his.eastmoney.com/api/qt/stock/kline/get").name == "eastmoney.com"
+    assert limiter.bucket_for("eastmoney.com").name == "eastmoney.com"
+    assert limiter.bucket_for("https://example.com/") is None
+    assert limiter.acquire("https://example.com/") == 0.0
+
+
+def test_wait_beyond_deadline_raises():
+    """排队时间超过请求剩余时间时直接失败，不消耗令牌"""
+    bucket = TokenBucket("test", rate=1, burst=1)
+    bucket.acquire()
+    with request_context(timeout=0.2):
+        try:
+            bucket.acquire()
+            assert False, "应抛出 DeadlineExceeded"
+        except DeadlineExceeded:
+            pass
+    assert bucket.stats()["acquired"] == 1
+
+
+def _acquire_many(path, count):
+    bucket = TokenBucket("shared", rate=20, burst=1, path=path)
+    for _ in range(count):
+        bucket.acquire()
+
+
+def test_rate_shared_across_processes():
+    """多个进程共享同一个令牌桶状态文件"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "shared.bucket")
+        start = time.time()
+        workers = [multiprocessing.Process(target=_acquire_many, args=(path, 5)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # 共10个请求，突发1个，其余9个按每秒20个放行，至少约0.45秒
+        assert time.time() - start >= 0.4
+        assert all(worker.exitcode == 0 for worker in workers)
+
+
+if __name__ == "__main__":
+    test_burst_then_steady_rate()
+    test_host_suffix_matching()
+    test_wait_beyond_deadline_raises()
+    test_rate_shared_across_processes()
+    print("所有测试通过")
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.request_context import (
+    RequestContext, DeadlineExceeded, request_context, current_context,
+    allow_retry, clamp_timeout, check_deadline
+)
+from src.tools.executors import get_executor
+from src.tools.parallel_fetcher import race_sources
+
+
+def test_no_context_keeps_original_behaviour():
+    """未设置请求上下文时不限制重试和超时"""
+    assert current_context() is None
+    assert allow_retry(100)
+    assert clamp_timeout(30) == 30
+    assert clamp_timeout(None) is None
+
+
+def test_retry_budget_shared_across_layers():
+    """整个请求共享重试预算"""
+    with request_context(retry_budget=2) as context:
+        assert allow_retry(0.01)
+        assert allow_retry(0.01)
+        assert not allow_retry(0.01)
+        assert context.retries_used == 2
+    assert current_context() is None
+
+
+def test_deadline_limits_retries_and_timeouts():
+    """剩余时间不足时不再重试，超时时间不超过剩余时间"""
+    with request_context(timeout=1):
+        assert not allow_retry(5)
+        assert allow_retry(0.1)
+        assert clamp_timeout(30) <= 1
+        assert clamp_timeout(None) <= 1
+
+
+def test_expired_context_raises():
+    """超过截止时间后 check_deadline 抛出异常"""
+    with request_context(RequestContext(timeout=0.01)):
+        time.sleep(0.02)
+        try:
+            check_deadline("测试")
+            assert False, "应抛出 DeadlineExceeded"
+        except DeadlineExceeded:
+            pass
+
+
+def test_context_propagates_to_shared_pools():
+    """共享线程池中的任务可以读取提交方的请求上下文"""
+    context = RequestContext(timeout=10, retry_budget=1)
+    with request_context(context):
+        seen = get_executor("io").submit(current_context).result()
+    assert seen is context
+
+
+def test_race_respects_remaining_time():
+    """竞速的整体超时不超过请求剩余时间"""
+    def slow():
+        time.sleep(0.5)
+        return "late"
+
+    start = time.time()
+    with request_context(timeout=0.1):
+        source_name, data, errors = race_sources([("慢速", slow)], deadline=10)
+    assert source_name is None
+    assert time.time() - start < 0.4
+
+
+if __name__ == "__main__":
+    test_no_context_keeps_original_behaviour()
+    test_retry_budget_shared_across_layers()
+    test_deadline_limits_retries_and_timeouts()
+    test_expired_context_raises()
+    test_context_propagates_to_shared_pools()
+    test_race_respects_remaining_time()
+    print("所有测试通过")
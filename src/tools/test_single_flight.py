@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.single_flight import SingleFlight
+
+
+def test_concurrent_duplicates_are_coalesced():
+    """并发的相同调用只执行一次，每个调用方得到结果副本"""
+    flight = SingleFlight()
+    executed = []
+    original = pd.DataFrame({"close": [1.0, 2.0]})
+
+    def fetch(symbol, period="daily"):
+        executed.append(symbol)
+        time.sleep(0.2)
+        return original
+
+    wrapped = flight.wrap(fetch, "fetch")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(wrapped("600519", period="daily")))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(executed) == 1
+    assert len(results) == 10
+    # 修改某个结果不影响其他调用方
+    results[0]["close"] = 0.0
+    assert results[1]["close"].iloc[-1] == 2.0
+    # 发起者也只得到副本，原始结果不交给任何调用方
+    assert not any(result is original for result in results)
+
+    stats = flight.stats()
+    assert stats["fetch"]["executed"] == 1
+    assert stats["fetch"]["deduplicated"] == 9
+    assert stats["total"]["calls"] == 10
+
+
+def test_different_arguments_are_not_coalesced():
+    """参数不同的调用互不影响"""
+    flight = SingleFlight()
+    wrapped = flight.wrap(lambda symbol: symbol, "echo")
+    assert wrapped("000001") == "000001"
+    assert wrapped("000002") == "000002"
+    assert flight.stats()["echo"]["executed"] == 2
+
+
+def test_errors_are_shared():
+    """第一个调用出错时，等待者收到同样的异常"""
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.1)
+        raise ValueError("上游错误")
+
+    wrapped = flight.wrap(failing, "failing")
+    errors = []
+
+    def call():
+        try:
+            wrapped()
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 5
+    assert flight.stats()["failing"]["errors"] == 1
+
+
+if __name__ == "__main__":
+    test_concurrent_duplicates_are_coalesced()
+    test_different_arguments_are_not_coalesced()
+    test_errors_are_shared()
+    print("所有测试通过")
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.source_ranking import SourceRanker
+
+
+def noop():
+    return None
+
+
+def test_failing_source_drops_to_back():
+    """持续失败的数据源排到最后"""
+    ranker = SourceRanker(path=None)
+    sources = [("网易财经", noop), ("东方财富", noop), ("新浪财经", noop)]
+    for _ in range(3):
+        ranker.record("price_history", "网易财经", 5.0, False)
+        ranker.record("price_history", "东方财富", 0.8, True)
+        ranker.record("price_history", "新浪财经", 0.3, True)
+
+    assert [name for name, _ in ranker.rank("price_history", sources)] == ["新浪财经", "东方财富", "网易财经"]
+    # 不同接口类型互不影响
+    assert [name for name, _ in ranker.rank("market_data", sources)] == ["网易财经", "东方财富", "新浪财经"]
+
+
+def test_timed_wrapper_records_errors():
+    """包装函数自动记录成败"""
+    ranker = SourceRanker(path=None)
+
+    def failing():
+        raise ConnectionError("连接失败")
+
+    wrapped = ranker.timed("market_data", "腾讯财经", failing)
+    try:
+        wrapped()
+    except ConnectionError:
+        pass
+    ranker.timed("market_data", "东方财富", lambda: {"market_cap": 1})()
+
+    stats = ranker.stats()["market_data"]
+    assert stats["腾讯财经"]["error_rate"] == 1.0
+    assert stats["东方财富"]["error_rate"] == 0.0
+
+
+def test_ranking_persists():
+    """排序记录保存到文件，重新加载后仍然有效"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "source_ranking.json")
+        ranker = SourceRanker(path=path)
+        ranker.record("price_history", "新浪财经", 0.2, True)
+        ranker.record("price_history", "东方财富", 3.0, False)
+        ranker.save()
+
+        reloaded = SourceRanker(path=path)
+        ranked = reloaded.rank("price_history", [("东方财富", noop), ("新浪财经", noop)])
+        assert ranked[0][0] == "新浪财经"
+
+
+if __name__ == "__main__":
+    test_failing_source_drops_to_back()
+    test_timed_wrapper_records_errors()
+    test_ranking_persists()
+    print("所有测试通过")
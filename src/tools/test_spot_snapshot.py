@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.cache_manager import CacheManager
+from src.tools.cache_metrics import CacheMetrics
+from src.tools.fundamentals_cache import FundamentalsCache
+from src.tools.spot_snapshot import SPOT_METRICS_NAMESPACE, SpotSnapshot
+
+
+class SlowSpotSource:
+    """模拟较慢的全市场行情接口，记录调用次数"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return pd.DataFrame({
+            "代码": [f"{i:06d}" for i in range(100)],
+            "总市值": [float(i) * 1e8 for i in range(100)],
+        })
+
+
+def test_lookup_by_code():
+    """按代码查询，多次查询只下载一次"""
+    source = SlowSpotSource(delay=0)
+    snapshot = SpotSnapshot(fetch_func=source, ttl=60)
+
+    assert snapshot.get("000010")["总市值"] == 10e8
+    assert snapshot.get("999999") is None
+    assert len(snapshot.get_many(["000001", "000002", "999999"])) == 2
+    assert source.calls == 1
+
+
+def test_concurrent_callers_share_one_refresh():
+    """并发调用只触发一次下载"""
+    source = SlowSpotSource(delay=0.2)
+    snapshot = SpotSnapshot(fetch_func=source, ttl=60)
+
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(snapshot.get(f"{i:06d}")))
+               for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert source.calls == 1
+    assert all(r is not None for r in results)
+
+
+def test_refresh_after_ttl():
+    """快照过期后重新下载"""
+    source = SlowSpotSource(delay=0)
+    snapshot = SpotSnapshot(fetch_func=source, ttl=60)
+    snapshot.get("000001")
+    snapshot.invalidate()
+    snapshot.get("000001")
+    assert source.calls == 2
+
+
+def test_lookups_recorded_in_metrics():
+    """查询按股票代码记录命中、未命中和下载失败时返回旧快照"""
+    source = SlowSpotSource(delay=0)
+    metrics = CacheMetrics(path=None)
+    snapshot = SpotSnapshot(fetch_func=source, ttl=60, metrics=metrics)
+
+    snapshot.get("000001")
+    snapshot.get("000001")
+    snapshot.invalidate()
+    snapshot._fetch_func = lambda: None
+    snapshot.get("000001")
+
+    counters = metrics.counters()[(SPOT_METRICS_NAMESPACE, "000001")]
+    assert counters["misses"] == 1
+    assert counters["fetches"] == 1
+    assert counters["memory_hits"] == 1
+    assert counters["stale_serves"] == 1
+
+
+def test_snapshot_shared_between_processes():
+    """快照写入磁盘后，其他进程在有效期内直接读取；盘前预热的快照按指定的有效期保留"""
+    source = SlowSpotSource(delay=0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk = FundamentalsCache(os.path.join(tmp_dir, "local.sqlite"))
+        warmer = SpotSnapshot(fetch_func=source, ttl=60, cache=CacheManager(disk=disk))
+        assert warmer.refresh(persist_ttl=3600)
+
+        other = SpotSnapshot(fetch_func=source, ttl=60, cache=CacheManager(disk=disk))
+        assert other.get("000010")["总市值"] == 10e8
+        assert source.calls == 1
+        assert other.ttl_override > 3500
+
+        other.invalidate()
+        assert SpotSnapshot(fetch_func=source, ttl=60, cache=CacheManager(disk=disk)).get("000010") is not None
+        assert source.calls == 2
+
+
+if __name__ == "__main__":
+    test_lookup_by_code()
+    test_concurrent_callers_share_one_refresh()
+    test_refresh_after_ttl()
+    test_lookups_recorded_in_metrics()
+    test_snapshot_shared_between_processes()
+    print("所有测试通过")
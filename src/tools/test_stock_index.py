@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.stock_index import StockIndex, PINYIN_AVAILABLE
+
+
+def make_index():
+    return StockIndex.from_dataframe(pd.DataFrame({
+        "code": ["600519", "000001", "000002", "600036", "300750"],
+        "name": ["贵州茅台", "平安银行", "万  科Ａ", "招商银行", "宁德时代"],
+    }))
+
+
+def test_lookup_by_code_and_name():
+    """按代码和名称查询"""
+    index = make_index()
+    assert len(index) == 5
+    assert index.name_of("600519") == "贵州茅台"
+    assert index.name_of("999999", "未知股票") == "未知股票"
+    assert index.code_of("招商银行") == "600036"
+    assert index.code_of("万科Ａ") == "000002"
+    assert "300750" in index
+
+
+def test_prefix_search():
+    """代码和名称前缀搜索"""
+    index = make_index()
+    assert [code for code, _ in index.search("6005")] == ["600519"]
+    assert [code for code, _ in index.search("000")] == ["000001", "000002"]
+    assert index.search("贵州") == [("600519", "贵州茅台")]
+    assert index.search("") == []
+    assert len(index.search("0", limit=1)) == 1
+
+
+def test_pinyin_search():
+    """拼音首字母搜索（需要 pypinyin）"""
+    if not PINYIN_AVAILABLE:
+        return
+    index = make_index()
+    assert index.search("gzmt") == [("600519", "贵州茅台")]
+    assert index.search("ZSYH") == [("600036", "招商银行")]
+
+
+if __name__ == "__main__":
+    test_lookup_by_code_and_name()
+    test_prefix_search()
+    test_pinyin_search()
+    print("所有测试通过")
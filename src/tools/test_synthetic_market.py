@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.synthetic_market import SyntheticMarket, _limit_of
+from src.tools.upstream_recorder import UpstreamRecorder, FixtureNotFoundError, SYNTHETIC
+
+market = SyntheticMarket(n_tickers=20, years=2, end_date="2024-12-31", seed=7)
+
+
+def test_same_seed_same_data():
+    """相同的随机种子生成相同的数据，不同的种子生成不同的数据"""
+    other = SyntheticMarket(n_tickers=20, years=2, end_date="2024-12-31", seed=7)
+    assert other.codes == market.codes
+    pd.testing.assert_frame_equal(other.bars(market.codes[3]), market.bars(market.codes[3]))
+    pd.testing.assert_frame_equal(other.spot(), market.spot())
+
+    different = SyntheticMarket(n_tickers=20, years=2, end_date="2024-12-31", seed=8)
+    assert not different.bars(different.codes[0])["close"].equals(market.bars(market.codes[0])["close"])
+
+
+def test_price_limits_and_suspensions():
+    """不复权价格不超过涨跌停价，停牌日没有K线"""
+    for code, name in zip(market.codes, market.names):
+        sim = market._simulate(market._index_of(code))
+        limit = _limit_of(code, name)
+        up = np.round(sim["pre_close"] * (1 + limit), 2) + 1e-9
+        down = np.round(sim["pre_close"] * (1 - limit), 2) - 1e-9
+        for column in ("open", "high", "low", "close"):
+            assert (sim[column] <= up).all() and (sim[column] >= down).all(), code
+        assert (sim["low"] <= np.minimum(sim["open"], sim["close"])).all()
+        assert (sim["high"] >= np.maximum(sim["open"], sim["close"])).all()
+        assert sim["dates"].is_monotonic_increasing
+        assert len(sim["dates"]) <= len(market.calendar)
+
+    lengths = [len(market.bars(code)) for code in market.codes]
+    assert min(lengths) < len(market.calendar), "应有股票停牌或在区间内上市"
+
+
+def test_adjusted_prices_match_factors():
+    """前复权和后复权价格等于不复权价格乘以对应的复权因子"""
+    code = next(c for c in market.codes if market._simulate(market._index_of(c))["ex_events"])
+    raw = market.bars(code)
+    factors = market.adjustment_factors(code)
+    qfq = market.bars(code, adjust="qfq")
+    hfq = market.bars(code, adjust="hfq")
+    assert np.allclose(qfq["close"], np.round(raw["close"] * factors["qfq_factor"], 2))
+    assert np.allclose(hfq["close"], np.round(raw["close"] * factors["hfq_factor"], 2))
+    # 最新价格不受前复权影响，且复权后的收益率没有除权缺口
+    assert qfq["close"].iloc[-1] == raw["close"].iloc[-1]
+    assert factors["hfq_factor"].iloc[0] == 1.0
+    assert factors["hfq_factor"].nunique() > 1
+
+    limit = _limit_of(code, market.names[market._index_of(code)])
+    assert (hfq["close"].pct_change().abs().dropna() <= limit + 0.01).all()
+
+
+def test_financial_metrics_schema():
+    """财务指标的字段与 get_financial_metrics 相同，且只使用截至当日已披露的财报"""
+    code = market.codes[0]
+    metrics = market.financial_metrics(code)[0]
+    assert set(metrics) == {
+        "market_cap", "float_market_cap", "return_on_equity", "net_margin", "operating_margin",
+        "revenue_growth", "earnings_growth", "book_value_growth", "current_ratio", "debt_to_equity",
+        "free_cash_flow_per_share", "earnings_per_share", "pe_ratio", "price_to_book", "price_to_sales",
+        "data_date", "expected_latest_date",
+    }
+    reports = market.financial_reports(code)
+    assert all(r["published"] <= market.end_date for r in reports)
+    assert len(market.financial_reports(code, as_of="2024-05-01")) < len(reports)
+
+    income = market.financial_report_frame(code, "利润表")
+    assert list(income.columns[:2]) == ["报告日", "营业总收入"]
+    assert len(income) == len(reports)
+
+
+def test_news_schema():
+    """新闻的字段与 get_stock_news 相同，按发布时间从新到旧排列"""
+    news = market.stock_news(market.codes[1], max_news=5)
+    assert 0 < len(news) <= 5
+    assert set(news[0]) == {"title", "content", "publish_time", "source", "url", "keyword"}
+    times = [item["publish_time"] for item in news]
+    assert times == sorted(times, reverse=True)
+
+
+def test_recorder_serves_synthetic_market():
+    """synthetic 模式下 akshare 调用由合成市场响应，没有合成实现的调用按回放处理"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        recorder = UpstreamRecorder(SYNTHETIC, tmp_dir, market=market)
+
+        def offline(*args, **kwargs):
+            raise AssertionError("synthetic 模式不应访问上游")
+
+        code = market.codes[2]
+        df = recorder.call("akshare.stock_zh_a_hist", offline, symbol=code, period="daily",
+                           start_date="20240101", end_date="20241231", adjust="qfq")
+        assert list(df.columns[:3]) == ["日期", "股票代码", "开盘"]
+        assert (df["股票代码"] == code).all()
+
+        spot = recorder.call("akshare.stock_zh_a_spot_em", offline)
+        assert len(spot) == market.n_tickers and "最新价" in spot.columns
+
+        try:
+            recorder.call("llm.chat_completion", offline, model="m")
+            assert False, "没有合成实现且没有录制记录时应失败"
+        except FixtureNotFoundError:
+            pass
+        assert recorder.stats()["replayed"] == 2
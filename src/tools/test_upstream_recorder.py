@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import tempfile
+
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+from src.tools.upstream_recorder import UpstreamRecorder, FixtureNotFoundError, RECORD, REPLAY, OFF
+
+
+def fetch_hist(symbol, start_date, end_date, timeout=None):
+    """模拟的上游函数"""
+    if symbol == "000000":
+        raise ValueError("股票不存在")
+    time.sleep(0.05)
+    return pd.DataFrame({"date": [start_date, end_date], "close": [10.0, 10.5], "symbol": [symbol, symbol]})
+
+
+def test_record_then_replay():
+    """录制后回放返回相同的数据和异常，且不调用上游"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        recorder = UpstreamRecorder(RECORD, tmp_dir)
+        recorded = recorder.call("akshare.hist", fetch_hist, "600519", start_date="20240101", end_date="20240105")
+        try:
+            recorder.call("akshare.hist", fetch_hist, "000000", start_date="20240101", end_date="20240105")
+        except ValueError:
+            pass
+        assert recorder.stats()["recorded"] == 2
+
+        def offline(*args, **kwargs):
+            raise AssertionError("回放模式不应访问上游")
+
+        replayer = UpstreamRecorder(REPLAY, tmp_dir)
+        replayed = replayer.call("akshare.hist", offline, "600519", start_date="20240101", end_date="20240105")
+        pd.testing.assert_frame_equal(replayed, recorded)
+        try:
+            replayer.call("akshare.hist", offline, "000000", start_date="20240101", end_date="20240105")
+            assert False, "应回放录制的异常"
+        except ValueError:
+            pass
+
+
+def test_replay_matches_ignoring_dates_and_excluded_keys():
+    """日期不同或被排除的参数不同时，回放最近一次录制"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        UpstreamRecorder(RECORD, tmp_dir).call("akshare.hist", fetch_hist, "600519",
+                                               start_date="20240101", end_date="20240105",
+                                               timeout=3, key_exclude=("timeout",))
+        replayer = UpstreamRecorder(REPLAY, tmp_dir)
+        df = replayer.call("akshare.hist", fetch_hist, "600519", start_date="20240201",
+                           end_date="20240205", timeout=9, key_exclude=("timeout",))
+        assert len(df) == 2
+
+        try:
+            replayer.call("akshare.hist", fetch_hist, "000001", start_date="20240101", end_date="20240105")
+            assert False, "没有录制记录时应失败"
+        except FixtureNotFoundError:
+            pass
+        assert replayer.stats()["missed"] == 1
+
+
+def test_replay_simulates_latency():
+    """按比例模拟录制时的耗时"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        UpstreamRecorder(RECORD, tmp_dir).call("akshare.hist", fetch_hist, "600519", "20240101", "20240105")
+        start = time.time()
+        UpstreamRecorder(REPLAY, tmp_dir, latency_scale=0).call("akshare.hist", fetch_hist, "600519", "20240101", "20240105")
+        assert time.time() - start < 0.04
+        start = time.time()
+        UpstreamRecorder(REPLAY, tmp_dir, latency_scale=1).call("akshare.hist", fetch_hist, "600519", "20240101", "20240105")
+        assert time.time() - start >= 0.04
+
+
+def test_off_mode_passthrough():
+    """关闭时直接调用上游"""
+    recorder = UpstreamRecorder(OFF)
+    assert len(recorder.call("akshare.hist", fetch_hist, "600519", "20240101", "20240105")) == 2
+    assert recorder.stats()["recorded"] == 0
+
+
+if __name__ == "__main__":
+    test_record_then_replay()
+    test_replay_matches_ignoring_dates_and_excluded_keys()
+    test_replay_simulates_latency()
+    test_off_mode_passthrough()
+    print("所有测试通过")
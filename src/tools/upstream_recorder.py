@@ -0,0 +1,287 @@
+"""
+上游调用的录制与回放
+
+用于在没有网络的机器上重复性能测试，结果不受数据源当天延迟的影响：
+- record（录制）：真实调用 akshare 和大模型接口，把参数、返回的数据（含DataFrame）、
+  异常和耗时保存到本地夹具目录
+- replay（回放）：不访问网络，直接返回录制的结果，可以按比例模拟录制时的耗时
+- synthetic（合成）：akshare 调用由 synthetic_market.py 生成的合成市场数据响应，
+  其余调用（如大模型）按 replay 处理
+- off（默认）：不做任何包装
+
+通过环境变量配置：
+- UPSTREAM_MODE: off / record / replay / synthetic
+- UPSTREAM_FIXTURE_DIR: 夹具目录，默认为项目根目录下的 fixtures/upstream
+- UPSTREAM_REPLAY_LATENCY: 回放时模拟耗时的比例，0 表示立即返回，1 表示与录制时相同
+- UPSTREAM_SYNTHETIC_TICKERS / UPSTREAM_SYNTHETIC_YEARS / UPSTREAM_SYNTHETIC_SEED:
+  合成市场的股票数（默认100）、年数（默认10）和随机种子（默认42）
+
+回放时参数中的日期（如 end_date 为“昨天”）与录制时不同，找不到完全相同的记录时，
+使用同一函数、除日期外参数相同的最近一次录制。
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import pickle
+import hashlib
+import functools
+import threading
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+SYNTHETIC = "synthetic"
+
+# 默认夹具目录
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           "fixtures", "upstream")
+
+_DATE_PATTERN = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+
+
+class FixtureNotFoundError(LookupError):
+    """回放模式下没有找到对应的录制结果"""
+
+
+def _key_of(name, args, kwargs, loose=False):
+    """根据函数名和参数计算录制记录的键；loose=True 时忽略日期参数"""
+    def normalize(value):
+        if loose and isinstance(value, str) and _DATE_PATTERN.match(value):
+            return "<date>"
+        return value
+
+    payload = json.dumps(
+        [name, [normalize(arg) for arg in args], {k: normalize(v) for k, v in sorted(kwargs.items())}],
+        ensure_ascii=False, default=repr,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class UpstreamRecorder:
+    """按模式录制或回放上游调用"""
+
+    def __init__(self, mode=OFF, fixture_dir=FIXTURE_DIR, latency_scale=0.0, market=None):
+        """
+        初始化录制器
+
+        Args:
+            mode: off / record / replay / synthetic
+            fixture_dir: 夹具目录
+            latency_scale: 回放时模拟耗时的比例
+            market: synthetic 模式使用的 SyntheticMarket，为None时首次使用时按环境变量创建
+        """
+        if mode not in (OFF, RECORD, REPLAY, SYNTHETIC):
+            print(f"[录制回放] 未知模式 {mode}，已关闭录制回放")
+            mode = OFF
+        self.mode = mode
+        self.fixture_dir = fixture_dir
+        self.latency_scale = latency_scale
+        self.market = market
+        self._handlers = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.recorded = 0
+        self.replayed = 0
+        self.missed = 0
+
+    @property
+    def enabled(self):
+        return self.mode != OFF
+
+    def _path_of(self, name, exact_key, loose_key):
+        return os.path.join(self.fixture_dir, name, f"{loose_key}_{exact_key}.pkl")
+
+    def _record(self, name, args, kwargs, result, error, elapsed):
+        exact_key = _key_of(name, args, kwargs)
+        loose_key = _key_of(name, args, kwargs, loose=True)
+        entry = {
+            "name": name,
+            "args": args,
+            "kwargs": kwargs,
+            "result": result,
+            "error": error,
+            "elapsed": elapsed,
+            "recorded_at": time.time(),
+        }
+        path = self._path_of(name, exact_key, loose_key)
+        try:
+            payload = pickle.dumps(entry)
+        except Exception:
+            # 无法序列化的异常以文本形式保存
+            entry["error"] = RuntimeError(f"{type(error).__name__}: {error}") if error is not None else None
+            payload = pickle.dumps(entry)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_file, path)
+        with self._lock:
+            self.recorded += 1
+
+    def _load(self, name, args, kwargs):
+        exact_key = _key_of(name, args, kwargs)
+        loose_key = _key_of(name, args, kwargs, loose=True)
+        path = self._path_of(name, exact_key, loose_key)
+        if not os.path.exists(path):
+            # 没有完全匹配的记录时，使用除日期外参数相同的最近一次录制
+            candidates = glob.glob(os.path.join(self.fixture_dir, name, f"{loose_key}_*.pkl"))
+            if not candidates:
+                return None
+            path = max(candidates, key=os.path.getmtime)
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def _synthetic_handler(self, name):
+        """返回合成市场中对应的 akshare 实现，没有时返回None"""
+        with self._lock:
+            if self._handlers is None:
+                if self.market is None:
+                    from src.tools.synthetic_market import SyntheticMarket
+                    self.market = SyntheticMarket(
+                        n_tickers=int(os.getenv("UPSTREAM_SYNTHETIC_TICKERS", "100")),
+                        years=int(os.getenv("UPSTREAM_SYNTHETIC_YEARS", "10")),
+                        seed=int(os.getenv("UPSTREAM_SYNTHETIC_SEED", "42")),
+                    )
+                self._handlers = {f"akshare.{k}": v for k, v in self.market.akshare_handlers().items()}
+            return self._handlers.get(name)
+
+    def use_market(self, market):
+        """切换到 synthetic 模式并使用指定的合成市场"""
+        with self._lock:
+            self.mode = SYNTHETIC
+            self.market = market
+            self._handlers = None
+
+    def call(self, name, func, *args, key_exclude=(), **kwargs):
+        """
+        按当前模式调用上游函数
+
+        Args:
+            name: 录制记录的名称，如 "akshare.stock_zh_a_hist"
+            func: 上游函数
+            key_exclude: 不参与匹配的参数名（如超时时间）
+
+        Returns:
+            上游函数或录制记录的返回值
+        """
+        if self.mode == OFF:
+            return func(*args, **kwargs)
+
+        if self.mode == SYNTHETIC:
+            handler = self._synthetic_handler(name)
+            if handler is not None:
+                with self._lock:
+                    self.replayed += 1
+                return handler(*args, **kwargs)
+
+        key_kwargs = {k: v for k, v in kwargs.items() if k not in key_exclude}
+        if self.mode in (REPLAY, SYNTHETIC):
+            entry = self._load(name, args, key_kwargs)
+            if entry is None:
+                with self._lock:
+                    self.missed += 1
+                raise FixtureNotFoundError(f"没有 {name} 的录制记录，参数: {args} {key_kwargs}")
+            with self._lock:
+                self.replayed += 1
+            if self.latency_scale > 0:
+                time.sleep(entry["elapsed"] * self.latency_scale)
+            if entry["error"] is not None:
+                raise entry["error"]
+            result = entry["result"]
+            copy_func = getattr(result, "copy", None)
+            return copy_func() if callable(copy_func) else result
+
+        start_time = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._record(name, args, key_kwargs, None, e, time.time() - start_time)
+            raise
+        self._record(name, args, key_kwargs, result, None, time.time() - start_time)
+        return result
+
+    def wrap(self, name, func):
+        """包装上游函数，使其经过录制/回放"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(name, func, *args, **kwargs)
+
+        wrapper.__upstream_recorded__ = True
+        return wrapper
+
+    def stats(self):
+        """返回录制回放统计信息"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "fixture_dir": self.fixture_dir,
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "missed": self.missed,
+            }
+
+
+def _recorder_from_env():
+    try:
+        latency_scale = float(os.getenv("UPSTREAM_REPLAY_LATENCY", "0") or 0)
+    except ValueError:
+        print(f"[录制回放] 环境变量 UPSTREAM_REPLAY_LATENCY 的值无效: {os.getenv('UPSTREAM_REPLAY_LATENCY')}")
+        latency_scale = 0.0
+    return UpstreamRecorder(
+        mode=(os.getenv("UPSTREAM_MODE") or OFF).lower(),
+        fixture_dir=os.getenv("UPSTREAM_FIXTURE_DIR") or FIXTURE_DIR,
+        latency_scale=latency_scale,
+    )
+
+
+# 全局录制器
+upstream_recorder = _recorder_from_env()
+
+
+def use_synthetic_market(market):
+    """
+    让 akshare 调用改由合成市场响应，用于全市场规模的性能测试
+
+    Args:
+        market: SyntheticMarket 实例
+
+    Returns:
+        int: 新包装的akshare函数数量
+    """
+    upstream_recorder.use_market(market)
+    return install_akshare_recorder()
+
+
+def install_akshare_recorder():
+    """
+    让所有 akshare 数据函数经过录制/回放，未启用时不做任何修改
+
+    需要在其他 akshare 补丁（重试、请求合并）之前调用，使录制层位于最内层，
+    回放时缓存、合并和重试等上层逻辑照常运行。
+
+    Returns:
+        int: 包装的函数数量
+    """
+    if not upstream_recorder.enabled:
+        return 0
+
+    import akshare as ak
+
+    count = 0
+    for name in dir(ak):
+        func = getattr(ak, name, None)
+        if name.startswith("_") or not callable(func) or isinstance(func, type):
+            continue
+        if getattr(func, "__upstream_recorded__", False) or not getattr(func, "__module__", "").startswith("akshare"):
+            continue
+        setattr(ak, name, upstream_recorder.wrap(f"akshare.{name}", func))
+        count += 1
+
+    if count:
+        print(f"[录制回放] 模式 {upstream_recorder.mode}，已包装 {count} 个akshare函数，夹具目录 {upstream_recorder.fixture_dir}")
+    return count
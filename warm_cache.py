@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+from src.tools.cache_warmer import (WATCHLIST_FILE, DEFAULT_WARM_TIME, DEFAULT_NEWS_COUNT, WARM_WORKERS,
+                                    PROJECT_ROOT, load_watchlist, warm_caches, run_daemon)
+
+def main():
+    """
+    盘前缓存预热工具
+    """
+    parser = argparse.ArgumentParser(description='A股投资系统盘前缓存预热工具')
+    parser.add_argument('--watchlist', type=str, default=WATCHLIST_FILE,
+                        help='自选股列表文件，每行一个或多个股票代码，# 之后为注释（默认为项目根目录的 watchlist.txt）')
+    parser.add_argument('--daemon', action='store_true', help='常驻运行，每个工作日在 --at 指定的时间预热')
+    parser.add_argument('--at', type=str, default=DEFAULT_WARM_TIME, help=f'预热时间 HH:MM（默认 {DEFAULT_WARM_TIME}，应早于9:30开盘）')
+    parser.add_argument('--start-date', type=str, help='K线开始日期 YYYY-MM-DD（默认为结束日期前一年）')
+    parser.add_argument('--end-date', type=str, help='K线结束日期 YYYY-MM-DD（默认为昨天）')
+    parser.add_argument('--num-of-news', type=int, default=DEFAULT_NEWS_COUNT, help=f'预热的新闻条数（默认{DEFAULT_NEWS_COUNT}）')
+    parser.add_argument('--no-news', action='store_true', help='不预热新闻')
+    parser.add_argument('--workers', type=int, default=WARM_WORKERS, help=f'同时预热的股票数（默认{WARM_WORKERS}）')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.watchlist):
+        print(f"❌ 自选股列表文件不存在: {args.watchlist}")
+        sys.exit(1)
+
+    # 新闻缓存使用相对路径 src/data/stock_news
+    os.chdir(PROJECT_ROOT)
+
+    options = dict(start_date=args.start_date, end_date=args.end_date, num_of_news=args.num_of_news,
+                   include_news=not args.no_news, max_workers=args.workers)
+
+    if args.daemon:
+        try:
+            run_daemon(args.watchlist, at=args.at, **options)
+        except KeyboardInterrupt:
+            print("\n已停止")
+        return
+
+    symbols = load_watchlist(args.watchlist)
+    if not symbols:
+        print("❌ 自选股列表为空")
+        sys.exit(1)
+
+    summary = warm_caches(symbols, **options)
+    if summary["failed"]:
+        print("⚠️ 部分数据预热失败，开盘后分析这些股票时会重新获取")
+    else:
+        print("✅ 所有数据预热完成")
+
+if __name__ == "__main__":
+    main()